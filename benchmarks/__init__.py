@@ -0,0 +1,6 @@
+"""Reproducible benchmarks for the text processing services.
+
+``stages`` times each processing stage on documents of several sizes;
+``load`` drives a running service over HTTP or gRPC. Both save JSON
+results that ``results.compare`` checks for regressions.
+"""
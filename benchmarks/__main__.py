@@ -0,0 +1,116 @@
+"""Benchmark command line.
+
+    python -m benchmarks stages --output stages.json
+    python -m benchmarks load --target http --url http://localhost:8000 --rps 50 --output load.json
+    python -m benchmarks load --target grpc --address localhost:50051 --concurrency 16
+    python -m benchmarks compare baseline.json current.json --tolerance 0.1
+
+``stages`` and ``load`` also take ``--baseline``; any command that finds a
+regression exits with status 1.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+
+from benchmarks import corpus, load, results, stages
+
+
+def _add_output_arguments(parser):
+    parser.add_argument('--output', help="Write the result as JSON to this file")
+    parser.add_argument('--baseline', help="Earlier result to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="Allowed relative slowdown before a metric counts as regressed (default: 0.1)")
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Text processing benchmarks")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    stage_parser = commands.add_parser('stages', help="Micro-benchmark each processing stage by document size")
+    stage_parser.add_argument('--buckets', nargs='+', choices=sorted(corpus.SIZE_BUCKETS),
+                              default=list(corpus.DEFAULT_BUCKETS))
+    stage_parser.add_argument('--repeat', type=int, default=20, help="Timed runs per stage and size")
+    stage_parser.add_argument('--max-seconds', type=float, default=10.0,
+                              help="Stop timing a stage after this long, once it has three samples")
+    stage_parser.add_argument('--sentiment-engine', choices=('lexicon', 'textblob'))
+    stage_parser.add_argument('--corpus', default=corpus.CORPUS_PATH)
+    _add_output_arguments(stage_parser)
+
+    load_parser = commands.add_parser('load', help="Drive /summarize or ProcessText with the corpus")
+    load_parser.add_argument('--target', choices=load.TARGETS, default='http')
+    load_parser.add_argument('--url', default='http://localhost:8000', help="Serving service base URL")
+    load_parser.add_argument('--address', default='localhost:50051', help="Processing service address")
+    load_parser.add_argument('--rps', type=float, help="Fixed request rate; closed loop when omitted")
+    load_parser.add_argument('--concurrency', type=int, default=10, help="Clients in closed-loop mode")
+    load_parser.add_argument('--max-in-flight', type=int, default=1000,
+                             help="Outstanding requests before fixed-rate requests are skipped")
+    load_parser.add_argument('--duration', type=float, default=30.0, help="Measured seconds")
+    load_parser.add_argument('--warmup', type=float, default=5.0, help="Unmeasured seconds first")
+    load_parser.add_argument('--timeout', type=float, default=30.0, help="Per-request timeout in seconds")
+    load_parser.add_argument('--size', choices=sorted(corpus.SIZE_BUCKETS),
+                             help="Send one document of this size instead of the corpus texts")
+    load_parser.add_argument('--repeat-texts', action='store_true',
+                             help="Send the texts unchanged instead of unique per request, to measure cache hits")
+    load_parser.add_argument('--server-pid', type=int, help="Report this process's RSS (same host only)")
+    load_parser.add_argument('--corpus', default=corpus.CORPUS_PATH)
+    _add_output_arguments(load_parser)
+
+    compare_parser = commands.add_parser('compare', help="Compare two saved results")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--tolerance', type=float, default=0.1)
+
+    return parser.parse_args(argv)
+
+
+def _report(result, args):
+    """Save and print the result; returns the exit status"""
+    if args.output:
+        results.save(result, args.output)
+    print(json.dumps(result["results"], indent=2, sort_keys=True))
+    if args.baseline:
+        return _check(results.load(args.baseline), result, args.tolerance)
+    return 0
+
+
+def _check(baseline, current, tolerance):
+    regressions = results.compare(baseline, current, tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    if not regressions:
+        print(f"No regressions beyond {tolerance:.0%}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # One line per request would drown the summary
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    if args.command == 'compare':
+        return _check(results.load(args.baseline), results.load(args.current), args.tolerance)
+
+    if args.command == 'stages':
+        result = stages.run(args.buckets, args.repeat, args.max_seconds, args.corpus, args.sentiment_engine)
+        return _report(result, args)
+
+    texts = corpus.load_corpus(args.corpus)
+    if args.size:
+        texts = [corpus.document_of_size(texts, corpus.SIZE_BUCKETS[args.size])]
+    if args.target == 'http':
+        target = load.HTTPTarget(args.url, args.timeout, connections=max(args.concurrency, 100))
+    else:
+        target = load.GRPCTarget(args.address, args.timeout)
+    result = asyncio.run(load.run(
+        target, texts, rps=args.rps, concurrency=args.concurrency, duration=args.duration,
+        warmup=args.warmup, server_pid=args.server_pid, max_in_flight=args.max_in_flight,
+        unique=not args.repeat_texts
+    ))
+    return _report(result, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
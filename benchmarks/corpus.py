@@ -0,0 +1,49 @@
+import json
+import os
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'corpus.jsonl')
+
+# Document sizes in characters; they straddle the inline, pool and chunked tiers
+SIZE_BUCKETS = {
+    'tweet': 280,
+    'review': 2000,
+    'article': 20000,
+    'report': 200000,
+    'book': 1000000,
+}
+
+DEFAULT_BUCKETS = ('tweet', 'review', 'article', 'report')
+
+
+def load_corpus(path=CORPUS_PATH):
+    """Texts of a requests.jsonl-style file: one JSON object with a ``text`` field per line"""
+    texts = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                texts.append(json.loads(line)["text"])
+    if not texts:
+        raise ValueError(f"No texts in {path}")
+    return texts
+
+
+def document_of_size(corpus, chars):
+    """A document of at most ``chars`` characters built from corpus texts, ending on a sentence.
+
+    Always the same document for the same corpus and size, so runs compare.
+    """
+    parts = []
+    length = 0
+    index = 0
+    while length < chars:
+        text = corpus[index % len(corpus)]
+        parts.append(text)
+        length += len(text) + 2
+        index += 1
+    document = '\n\n'.join(parts)[:chars]
+    end = document.rfind('. ')
+    return document[:end + 1] if end > 0 else document
+
+
+def bucket_documents(corpus, buckets=DEFAULT_BUCKETS):
+    return {bucket: document_of_size(corpus, SIZE_BUCKETS[bucket]) for bucket in buckets}
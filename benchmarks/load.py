@@ -0,0 +1,194 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import Counter
+
+from benchmarks import results
+
+logger = logging.getLogger(__name__)
+
+TARGETS = ('http', 'grpc')
+
+
+class HTTPTarget:
+    """Sends texts to the serving service's /summarize endpoint"""
+
+    def __init__(self, url, timeout=30.0, connections=100):
+        import httpx
+        self._httpx = httpx
+        self.client = httpx.AsyncClient(
+            base_url=url, timeout=timeout, limits=httpx.Limits(max_connections=connections)
+        )
+
+    async def send(self, text):
+        try:
+            response = await self.client.post('/summarize', json={"text": text})
+        except self._httpx.TimeoutException:
+            return 'timeout'
+        except self._httpx.HTTPError:
+            return 'connection_error'
+        if response.status_code != 200:
+            return f"http_{response.status_code}"
+        return 'ok' if response.json().get("success") else 'failed'
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class GRPCTarget:
+    """Sends texts to the processing service's ProcessText RPC"""
+
+    def __init__(self, address, timeout=30.0):
+        import grpc
+        from textproc import text_processor_pb2, text_processor_pb2_grpc
+        self._grpc = grpc
+        self._request = text_processor_pb2.ProcessTextRequest
+        self.timeout = timeout
+        max_message_bytes = 64 * 1024 * 1024
+        self.channel = grpc.aio.insecure_channel(address, options=[
+            ('grpc.max_send_message_length', max_message_bytes),
+            ('grpc.max_receive_message_length', max_message_bytes),
+        ])
+        self.stub = text_processor_pb2_grpc.TextProcessorStub(self.channel)
+
+    async def send(self, text):
+        try:
+            await self.stub.ProcessText(self._request(text=text), timeout=self.timeout)
+        except self._grpc.aio.AioRpcError as e:
+            return e.code().name.lower()
+        return 'ok'
+
+    async def close(self):
+        await self.channel.close()
+
+
+def request_texts(texts, unique=True):
+    """Endless iterator over ``texts`` giving the text of each request.
+
+    Both services cache results and merge identical requests in flight, so
+    replaying the corpus would time cache hits after the first pass. Unless
+    ``unique`` is false, every request gets a closing sentence with a nonce
+    of its own.
+    """
+    run = os.urandom(4).hex()
+    for index, text in enumerate(itertools.cycle(texts)):
+        yield f"{text} Request {run} {index} ends here." if unique else text
+
+
+async def closed_loop(send, texts, concurrency, duration):
+    """``concurrency`` clients each sending the next of ``texts`` as soon as the last is answered.
+
+    Returns (status, latency) records and the elapsed time.
+    """
+    loop = asyncio.get_running_loop()
+    records = []
+    started = loop.time()
+    end = started + duration
+
+    async def client():
+        while loop.time() < end:
+            text = next(texts)
+            start = time.perf_counter()
+            status = await send(text)
+            records.append((status, time.perf_counter() - start))
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return records, loop.time() - started
+
+
+async def open_loop(send, texts, rps, duration, max_in_flight=1000):
+    """Requests started at a fixed rate whether or not earlier ones have been answered.
+
+    Latency counts from when a request was due, so a stalled service can't
+    hide its queueing by slowing the generator down. Requests due while
+    ``max_in_flight`` are outstanding are recorded as ``skipped``.
+    """
+    loop = asyncio.get_running_loop()
+    records = []
+    pending = set()
+    started = loop.time()
+
+    async def request(text, due):
+        status = await send(text)
+        records.append((status, loop.time() - due))
+
+    for index in itertools.count():
+        due = started + index / rps
+        if due >= started + duration:
+            break
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(pending) >= max_in_flight:
+            records.append(('skipped', 0.0))
+            continue
+        task = asyncio.create_task(request(next(texts), due))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    await asyncio.gather(*pending)
+    return records, loop.time() - started
+
+
+def summarize(records, elapsed):
+    statuses = Counter(status for status, _ in records)
+    latencies = [latency for status, latency in records if status == 'ok']
+    return {
+        "requests": len(records),
+        "statuses": dict(statuses),
+        "error_rate": 1 - statuses['ok'] / len(records) if records else 0.0,
+        "throughput_rps": statuses['ok'] / elapsed if elapsed else 0.0,
+        "latency_seconds": results.percentiles(latencies),
+        "elapsed_seconds": elapsed,
+    }
+
+
+async def run(target, texts, rps=None, concurrency=10, duration=30.0, warmup=5.0, server_pid=None,
+              max_in_flight=1000, unique=True):
+    """Drive ``target`` with ``texts`` at a fixed rate (``rps``) or in a closed loop.
+
+    A ``warmup`` period in the same mode runs first and is not recorded.
+    With ``unique`` false the texts are sent unchanged, so repeats can be
+    answered from the service's cache.
+    """
+    requests = request_texts(texts, unique)
+
+    async def drive(seconds):
+        if rps:
+            return await open_loop(target.send, requests, rps, seconds, max_in_flight)
+        return await closed_loop(target.send, requests, concurrency, seconds)
+
+    try:
+        if warmup:
+            await drive(warmup)
+        records, elapsed = await drive(duration)
+    finally:
+        await target.close()
+
+    summary = summarize(records, elapsed)
+    logger.info(
+        f"{summary['requests']} requests in {elapsed:.1f}s, {summary['throughput_rps']:.1f} ok/s, "
+        f"p99 {summary['latency_seconds'].get('p99', 0) * 1000:.1f} ms, statuses {summary['statuses']}"
+    )
+    return {
+        "benchmark": "load",
+        "environment": results.environment(),
+        "config": {
+            "mode": "open" if rps else "closed",
+            "rps": rps,
+            "concurrency": None if rps else concurrency,
+            "duration_seconds": duration,
+            "warmup_seconds": warmup,
+            "texts": len(texts),
+            "unique_texts": unique,
+            "mean_chars": sum(len(text) for text in texts) / len(texts),
+        },
+        "results": {"load": summary},
+        "rss_bytes": {
+            "client_peak": results.peak_rss_bytes(),
+            "server": results.rss_bytes(server_pid) if server_pid else None,
+            "server_peak": results.peak_rss_bytes(server_pid) if server_pid else None,
+        },
+    }
@@ -0,0 +1,113 @@
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+# Result fields where a bigger number is a regression, and where a smaller one is
+LOWER_IS_BETTER = ('p50', 'p95', 'p99', 'mean')
+HIGHER_IS_BETTER = ('throughput_rps',)
+
+
+def percentiles(samples):
+    """p50/p95/p99 (nearest rank), mean, min, max and count of latency samples in seconds"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "min": ordered[0],
+        "p50": rank(50),
+        "p95": rank(95),
+        "p99": rank(99),
+        "max": ordered[-1],
+    }
+
+
+def _proc_status(pid, field):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def rss_bytes(pid='self'):
+    """Current resident set size of a process, or None where /proc is unavailable"""
+    return _proc_status(pid, 'VmRSS')
+
+
+def peak_rss_bytes(pid='self'):
+    """Peak resident set size of a process"""
+    peak = _proc_status(pid, 'VmHWM')
+    if peak is None and pid == 'self':
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak *= 1 if sys.platform == 'darwin' else 1024
+    return peak
+
+
+def environment():
+    """Where a result was measured, so runs on different machines are not compared blindly"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit,
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def save(result, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(baseline, current, tolerance=0.1):
+    """Regressions of ``current`` against ``baseline``, as human-readable lines.
+
+    Latency percentiles may grow and throughput may shrink by ``tolerance``
+    (a fraction) before they count; metrics missing from either side are
+    skipped.
+    """
+    regressions = []
+
+    def walk(old, new, path):
+        if isinstance(old, dict) and isinstance(new, dict):
+            for key in old:
+                if key in new:
+                    walk(old[key], new[key], path + (key,))
+            return
+        if not isinstance(old, (int, float)) or not isinstance(new, (int, float)) or not old:
+            return
+        name = '.'.join(path)
+        if path[-1] in LOWER_IS_BETTER and new > old * (1 + tolerance):
+            regressions.append(f"{name}: {old:.6g} -> {new:.6g} (+{(new / old - 1) * 100:.1f}%)")
+        elif path[-1] in HIGHER_IS_BETTER and new < old * (1 - tolerance):
+            regressions.append(f"{name}: {old:.6g} -> {new:.6g} ({(new / old - 1) * 100:.1f}%)")
+
+    walk(baseline.get("results", {}), current.get("results", {}), ())
+    return regressions
@@ -0,0 +1,68 @@
+import logging
+import time
+
+from benchmarks import corpus, results
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('tokenize', 'summarize', 'sentiment', 'keywords')
+
+
+def _stage_calls(processor, text):
+    """The stages of the shared TextProcessor, each fed the same tokenized document"""
+    document = processor.tokenize(text)
+    return {
+        'tokenize': lambda: processor.tokenize(text),
+        'summarize': lambda: processor.extractive_summarization(text, 2, document=document),
+        'sentiment': lambda: processor.analyze_sentiment(text, document=document),
+        'keywords': lambda: processor.extract_keywords(text, document=document),
+    }
+
+
+def time_call(call, repeat, warmup=1, max_seconds=10.0):
+    """Durations of ``repeat`` calls after ``warmup`` untimed ones.
+
+    Stops early, after at least three samples, once ``max_seconds`` is spent
+    so the largest documents don't take the whole run.
+    """
+    for _ in range(warmup):
+        call()
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < repeat:
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+        if len(samples) >= 3 and time.perf_counter() - started > max_seconds:
+            break
+    return samples
+
+
+def run(buckets=corpus.DEFAULT_BUCKETS, repeat=20, max_seconds=10.0, corpus_path=corpus.CORPUS_PATH,
+        sentiment_engine=None):
+    """Micro-benchmark every processing stage on a document of each size bucket"""
+    from textproc import TextProcessor
+
+    processor = TextProcessor(sentiment_engine=sentiment_engine)
+    documents = corpus.bucket_documents(corpus.load_corpus(corpus_path), buckets)
+
+    measured = {}
+    for bucket, text in documents.items():
+        calls = _stage_calls(processor, text)
+        measured[bucket] = {"chars": len(text)}
+        for stage in STAGES:
+            samples = time_call(calls[stage], repeat, max_seconds=max_seconds)
+            measured[bucket][stage] = results.percentiles(samples)
+            logger.info(f"{bucket} ({len(text)} chars) {stage}: p50 {measured[bucket][stage]['p50'] * 1000:.2f} ms")
+
+    return {
+        "benchmark": "stages",
+        "environment": results.environment(),
+        "config": {
+            "buckets": list(buckets),
+            "repeat": repeat,
+            "sentiment_engine": processor.sentiment_engine,
+        },
+        "results": measured,
+        "rss_bytes": {"peak": results.peak_rss_bytes()},
+    }
@@ -0,0 +1,80 @@
+import asyncio
+import sys
+import os
+
+# Add the repository root to Python path to import the benchmarks package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from benchmarks import corpus, load, results, stages
+
+
+class TestCorpus:
+    def test_documents_are_sized_and_reproducible(self):
+        """Test that bucket documents stay under their size, end on a sentence and never change"""
+        texts = corpus.load_corpus()
+        documents = corpus.bucket_documents(texts, ('tweet', 'article'))
+
+        assert len(texts) >= 50
+        for bucket, document in documents.items():
+            assert corpus.SIZE_BUCKETS[bucket] * 0.8 < len(document) <= corpus.SIZE_BUCKETS[bucket]
+            assert document.endswith('.')
+        assert documents == corpus.bucket_documents(corpus.load_corpus(), ('tweet', 'article'))
+
+
+class TestResults:
+    def test_percentiles(self):
+        """Test nearest-rank percentiles"""
+        summary = results.percentiles([i / 100 for i in range(1, 101)])
+
+        assert (summary["p50"], summary["p95"], summary["p99"], summary["count"]) == (0.5, 0.95, 0.99, 100)
+        assert results.percentiles([]) == {"count": 0}
+
+    def test_compare_flags_slower_latency_and_lower_throughput(self):
+        """Test that only changes beyond the tolerance, in the bad direction, are regressions"""
+        baseline = {"results": {"load": {"throughput_rps": 100.0, "latency_seconds": {"p50": 0.010, "p99": 0.050}}}}
+        current = {"results": {"load": {"throughput_rps": 85.0, "latency_seconds": {"p50": 0.0105, "p99": 0.030}}}}
+
+        regressions = results.compare(baseline, current, tolerance=0.1)
+
+        assert len(regressions) == 1 and regressions[0].startswith("load.throughput_rps")
+        assert results.compare(baseline, baseline) == []
+
+
+class TestLoadGenerator:
+    def test_closed_and_open_loop(self):
+        """Test both load modes against a fake target"""
+        sent = []
+
+        async def send(text):
+            sent.append(text)
+            await asyncio.sleep(0.01)
+            return 'ok' if len(sent) % 5 else 'http_429'
+
+        records, elapsed = asyncio.run(
+            load.closed_loop(send, load.request_texts(["a", "b"]), concurrency=4, duration=0.2)
+        )
+        summary = load.summarize(records, elapsed)
+        assert summary["requests"] == len(sent) > 20
+        assert len(set(sent)) == len(sent)
+        assert set(summary["statuses"]) == {"ok", "http_429"}
+        assert summary["latency_seconds"]["p50"] >= 0.01
+
+        async def slow_send(text):
+            await asyncio.sleep(0.05)
+            return 'ok'
+
+        records, elapsed = asyncio.run(load.open_loop(slow_send, load.request_texts(["a"]), rps=100, duration=0.3, max_in_flight=2))
+        statuses = load.summarize(records, elapsed)["statuses"]
+        assert len(records) == 30
+        assert statuses["ok"] > 0 and statuses["skipped"] > 0
+
+
+class TestStages:
+    def test_stage_timings(self):
+        """Test that every stage is timed on each requested bucket"""
+        result = stages.run(buckets=('tweet',), repeat=3)
+
+        timings = result["results"]["tweet"]
+        assert set(stages.STAGES) <= set(timings)
+        assert all(timings[stage]["count"] == 3 for stage in stages.STAGES)
+        assert result["environment"]["python"]
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+import os
+
+from grpc_health.v1 import health, health_pb2
+
+from textproc.admission import readiness_problem
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = 'text_processor.TextProcessor'
+
+
+class HealthReporter(health.aio.HealthServicer):
+    """Standard grpc.health.v1 service backed by the processor's own state.
+
+    Reports NOT_SERVING until the worker pool has loaded its models, while
+    the admission queue is full, and while requests are running but none has
+    finished for ``stall_seconds`` (wedged workers). Answering a probe only
+    reads counters, so it costs nothing next to a real request.
+    """
+
+    def __init__(self, service, stall_seconds=None):
+        super().__init__()
+        self.service = service
+        self.stall_seconds = stall_seconds or float(os.getenv('HEALTH_STALL_SECONDS', '60'))
+        self.reason = None
+
+    def evaluate(self):
+        """Current (status, reason); reason is None when serving"""
+        reason = readiness_problem(self.service.worker_pool, self.service.admission, self.stall_seconds)
+        if reason is not None:
+            return health_pb2.HealthCheckResponse.NOT_SERVING, reason
+        return health_pb2.HealthCheckResponse.SERVING, None
+
+    async def refresh(self):
+        status, reason = self.evaluate()
+        if reason != self.reason:
+            logger.info(f"Health changed to {health_pb2.HealthCheckResponse.ServingStatus.Name(status)}"
+                        f"{f' ({reason})' if reason else ''}")
+            self.reason = reason
+        for service in ('', SERVICE_NAME):
+            await self.set(service, status)
+
+    async def Check(self, request, context):
+        await self.refresh()
+        return await super().Check(request, context)
+
+    async def run(self, interval=None):
+        """Keep Watch subscribers up to date"""
+        interval = interval or float(os.getenv('HEALTH_REFRESH_SECONDS', '1'))
+        while True:
+            await self.refresh()
+            await asyncio.sleep(interval)
@@ -3,30 +3,25 @@ from concurrent import futures
 import logging
 import asyncio
 from grpc import aio
-import nltk
-from textblob import TextBlob
-from collections import Counter
 import re
 import sys
 import os
+import json
+import time
+from contextlib import contextmanager
 
 # Import the generated gRPC files
-import text_processor_pb2
-import text_processor_pb2_grpc
-
-# Download required NLTK data
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
-
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
-
-from nltk.corpus import stopwords
-from nltk.tokenize import sent_tokenize, word_tokenize
+from textproc import text_processor_pb2, text_processor_pb2_grpc
+from grpc_health.v1 import health_pb2_grpc
+from textproc import analysis, engines, keepalive, metrics, profiling, tiers
+from textproc.admission import Rejected, create_admission
+from textproc.aggregates import create_aggregates
+from textproc.cache import cache_key, create_cache, protobuf_codec
+from textproc.coalescing import SingleFlight
+from textproc.jobs import create_jobs
+from textproc.pipeline import TextProcessor, compute
+from textproc.workers import WorkerPool
+from readiness import HealthReporter
 
 # Configure logging
 logging.basicConfig(
@@ -35,13 +30,73 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+RPC_HANDLED = metrics.REGISTRY.counter(
+    'grpc_server_handled_total', 'RPCs completed, by method and status code', ('grpc_method', 'grpc_code')
+)
+RPC_LATENCY = metrics.REGISTRY.histogram(
+    'grpc_server_handling_seconds', 'Time to complete an RPC', ('grpc_method',)
+)
+RPC_IN_FLIGHT = metrics.REGISTRY.gauge(
+    'grpc_server_in_flight', 'RPCs currently being handled', ('grpc_method',)
+)
+
+
+def _code_name(code):
+    # The servicer context reports None until a handler sets a code
+    return code.name if isinstance(code, grpc.StatusCode) else 'OK'
+
+
+@contextmanager
+def observed_rpc(method, context):
+    """Count, time and track one RPC under its method and final status code"""
+    in_flight = RPC_IN_FLIGHT.labels(method)
+    in_flight.inc()
+    start = time.perf_counter()
+    code = None
+    try:
+        yield
+    except (asyncio.CancelledError, GeneratorExit):
+        code = grpc.StatusCode.CANCELLED
+        raise
+    except Exception:
+        code = grpc.StatusCode.UNKNOWN
+        raise
+    finally:
+        in_flight.dec()
+        RPC_LATENCY.labels(method).observe(time.perf_counter() - start)
+        RPC_HANDLED.labels(method, _code_name(code or context.code())).inc()
+
 class TextProcessorService(text_processor_pb2_grpc.TextProcessorServicer):
-    def __init__(self):
-        self.stop_words = set(stopwords.words('english'))
+    def __init__(self, stream_window=None, worker_mode='inline', max_workers=None, cache=None,
+                 sentiment_engine=None, tier_policy=None, admission=None, profiler=None, aggregates=None):
+        self.processor = TextProcessor(sentiment_engine)
+        # Maximum number of documents per stream that are being processed or
+        # waiting to be sent before we stop reading from the client
+        self.stream_window = stream_window or int(os.getenv('STREAM_MAX_IN_FLIGHT', '32'))
+        self.worker_pool = WorkerPool(self.processor, worker_mode, max_workers)
+        self.cache = cache
+        # Identical texts arriving together share one computation
+        self.in_flight = SingleFlight()
+        self.tier_policy = tier_policy or tiers.TierPolicy()
+        self.tier_policy.check_engines(self.processor)
+        # Enough concurrent requests to keep every worker busy while the loop
+        # handles small texts; more wait in a bounded queue or are refused
+        self.admission = admission or create_admission(2 * self.worker_pool.max_workers)
+        self.health = HealthReporter(self)
+        self.profiler = profiler or profiling.Profiler(service='processing')
+        # Rolling keyword and sentiment counts over every document answered
+        self.aggregates = aggregates
+        # Background queue for SubmitJob, set up by serve() with run_job as its handler
+        self.jobs = None
         logger.info("TextProcessorService initialized")
 
     async def ProcessText(self, request, context):
         """Process text with summarization and sentiment analysis"""
+        with observed_rpc('ProcessText', context), \
+                self.profiler.profile('ProcessText', self._profile_requested(context)):
+            return await self._process_text(request, context)
+
+    async def _process_text(self, request, context):
         try:
             logger.info(f"Processing text request with {len(request.text)} characters")
             
@@ -51,123 +106,429 @@ class TextProcessorService(text_processor_pb2_grpc.TextProcessorServicer):
                 context.set_details("Text cannot be empty")
                 return text_processor_pb2.ProcessTextResponse()
 
-            # Perform text processing
-            summary = self._extractive_summarization(request.text)
-            sentiment = self._analyze_sentiment(request.text)
-            keywords = self._extract_keywords(request.text, top_n=5)
-            
-            # Create response
-            response = text_processor_pb2.ProcessTextResponse(
-                summary=summary,
-                sentiment=sentiment,
-                keywords=keywords,
-                original_length=len(request.text),
-                processed_length=len(summary)
-            )
+            if self.tier_policy.too_large(request.text):
+                logger.warning(f"Rejected text of {len(request.text)} characters")
+                context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+                context.set_details(self._too_large_details())
+                return text_processor_pb2.ProcessTextResponse()
+
+            try:
+                options = self._options(request)
+            except ValueError as e:
+                context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+                context.set_details(str(e))
+                return text_processor_pb2.ProcessTextResponse()
+
+            # Admission is taken by the computation, so requests that share one do not hold a slot each
+            response = await self._analyze(request.text, options, self._admission_ticket(context))
             
             logger.info("Text processing completed successfully")
             return response
 
+        except Rejected as e:
+            code, details = self._rejection_status(e)
+            logger.warning(f"Shed text request: {e.reason}")
+            context.set_code(code)
+            context.set_details(details)
+            return text_processor_pb2.ProcessTextResponse()
+
         except Exception as e:
             logger.error(f"Error processing text: {str(e)}")
             context.set_code(grpc.StatusCode.INTERNAL)
             context.set_details(f"Processing error: {str(e)}")
             return text_processor_pb2.ProcessTextResponse()
 
-    def _extractive_summarization(self, text, num_sentences=2):
-        """Simple extractive summarization based on sentence scoring"""
+    async def ProcessTextBatch(self, request, context):
+        """Process many texts in one call, reporting a status per item"""
+        with observed_rpc('ProcessTextBatch', context), \
+                self.profiler.profile('ProcessTextBatch', self._profile_requested(context)):
+            return await self._process_batch(request, context)
+
+    async def _process_batch(self, request, context):
         try:
-            sentences = sent_tokenize(text)
-            
-            if len(sentences) <= num_sentences:
-                return text
-            
-            # Score sentences based on word frequency
-            words = word_tokenize(text.lower())
-            words = [word for word in words if word.isalnum() and word not in self.stop_words]
-            
-            word_freq = Counter(words)
-            
-            sentence_scores = {}
-            for sentence in sentences:
-                sentence_words = word_tokenize(sentence.lower())
-                sentence_words = [word for word in sentence_words if word.isalnum()]
-                
-                score = 0
-                word_count = 0
-                for word in sentence_words:
-                    if word in word_freq:
-                        score += word_freq[word]
-                        word_count += 1
-                
-                if word_count > 0:
-                    sentence_scores[sentence] = score / word_count
-            
-            # Get top sentences
-            top_sentences = sorted(sentence_scores.items(), key=lambda x: x[1], reverse=True)
-            summary_sentences = [sent[0] for sent in top_sentences[:num_sentences]]
-            
-            # Maintain original order
-            summary = []
-            for sentence in sentences:
-                if sentence in summary_sentences:
-                    summary.append(sentence)
-            
-            return ' '.join(summary)
-            
+            logger.info(f"Processing batch of {len(request.requests)} texts")
+
+            # The batch takes one slot; its items share it
+            async with self.admission.admit(*self._admission_ticket(context)):
+                results = await asyncio.gather(*(
+                    self._process_item(item) for item in request.requests
+                ))
+
+            failed = sum(1 for result in results if result.code != grpc.StatusCode.OK.value[0])
+            logger.info(f"Batch processing completed: {len(results) - failed} succeeded, {failed} failed")
+            return text_processor_pb2.ProcessTextBatchResponse(results=results)
+
+        except Rejected as e:
+            code, details = self._rejection_status(e)
+            logger.warning(f"Shed batch of {len(request.requests)} texts: {e.reason}")
+            context.set_code(code)
+            context.set_details(details)
+            return text_processor_pb2.ProcessTextBatchResponse()
+
         except Exception as e:
-            logger.error(f"Error in summarization: {str(e)}")
-            return text[:200] + "..." if len(text) > 200 else text
+            logger.error(f"Error processing batch: {str(e)}")
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Processing error: {str(e)}")
+            return text_processor_pb2.ProcessTextBatchResponse()
+
+    async def ProcessTextStream(self, request_iterator, context):
+        """Process a continuous stream of texts, yielding results as each finishes"""
+        with observed_rpc('ProcessTextStream', context):
+            async for response in self._process_stream(request_iterator, context):
+                yield response
+
+    async def _process_stream(self, request_iterator, context):
+        window = asyncio.Semaphore(self.stream_window)
+        results = asyncio.Queue()
+        pending = set()
+        received = 0
+        priority, deadline = self._admission_ticket(context)
+        profile_requested = self._profile_requested(context)
+
+        async def process(item):
+            # Every document of a stream needs its own slot, and is sampled on its own
+            try:
+                async with self.admission.admit(priority, deadline):
+                    with self.profiler.profile('ProcessTextStream', profile_requested):
+                        result = await self._process_item(item)
+            except Rejected as e:
+                code, details = self._rejection_status(e)
+                result = text_processor_pb2.ProcessTextBatchResult(code=code.value[0], details=details)
+            await results.put(text_processor_pb2.ProcessTextStreamResponse(id=item.id, result=result))
+
+        async def read_requests():
+            nonlocal received
+            try:
+                async for item in request_iterator:
+                    # Backpressure: stop reading until a result has been sent
+                    await window.acquire()
+                    received += 1
+                    task = asyncio.create_task(process(item))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                await asyncio.gather(*pending)
+            finally:
+                results.put_nowait(None)
 
-    def _analyze_sentiment(self, text):
-        """Analyze sentiment using TextBlob"""
+        logger.info("Processing text stream")
+        reader = asyncio.create_task(read_requests())
         try:
-            blob = TextBlob(text)
-            polarity = blob.sentiment.polarity
-            
-            if polarity > 0.1:
-                return "positive"
-            elif polarity < -0.1:
-                return "negative"
-            else:
-                return "neutral"
-                
-        except Exception as e:
-            logger.error(f"Error in sentiment analysis: {str(e)}")
-            return "neutral"
+            while True:
+                response = await results.get()
+                if response is None:
+                    # Re-raise any error from reading the request stream
+                    await reader
+                    break
+                window.release()
+                yield response
+        finally:
+            reader.cancel()
+            for task in list(pending):
+                task.cancel()
+
+        logger.info(f"Text stream completed after {received} texts")
+
+    async def _process_item(self, item):
+        """Process one batch or stream entry without letting its failure escape"""
+        text = item.text
+        if not text.strip():
+            return text_processor_pb2.ProcessTextBatchResult(
+                code=grpc.StatusCode.INVALID_ARGUMENT.value[0],
+                details="Text cannot be empty"
+            )
+
+        if self.tier_policy.too_large(text):
+            return text_processor_pb2.ProcessTextBatchResult(
+                code=grpc.StatusCode.INVALID_ARGUMENT.value[0],
+                details=self._too_large_details()
+            )
 
-    def _extract_keywords(self, text, top_n=5):
-        """Extract keywords using simple frequency analysis"""
         try:
-            words = word_tokenize(text.lower())
-            words = [word for word in words if word.isalnum() and len(word) > 2 and word not in self.stop_words]
-            
-            word_freq = Counter(words)
-            top_words = word_freq.most_common(top_n)
-            
-            return [word for word, _ in top_words]
-            
+            options = self._options(item)
+        except ValueError as e:
+            return text_processor_pb2.ProcessTextBatchResult(
+                code=grpc.StatusCode.INVALID_ARGUMENT.value[0],
+                details=str(e)
+            )
+
+        try:
+            return text_processor_pb2.ProcessTextBatchResult(
+                code=grpc.StatusCode.OK.value[0],
+                response=await self._analyze(text, options)
+            )
         except Exception as e:
-            logger.error(f"Error in keyword extraction: {str(e)}")
-            return []
+            logger.error(f"Error processing batch item: {str(e)}")
+            return text_processor_pb2.ProcessTextBatchResult(
+                code=grpc.StatusCode.INTERNAL.value[0],
+                details=f"Processing error: {str(e)}"
+            )
+
+    async def GetAggregates(self, request, context):
+        """Top keywords and sentiment mix of the documents processed over the recent window"""
+        with observed_rpc('GetAggregates', context):
+            if self.aggregates is None:
+                context.set_code(grpc.StatusCode.FAILED_PRECONDITION)
+                context.set_details("Aggregates are disabled (AGGREGATE_WINDOW_SECONDS=0)")
+                return text_processor_pb2.GetAggregatesResponse()
+            if request.top_k < 0 or request.window_seconds < 0:
+                context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+                context.set_details("top_k and window_seconds cannot be negative")
+                return text_processor_pb2.GetAggregatesResponse()
+
+            snapshot = self.aggregates.snapshot(request.top_k or 20, request.window_seconds or None)
+            return text_processor_pb2.GetAggregatesResponse(
+                window_seconds=snapshot["window_seconds"],
+                documents=snapshot["documents"],
+                sentiment=snapshot["sentiment"],
+                keywords=[text_processor_pb2.KeywordCount(**entry) for entry in snapshot["keywords"]]
+            )
+
+    async def SubmitJob(self, request, context):
+        """Queue a text to be processed in the background and return its job straight away"""
+        with observed_rpc('SubmitJob', context):
+            if not self._jobs_enabled(context):
+                return text_processor_pb2.Job()
+            if not request.text.strip():
+                context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+                context.set_details("Text cannot be empty")
+                return text_processor_pb2.Job()
+            if self.tier_policy.too_large(request.text):
+                context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+                context.set_details(self._too_large_details())
+                return text_processor_pb2.Job()
+            try:
+                options = self._options(request)
+            except ValueError as e:
+                context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+                context.set_details(str(e))
+                return text_processor_pb2.Job()
+
+            try:
+                job = self.jobs.submit(request.text, options)
+            except Rejected:
+                context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
+                context.set_details("Too many queued jobs, retry later")
+                return text_processor_pb2.Job()
+            logger.info(f"Queued job {job.id} with {len(request.text)} characters")
+            return self._job_message(job)
+
+    async def GetJob(self, request, context):
+        """Status of a job, with its response once it succeeded"""
+        with observed_rpc('GetJob', context):
+            if not self._jobs_enabled(context):
+                return text_processor_pb2.Job()
+            return self._job_or_not_found(self.jobs.get(request.id), request.id, context)
+
+    async def CancelJob(self, request, context):
+        """Cancel a queued or running job; a finished one is returned unchanged"""
+        with observed_rpc('CancelJob', context):
+            if not self._jobs_enabled(context):
+                return text_processor_pb2.Job()
+            return self._job_or_not_found(self.jobs.cancel(request.id), request.id, context)
+
+    async def run_job(self, text, options):
+        """Job handler: process a text like ProcessText and return the response fields"""
+        response = await self._analyze(text, options)
+        return {
+            "summary": response.summary,
+            "sentiment": response.sentiment,
+            "keywords": list(response.keywords),
+            "original_length": response.original_length,
+            "processed_length": response.processed_length,
+        }
+
+    def _jobs_enabled(self, context):
+        if self.jobs is None:
+            context.set_code(grpc.StatusCode.FAILED_PRECONDITION)
+            context.set_details("The job API is disabled (JOB_CONCURRENCY=0)")
+            return False
+        return True
+
+    def _job_or_not_found(self, job, job_id, context):
+        if job is None:
+            context.set_code(grpc.StatusCode.NOT_FOUND)
+            context.set_details(f"No job {job_id}, or its result has expired")
+            return text_processor_pb2.Job()
+        return self._job_message(job)
+
+    @staticmethod
+    def _job_message(job):
+        return text_processor_pb2.Job(
+            id=job.id,
+            status=job.status,
+            created_at=job.created_at,
+            updated_at=job.updated_at,
+            expires_at=job.expires_at or 0.0,
+            response=text_processor_pb2.ProcessTextResponse(**job.result) if job.result is not None else None,
+            error=job.error or ''
+        )
+
+    def _options(self, request):
+        """Analysis options of a request, with the server defaults for unset fields"""
+        unknown = [feature for feature in request.features if feature not in analysis.FEATURES]
+        if unknown:
+            raise ValueError(f"Unknown features {unknown}, expected any of {list(analysis.FEATURES)}")
+        if request.num_sentences < 0 or request.top_n < 0:
+            raise ValueError("num_sentences and top_n cannot be negative")
+
+        engine = request.sentiment_engine or self.processor.sentiment_engine
+        engines.get('sentiment', engine)
+
+        # Canonical feature order, so equivalent requests share a cache key
+        features = tuple(feature for feature in analysis.FEATURES if feature in request.features)
+        return analysis.AnalysisOptions(
+            features=features or analysis.FEATURES,
+            num_sentences=request.num_sentences or analysis.DEFAULT_NUM_SENTENCES,
+            top_n=request.top_n or analysis.DEFAULT_TOP_N,
+            sentiment_engine=engine
+        )
+
+    def _admission_ticket(self, context):
+        """Priority from the x-priority metadata and the call's deadline in loop time"""
+        priority = dict(context.invocation_metadata() or ()).get('x-priority', 'normal')
+        remaining = context.time_remaining()
+        deadline = None if remaining is None else asyncio.get_running_loop().time() + remaining
+        return priority, deadline
+
+    @staticmethod
+    def _profile_requested(context):
+        return profiling.requested(dict(context.invocation_metadata() or ()).get('x-profile'))
+
+    def profile_admin(self, method, params):
+        """Admin endpoint: GET collapsed stacks, POST settings, DELETE to reset"""
+        if method == 'GET':
+            return 200, 'text/plain; charset=utf-8', self.profiler.collapsed()
+        if method == 'POST':
+            self.profiler.configure(
+                enabled=profiling.requested(params['enabled']) if 'enabled' in params else None,
+                sample_rate=float(params['sample_rate']) if 'sample_rate' in params else None,
+                mode=params.get('mode')
+            )
+        elif method == 'DELETE':
+            self.profiler.reset()
+        return 200, 'application/json', json.dumps(self.profiler.stats())
+
+    @staticmethod
+    def _rejection_status(rejected):
+        if rejected.reason == 'expired':
+            return grpc.StatusCode.DEADLINE_EXCEEDED, "Deadline expired while waiting to be processed"
+        return grpc.StatusCode.RESOURCE_EXHAUSTED, "Server is at capacity, retry later"
+
+    def _too_large_details(self):
+        return f"Text exceeds the maximum of {self.tier_policy.max_chars} characters"
+
+    async def _analyze(self, text, options, ticket=None):
+        """Process text in its size tier and count it in the aggregates.
+
+        With an admission ``ticket`` of (priority, deadline), a computation
+        holds a processing slot while it runs.
+        """
+        metrics.INPUT_CHARS.labels().observe(len(text))
+        response = await self._cached_compute(text, options, ticket)
+        if self.aggregates is not None:
+            self.aggregates.add(response.sentiment, response.keywords)
+        return response
+
+    async def _cached_compute(self, text, options, ticket=None):
+        """Answer repeated texts from the cache and identical concurrent ones from one computation"""
+        key = cache_key(text, **options._asdict())
+        shared = self.cache.get(key) if self.cache is not None else None
+        if shared is None:
+            shared = await self.in_flight.run(
+                key, lambda: self._compute_and_cache(key, text, options), self.admission, ticket
+            )
+
+        # Cached and coalesced responses are shared: callers get their own copy
+        response = text_processor_pb2.ProcessTextResponse()
+        response.CopyFrom(shared)
+        return response
+
+    async def _compute_and_cache(self, key, text, options):
+        response = await self._compute(text, options)
+        if self.cache is not None:
+            self.cache.set(key, response)
+        return response
+
+    async def _compute(self, text, options):
+        """Process text in its size tier and build the response"""
+        summary, label, keywords = await compute(self.processor, self.worker_pool, self.tier_policy, text, options)
+        with metrics.stage_timer('serialization'):
+            return self._response(text, summary, label, keywords)
+
+    def register_metrics(self, registry=metrics.REGISTRY):
+        """Export per-tier latency and cache, worker pool, admission, job and coalescing stats"""
+        self.tier_policy.register_metrics(registry)
+        registry.add_collector(lambda: metrics.component_families(
+            self.cache, self.worker_pool, self.admission, self.jobs, self.in_flight
+        ))
+
+    def _response(self, text, summary, label, keywords):
+        """Build the response, leaving analyses that did not run empty"""
+        summary = summary or ''
+        return text_processor_pb2.ProcessTextResponse(
+            summary=summary,
+            sentiment=label or '',
+            keywords=keywords or [],
+            original_length=len(text),
+            processed_length=len(summary)
+        )
 
 async def serve():
     """Start the gRPC server"""
-    server = aio.server(futures.ThreadPoolExecutor(max_workers=10))
-    text_processor_pb2_grpc.add_TextProcessorServicer_to_server(
-        TextProcessorService(), server)
+    service = TextProcessorService(
+        worker_mode=os.getenv('WORKER_MODE', 'process'),
+        max_workers=int(os.getenv('WORKER_COUNT', '0')) or None,
+        cache=create_cache('processing', codec=protobuf_codec(text_processor_pb2.ProcessTextResponse)),
+        aggregates=create_aggregates()
+    )
+    service.jobs = create_jobs(service.run_job, 'processing')
+    # Room for a maximum-size text at up to 4 bytes per character in UTF-8
+    max_message_bytes = 4 * service.tier_policy.max_chars + 1024 * 1024
+    server = aio.server(
+        futures.ThreadPoolExecutor(max_workers=10),
+        options=[
+            ('grpc.max_receive_message_length', max_message_bytes),
+            ('grpc.max_send_message_length', max_message_bytes),
+            *keepalive.server_options(),
+        ]
+    )
+    text_processor_pb2_grpc.add_TextProcessorServicer_to_server(service, server)
+    health_pb2_grpc.add_HealthServicer_to_server(service.health, server)
     
     listen_addr = '[::]:50051'
     server.add_insecure_port(listen_addr)
     
     logger.info(f"Starting gRPC server on {listen_addr}")
     await server.start()
+    if service.jobs is not None:
+        await service.jobs.start()
+
+    service.register_metrics()
+    metrics_port = int(os.getenv('METRICS_PORT', '9100'))
+    metrics_server = metrics.start_metrics_server(
+        metrics_port,
+        host=os.getenv('METRICS_HOST', '127.0.0.1'),
+        routes={'/debug/profile': service.profile_admin},
+        admin_token=os.getenv('PROFILE_ADMIN_TOKEN')
+    ) if metrics_port else None
+
+    # Health reports NOT_SERVING until the workers are started and warm
+    health_refresh = asyncio.create_task(service.health.run())
+    await service.worker_pool.warm_up()
     
     try:
         await server.wait_for_termination()
     except KeyboardInterrupt:
         logger.info("Shutting down gRPC server")
+        await service.health.enter_graceful_shutdown()
         await server.stop(0)
+    finally:
+        health_refresh.cancel()
+        if service.jobs is not None:
+            await service.jobs.close()
+        service.worker_pool.shutdown()
+        if metrics_server is not None:
+            metrics_server.shutdown()
 
 if __name__ == '__main__':
     asyncio.run(serve())
@@ -1,15 +1,44 @@
-import pytest
+import asyncio
+import json
+import os
+import pickle
+import pstats
+import sqlite3
+import subprocess
+import sys
+import time
+from unittest.mock import Mock
+
 import grpc
+import pytest
+from grpc_health.v1 import health_pb2, health_pb2_grpc
 from grpc_testing import server_from_dictionary, strict_real_time
-import sys
-import os
 
-# Add the parent directory to Python path to import modules
+# Add the service and the repository root (for textproc) to Python path to import modules
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'processor'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
-import text_processor_pb2
-import text_processor_pb2_grpc
+import server as server_module
+from readiness import SERVICE_NAME
 from server import TextProcessorService
+from textproc import (
+    engines, metrics, profiling, resources, sentiment, summarizer, text_processor_pb2, text_processor_pb2_grpc, workers
+)
+from textproc.admission import AdmissionController, Rejected
+from textproc.analysis import AnalysisOptions
+from textproc.cache import MemoryBackend, ResultCache, SqliteBackend, cache_key, protobuf_codec
+from textproc.tiers import TierPolicy, split_chunks
+
+def rpc_context(metadata=(), time_remaining=None):
+    """Servicer context stand-in carrying call metadata and deadline"""
+    return Mock(**{
+        "invocation_metadata.return_value": metadata,
+        "time_remaining.return_value": time_remaining,
+    })
+
+def process_inline(service, text, options=None):
+    """The response the service builds for text processed on the event loop"""
+    return service._response(text, *service.processor.process(text, options))
 
 class TestTextProcessorService:
     def setup_method(self):
@@ -29,9 +58,9 @@ class TestTextProcessorService:
         request = text_processor_pb2.ProcessTextRequest(text=text)
         
         # Call the method directly for unit testing
-        response = self.service._extractive_summarization(text)
-        sentiment = self.service._analyze_sentiment(text)
-        keywords = self.service._extract_keywords(text)
+        response = self.service.processor.extractive_summarization(text)
+        sentiment = self.service.processor.analyze_sentiment(text)
+        keywords = self.service.processor.extract_keywords(text)
         
         assert len(response) > 0
         assert sentiment in ['positive', 'negative', 'neutral']
@@ -39,13 +68,13 @@ class TestTextProcessorService:
 
     def test_empty_text(self):
         """Test handling of empty text"""
-        response = self.service._extractive_summarization("")
+        response = self.service.processor.extractive_summarization("")
         assert response == ""
         
-        sentiment = self.service._analyze_sentiment("")
+        sentiment = self.service.processor.analyze_sentiment("")
         assert sentiment == "neutral"
         
-        keywords = self.service._extract_keywords("")
+        keywords = self.service.processor.extract_keywords("")
         assert keywords == []
 
     def test_sentiment_analysis(self):
@@ -54,14 +83,14 @@ class TestTextProcessorService:
         negative_text = "This is terrible and awful. I hate it completely."
         neutral_text = "This is a chair. The chair is brown."
         
-        assert self.service._analyze_sentiment(positive_text) == "positive"
-        assert self.service._analyze_sentiment(negative_text) == "negative"
-        assert self.service._analyze_sentiment(neutral_text) == "neutral"
+        assert self.service.processor.analyze_sentiment(positive_text) == "positive"
+        assert self.service.processor.analyze_sentiment(negative_text) == "negative"
+        assert self.service.processor.analyze_sentiment(neutral_text) == "neutral"
 
     def test_keyword_extraction(self):
         """Test keyword extraction"""
         text = "machine learning artificial intelligence data science python programming"
-        keywords = self.service._extract_keywords(text, top_n=3)
+        keywords = self.service.processor.extract_keywords(text, top_n=3)
         
         assert len(keywords) <= 3
         assert isinstance(keywords, list)
@@ -76,11 +105,1059 @@ class TestTextProcessorService:
         Deep learning uses neural networks with multiple layers.
         """
         
-        summary = self.service._extractive_summarization(text, num_sentences=2)
+        summary = self.service.processor.extractive_summarization(text, num_sentences=2)
         
         assert len(summary) > 0
         assert len(summary) < len(text)
         assert isinstance(summary, str)
 
+    def test_tokenized_document_shared_by_stages(self):
+        """Test that every stage gives the same result from a pre-built document"""
+        text = """
+        Artificial intelligence is a fascinating field. 
+        It involves creating machines that can think and learn. 
+        Machine learning is a subset of artificial intelligence. 
+        Deep learning uses neural networks with multiple layers.
+        """
+        document = self.service.processor.tokenize(text)
+
+        assert len(document.sentences) == len(document.sentence_spans)
+        assert document.sentence_spans[-1][1] == len(document.tokens)
+        assert len(document.word_mask) == len(document.stop_mask) == len(document.tokens)
+        assert all(token == token.lower() for token in document.tokens)
+
+        assert self.service.processor.extractive_summarization(text, document=document) == \
+            self.service.processor.extractive_summarization(text)
+        assert self.service.processor.analyze_sentiment(text, document=document) == \
+            self.service.processor.analyze_sentiment(text)
+        assert self.service.processor.extract_keywords(text, document=document) == \
+            self.service.processor.extract_keywords(text)
+
+    def test_batch_processing_reports_per_item_status(self):
+        """Test that a bad document does not fail the rest of the batch"""
+        request = text_processor_pb2.ProcessTextBatchRequest(requests=[
+            text_processor_pb2.ProcessTextRequest(text="I love this amazing product! It's fantastic and wonderful!"),
+            text_processor_pb2.ProcessTextRequest(text="   "),
+            text_processor_pb2.ProcessTextRequest(text="This is terrible and awful. I hate it completely."),
+        ])
+
+        response = asyncio.run(self.service.ProcessTextBatch(request, rpc_context()))
+
+        assert len(response.results) == 3
+        assert [result.code for result in response.results] == [
+            grpc.StatusCode.OK.value[0],
+            grpc.StatusCode.INVALID_ARGUMENT.value[0],
+            grpc.StatusCode.OK.value[0],
+        ]
+        assert response.results[0].response.sentiment == "positive"
+        assert response.results[1].details == "Text cannot be empty"
+        assert response.results[2].response.sentiment == "negative"
+
+    def test_stream_processing_keyed_by_id(self):
+        """Test that stream results come back keyed by the client-supplied id"""
+        service = TextProcessorService(stream_window=2)
+        texts = {
+            "a": "I love this amazing product! It's fantastic and wonderful!",
+            "b": "",
+            "c": "This is terrible and awful. I hate it completely.",
+            "d": "This is a chair. The chair is brown.",
+        }
+
+        async def requests():
+            for doc_id, text in texts.items():
+                yield text_processor_pb2.ProcessTextStreamRequest(id=doc_id, text=text)
+
+        async def collect():
+            return [response async for response in service.ProcessTextStream(requests(), rpc_context())]
+
+        responses = {response.id: response.result for response in asyncio.run(collect())}
+
+        assert set(responses) == set(texts)
+        assert responses["a"].response.sentiment == "positive"
+        assert responses["b"].code == grpc.StatusCode.INVALID_ARGUMENT.value[0]
+        assert responses["c"].response.sentiment == "negative"
+        assert responses["d"].response.sentiment == "neutral"
+
+    @pytest.mark.parametrize("worker_mode", ["thread", "process"])
+    def test_process_text_in_worker_pool(self, worker_mode):
+        """Test that ProcessText gives the same result when run on a worker pool"""
+        text = "I love this amazing product! It's fantastic and wonderful!"
+        service = TextProcessorService(
+            worker_mode=worker_mode, max_workers=2, tier_policy=TierPolicy(inline_max_chars=1)
+        )
+        request = text_processor_pb2.ProcessTextRequest(text=text)
+
+        async def process():
+            await service.worker_pool.warm_up()
+            return await service.ProcessText(request, rpc_context())
+
+        try:
+            response = asyncio.run(process())
+        finally:
+            service.worker_pool.shutdown()
+
+        assert response == process_inline(self.service, text)
+
+    def test_process_text_uses_result_cache(self):
+        """Test that a repeated text is answered from the cache"""
+        cache = ResultCache(MemoryBackend(max_entries=10))
+        service = TextProcessorService(cache=cache)
+        text = "I love this amazing product! It's fantastic and wonderful!"
+
+        async def process(text):
+            return await service.ProcessText(text_processor_pb2.ProcessTextRequest(text=text), rpc_context())
+
+        first = asyncio.run(process(text))
+        second = asyncio.run(process(text))
+        padded = asyncio.run(process("  " + text + "\n"))
+
+        assert cache.hits == 1 and cache.misses == 2
+        assert second == first
+        assert padded.summary == "  " + text + "\n" and padded.original_length == len(text) + 3
+
+    def test_features_select_analyses(self):
+        """Test that only the requested analyses run, with per-request parameters"""
+        text = ("Solar power is growing fast. Wind farms produce cheap power. "
+                "Battery storage makes solar and wind power reliable. The weather was nice.")
+
+        def process(**fields):
+            context = rpc_context()
+            request = text_processor_pb2.ProcessTextRequest(text=text, **fields)
+            return asyncio.run(self.service.ProcessText(request, context)), context
+
+        sentiment_only, _ = process(features=["sentiment"])
+        assert sentiment_only.sentiment == "positive"
+        assert sentiment_only.summary == "" and list(sentiment_only.keywords) == []
+
+        keywords_only, _ = process(features=["keywords"], top_n=2)
+        assert list(keywords_only.keywords) == ["power", "solar"]
+        assert keywords_only.summary == "" and keywords_only.sentiment == ""
+
+        summary_only, _ = process(features=["summary"], num_sentences=1)
+        assert summary_only.summary == "Solar power is growing fast."
+        assert summary_only.processed_length == len(summary_only.summary)
+
+        _, context = process(features=["translation"])
+        context.set_code.assert_called_with(grpc.StatusCode.INVALID_ARGUMENT)
+
+    def test_unrequested_stages_skip_tokenization(self, monkeypatch):
+        """Test that sentiment alone never runs the sentence tokenizer"""
+        from textproc import resources
+        monkeypatch.setattr(resources, "sentence_tokenizer", Mock(side_effect=AssertionError("punkt used")))
+        text = "I love this amazing product! It's fantastic and wonderful!"
+
+        lexicon = process_inline(self.service, text, AnalysisOptions(features=("sentiment",)))
+        textblob = process_inline(self.service, text, AnalysisOptions(features=("sentiment",), sentiment_engine="textblob"))
+        document = self.service.processor.tokenize(text, AnalysisOptions(features=("sentiment",), sentiment_engine="textblob"))
+
+        assert lexicon.sentiment == textblob.sentiment == "positive"
+        assert document.tokens == []
+
+class TestSummarizer:
+    def setup_method(self):
+        self.service = TextProcessorService()
+
+    @pytest.mark.parametrize("text", [
+        "One sentence only.",
+        "Cats purr. Dogs bark. Birds sing.",
+        "Artificial intelligence is a fascinating field. It involves creating machines that can think and learn. "
+        "Machine learning is a subset of artificial intelligence. Deep learning uses neural networks with multiple layers.",
+        "The the the. A an and. Data data science. Science is data.",
+        "Apples are red. Pears are green. Plums are purple. Limes are green.",
+    ])
+    @pytest.mark.parametrize("num_sentences", [1, 2, 3])
+    def test_vectorized_matches_reference(self, text, num_sentences):
+        """Test that the vectorized summarizer picks the same sentences as the reference"""
+        document = self.service.processor.tokenize(text)
+        assert summarizer.vectorized_summary(document, num_sentences) == \
+            summarizer.reference_summary(document, num_sentences)
+
+    def test_duplicate_sentences_scored_separately(self):
+        """Test that repeated sentences count once each towards the summary length"""
+        text = "Data science is fun. Data science is fun. Cats sleep. Dogs run."
+        document = self.service.processor.tokenize(text)
+
+        summary = summarizer.vectorized_summary(document, num_sentences=2)
+
+        assert summary == "Data science is fun. Data science is fun."
+
+    def test_sentence_term_matrix(self):
+        """Test the sentence x vocabulary counts"""
+        document = self.service.processor.tokenize("Data science. Data data.")
+        matrix, vocabulary = summarizer.sentence_term_matrix(document)
+
+        assert matrix.shape == (2, 2)
+        assert matrix[0, vocabulary["data"]] == 1
+        assert matrix[1, vocabulary["data"]] == 2
+        assert matrix[1, vocabulary["science"]] == 0
+
+class TestProcessingTiers:
+    def test_tier_selection(self):
+        """Test that texts are routed by size"""
+        policy = TierPolicy(inline_max_chars=10, chunk_min_chars=100, chunk_chars=50, max_chars=1000)
+
+        assert policy.tier_for("x" * 10) == "inline"
+        assert policy.tier_for("x" * 11) == "pool"
+        assert policy.tier_for("x" * 100) == "chunked"
+        assert not policy.too_large("x" * 1000)
+        assert policy.too_large("x" * 1001)
+
+    def test_zero_inline_threshold_is_kept(self, monkeypatch):
+        """Test that an explicit 0 turns the inline tier off instead of falling back to the environment"""
+        monkeypatch.setenv("TIER_INLINE_MAX_CHARS", "2000")
+        assert TierPolicy(inline_max_chars=0).tier_for("x") == "pool"
+        with pytest.raises(ValueError):
+            TierPolicy(chunk_chars=0)
+
+    def test_unchunkable_engine_refused_while_chunking(self):
+        """Test that an engine the chunked tier can't reproduce stops start-up unless chunking is off"""
+        processor = Mock(summarizer_engine="frequency", keyword_engine="frequency")
+        TierPolicy(chunk_min_chars=100, max_chars=1000).check_engines(processor)
+
+        engines.register("keywords", "first_words", lambda doc, top_n: doc.tokens[:top_n])
+        processor.keyword_engine = "first_words"
+        with pytest.raises(ValueError, match="KEYWORD_ENGINE"):
+            TierPolicy(chunk_min_chars=100, max_chars=1000).check_engines(processor)
+        TierPolicy(chunk_min_chars=1001, max_chars=1000).check_engines(processor)
+
+    def test_split_chunks_prefers_sentence_boundaries(self):
+        """Test that chunks end at sentence boundaries and cover the whole text"""
+        text = "First sentence here. Second one follows. Third is last."
+        chunks = split_chunks(text, 25)
+
+        assert "".join(chunks) == text
+        assert all(len(chunk) <= 25 for chunk in chunks)
+        assert chunks[0] == "First sentence here. "
+
+    def test_chunked_processing_matches_single_pass(self):
+        """Test that merging chunk results gives the single-pass answer"""
+        text = " ".join([
+            "Solar power is growing fast.",
+            "Wind farms produce cheap power.",
+            "Solar panels and wind turbines need storage.",
+            "Battery storage makes solar and wind power reliable.",
+            "The weather was nice.",
+        ] * 4)
+        chunked = TextProcessorService(
+            tier_policy=TierPolicy(inline_max_chars=10, chunk_min_chars=100, chunk_chars=120)
+        )
+
+        response = asyncio.run(chunked._analyze(text, AnalysisOptions()))
+        expected = self.single_pass(text)
+
+        assert response.keywords == expected.keywords
+        assert response.sentiment == expected.sentiment
+        assert response.summary == expected.summary
+        assert chunked.tier_policy.latency["chunked"].count == 1
+
+        options = AnalysisOptions(features=("keywords",), top_n=3)
+        keywords_only = asyncio.run(chunked._analyze(text, options))
+        assert keywords_only.keywords == expected.keywords[:3]
+        assert keywords_only.summary == "" and keywords_only.sentiment == ""
+
+    def test_rejects_text_over_maximum(self):
+        """Test that oversized texts fail with a clear error"""
+        service = TextProcessorService(tier_policy=TierPolicy(max_chars=20))
+        context = rpc_context()
+        request = text_processor_pb2.ProcessTextRequest(text="This text is longer than twenty characters.")
+
+        asyncio.run(service.ProcessText(request, context))
+
+        context.set_code.assert_called_with(grpc.StatusCode.INVALID_ARGUMENT)
+        context.set_details.assert_called_with("Text exceeds the maximum of 20 characters")
+
+    @staticmethod
+    def single_pass(text):
+        return process_inline(TextProcessorService(), text, AnalysisOptions())
+
+class TestSentimentEngines:
+    def setup_method(self):
+        self.service = TextProcessorService()
+        corpus_path = os.path.join(os.path.dirname(__file__), 'sentiment_corpus.jsonl')
+        with open(corpus_path) as corpus:
+            self.corpus = [json.loads(line) for line in corpus]
+
+    def test_lexicon_agrees_with_textblob(self):
+        """Test the lexicon engine against TextBlob on the labelled corpus"""
+        documents = [self.service.processor.tokenize(row["text"]) for row in self.corpus]
+        gold = [row["label"] for row in self.corpus]
+        lexicon = [sentiment.sentiment_label(sentiment.lexicon_polarity(doc)) for doc in documents]
+        textblob = [sentiment.sentiment_label(sentiment.textblob_polarity(doc)) for doc in documents]
+
+        agreement = sum(a == b for a, b in zip(lexicon, textblob)) / len(documents)
+        lexicon_accuracy = sum(a == b for a, b in zip(lexicon, gold)) / len(documents)
+        textblob_accuracy = sum(a == b for a, b in zip(textblob, gold)) / len(documents)
+
+        assert agreement >= 0.95
+        assert lexicon_accuracy >= textblob_accuracy
+
+    def test_negation_and_intensifiers(self):
+        """Test that negations flip and intensifiers scale polarity"""
+        good = sentiment.lexicon_polarity(self.service.processor.tokenize("The food is good."))
+        very_good = sentiment.lexicon_polarity(self.service.processor.tokenize("The food is very good."))
+        not_good = sentiment.lexicon_polarity(self.service.processor.tokenize("The food is not good."))
+
+        assert very_good > good > 0
+        assert not_good < 0
+
+    def test_engine_selected_per_request(self):
+        """Test that each request can pick its sentiment engine"""
+        text = "I love this amazing product! It's fantastic and wonderful!"
+
+        async def process(engine):
+            context = rpc_context()
+            request = text_processor_pb2.ProcessTextRequest(text=text, sentiment_engine=engine)
+            return await self.service.ProcessText(request, context), context
+
+        for engine in ["", "lexicon", "textblob"]:
+            response, _ = asyncio.run(process(engine))
+            assert response.sentiment == "positive"
+
+        _, context = asyncio.run(process("vader"))
+        context.set_code.assert_called_with(grpc.StatusCode.INVALID_ARGUMENT)
+
+class TestAdmissionControl:
+    def test_queue_bound_and_priority_shedding(self):
+        """Test that a full queue refuses requests unless a lower priority waiter can be shed"""
+        controller = AdmissionController(max_concurrent=1, max_queue=1)
+        order = []
+
+        async def request(name, priority, hold=0.01):
+            try:
+                async with controller.admit(priority):
+                    order.append(name)
+                    await asyncio.sleep(hold)
+            except Rejected as e:
+                order.append(f"{name}:{e.reason}")
+
+        async def run():
+            running = asyncio.create_task(request("running", "normal", hold=0.05))
+            await asyncio.sleep(0)
+            low = asyncio.create_task(request("low", "low"))
+            await asyncio.sleep(0)
+            await request("normal", "normal")  # queue full, but sheds the low waiter
+            await asyncio.gather(running, low)
+
+        async def overflow():
+            running = asyncio.create_task(request("a", "normal", hold=0.05))
+            await asyncio.sleep(0)
+            queued = asyncio.create_task(request("b", "normal"))
+            await asyncio.sleep(0)
+            await request("c", "low")
+            await asyncio.gather(running, queued)
+
+        asyncio.run(run())
+        assert order == ["running", "low:queue_full", "normal"]
+
+        order.clear()
+        asyncio.run(overflow())
+        assert order == ["a", "c:queue_full", "b"]
+        assert controller.counters["shed"] == 1 and controller.counters["queue_full"] == 1
+        assert controller.active == 0 and controller.queued == 0
+
+    def test_queued_request_dropped_after_deadline(self):
+        """Test that work whose deadline passed while queued never runs"""
+        controller = AdmissionController(max_concurrent=1, max_queue=10)
+        ran = []
+
+        async def run():
+            loop = asyncio.get_running_loop()
+
+            async def hold():
+                async with controller.admit():
+                    await asyncio.sleep(0.1)
+
+            async def late():
+                async with controller.admit(deadline=loop.time() + 0.02):
+                    ran.append("late")
+
+            holder = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            with pytest.raises(Rejected) as rejected:
+                await late()
+            await holder
+            return rejected.value.reason
+
+        assert asyncio.run(run()) == "expired"
+        assert ran == [] and controller.counters["expired"] == 1
+
+    def test_saturated_service_returns_resource_exhausted(self):
+        """Test that ProcessText is refused straight away when the service is saturated"""
+        service = TextProcessorService(admission=AdmissionController(max_concurrent=1, max_queue=0))
+        context = rpc_context()
+
+        async def run():
+            async with service.admission.admit():
+                request = text_processor_pb2.ProcessTextRequest(text="Some text to process.")
+                return await asyncio.wait_for(service.ProcessText(request, context), timeout=1.0)
+
+        asyncio.run(run())
+
+        context.set_code.assert_called_with(grpc.StatusCode.RESOURCE_EXHAUSTED)
+
+    def test_expired_call_deadline_is_not_processed(self):
+        """Test that a call arriving with no time left is dropped"""
+        context = rpc_context(metadata=(("x-priority", "high"),), time_remaining=0)
+        request = text_processor_pb2.ProcessTextRequest(text="Some text to process.")
+
+        response = asyncio.run(self.service_call(request, context))
+
+        context.set_code.assert_called_with(grpc.StatusCode.DEADLINE_EXCEEDED)
+        assert response.summary == ""
+
+    @staticmethod
+    async def service_call(request, context):
+        return await TextProcessorService().ProcessText(request, context)
+
+class TestHealth:
+    def test_health_service_reports_readiness_and_saturation(self):
+        """Test that grpc.health.v1 follows warm-up and admission state without processing text"""
+        service = TextProcessorService(admission=AdmissionController(max_concurrent=1, max_queue=0))
+        service.processor.process = Mock(side_effect=AssertionError("probe ran the pipeline"))
+
+        async def run():
+            server = grpc.aio.server()
+            health_pb2_grpc.add_HealthServicer_to_server(service.health, server)
+            port = server.add_insecure_port("127.0.0.1:0")
+            await server.start()
+            statuses = []
+            try:
+                async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+                    stub = health_pb2_grpc.HealthStub(channel)
+
+                    async def check():
+                        response = await stub.Check(health_pb2.HealthCheckRequest(service=SERVICE_NAME))
+                        statuses.append(health_pb2.HealthCheckResponse.ServingStatus.Name(response.status))
+
+                    await check()
+                    await service.worker_pool.warm_up()
+                    await check()
+                    async with service.admission.admit():
+                        await check()
+                    await check()
+            finally:
+                await server.stop(0)
+            return statuses
+
+        assert asyncio.run(run()) == ["NOT_SERVING", "SERVING", "NOT_SERVING", "SERVING"]
+
+    def test_stalled_workers_are_not_serving(self, monkeypatch):
+        """Test that requests running with none finishing marks the service unhealthy"""
+        from textproc import admission
+        now = [0.0]
+        monkeypatch.setattr(admission.time, "monotonic", lambda: now[0])
+        service = TextProcessorService()
+        service.worker_pool.ready = True
+        service.health.stall_seconds = 30
+
+        async def run():
+            async with service.admission.admit():
+                now[0] = 10.0
+                first = service.health.evaluate()[1]
+                now[0] = 31.0
+                second = service.health.evaluate()[1]
+            return first, second, service.health.evaluate()[1]
+
+        assert asyncio.run(run()) == (None, "stalled", None)
+
+class TestMetrics:
+    def test_registry_renders_exposition_format(self):
+        """Test counters, labelled histograms and collectors in the text format"""
+        registry = metrics.Registry()
+        requests = registry.counter('requests_total', 'Requests', ('code',))
+        latency = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+        registry.add_collector(lambda: [('queued', 'Waiting "now"', 'gauge', [({'pool': 'a\nb'}, 3)])])
+        requests.labels('OK').inc()
+        requests.labels('OK').inc()
+        latency.labels().observe(0.5)
+
+        lines = registry.render().splitlines()
+
+        assert '# TYPE requests_total counter' in lines
+        assert 'requests_total{code="OK"} 2' in lines
+        assert 'latency_seconds_bucket{le="0.1"} 0' in lines
+        assert 'latency_seconds_bucket{le="1.0"} 1' in lines
+        assert 'latency_seconds_bucket{le="+Inf"} 1' in lines
+        assert 'latency_seconds_count 1' in lines
+        assert 'queued{pool="a\\nb"} 3' in lines
+        with pytest.raises(ValueError):
+            registry.counter('requests_total', 'Again')
+
+    def test_rpc_and_stage_metrics_served_on_sidecar(self):
+        """Test that RPCs are counted by status and stages timed, and the sidecar serves them"""
+        from urllib.request import urlopen
+        service = TextProcessorService()
+        ok = server_module.RPC_HANDLED.labels('ProcessText', 'OK')
+        invalid = server_module.RPC_HANDLED.labels('ProcessText', 'INVALID_ARGUMENT')
+        tokenized = metrics.STAGE_LATENCY.labels('tokenize')
+        before = (ok.value, invalid.value, tokenized.count)
+
+        async def run():
+            server = grpc.aio.server()
+            text_processor_pb2_grpc.add_TextProcessorServicer_to_server(service, server)
+            port = server.add_insecure_port("127.0.0.1:0")
+            await server.start()
+            try:
+                async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+                    stub = text_processor_pb2_grpc.TextProcessorStub(channel)
+                    await stub.ProcessText(text_processor_pb2.ProcessTextRequest(text="A good day."))
+                    with pytest.raises(grpc.aio.AioRpcError):
+                        await stub.ProcessText(text_processor_pb2.ProcessTextRequest(text=" "))
+            finally:
+                await server.stop(0)
+
+        asyncio.run(run())
+        assert (ok.value, invalid.value, tokenized.count) == (before[0] + 1, before[1] + 1, before[2] + 1)
+
+        sidecar = metrics.start_metrics_server(0, host='127.0.0.1')
+        try:
+            with urlopen(f"http://127.0.0.1:{sidecar.server_port}/metrics") as response:
+                assert response.headers['Content-Type'] == metrics.CONTENT_TYPE
+                body = response.read().decode()
+        finally:
+            sidecar.shutdown()
+        assert 'grpc_server_handled_total{grpc_method="ProcessText",grpc_code="INVALID_ARGUMENT"}' in body
+        assert 'text_processing_stage_duration_seconds_count{stage="serialization"}' in body
+        assert 'text_processing_input_chars_bucket{le="100"}' in body
+
+    def test_component_stats_and_worker_stage_timings(self, monkeypatch):
+        """Test the cache, pool and tier collectors, and stage timings shipped back from workers"""
+        registry = metrics.Registry()
+        service = TextProcessorService(cache=ResultCache(MemoryBackend(max_entries=10)))
+        service.register_metrics(registry)
+        request = text_processor_pb2.ProcessTextRequest(text="A good day.")
+        for _ in range(2):
+            asyncio.run(service.ProcessText(request, rpc_context()))
+
+        lines = registry.render().splitlines()
+        assert 'text_cache_hits_total 1' in lines
+        assert 'text_cache_misses_total 1' in lines
+        assert 'text_worker_pool_in_flight 0' in lines
+        assert 'text_admission_rejected_total{reason="queue_full"} 0' in lines
+        assert 'text_processing_tier_duration_seconds_count{tier="inline"} 1' in lines
+
+        # A process worker captures its timings instead of recording them locally
+        monkeypatch.setattr(workers, '_worker_processor', service.processor, raising=False)
+        keywords = metrics.STAGE_LATENCY.labels('keywords')
+        before = keywords.count
+        result, stages, _ = workers._call_in_worker('process', None, "A good day.", AnalysisOptions())
+        assert result[2] and keywords.count == before
+        assert [stage for stage, _ in stages] == ['tokenize', 'summarize', 'sentiment', 'keywords']
+        metrics.replay_stages(stages)
+        assert keywords.count == before + 1
+
+class TestProfiling:
+    def test_flagged_request_profiled_on_worker_thread(self, tmp_path):
+        """Test that x-profile metadata samples the request, including its worker thread"""
+        profiler = profiling.Profiler(directory=str(tmp_path), enabled=True, interval=0.001)
+        service = TextProcessorService(
+            worker_mode='thread', tier_policy=TierPolicy(inline_max_chars=1), profiler=profiler
+        )
+        process = service.processor.process
+
+        def slow_process(*args):
+            time.sleep(0.05)
+            return process(*args)
+
+        service.processor.process = slow_process
+        request = text_processor_pb2.ProcessTextRequest(text="A good day.")
+
+        asyncio.run(service.ProcessText(request, rpc_context(metadata=(("x-profile", "1"),))))
+        asyncio.run(service.ProcessText(request, rpc_context()))
+
+        assert profiler.profiled == 1
+        assert 'slow_process' in profiler.collapsed()
+        files = list(tmp_path.iterdir())
+        assert len(files) == 1 and files[0].suffix == '.collapsed'
+        line = files[0].read_text().splitlines()[0]
+        assert line.rsplit(' ', 1)[1].isdigit()
+
+    def test_cprofile_mode_rotates_files(self, tmp_path, monkeypatch):
+        """Test cProfile output, the rotation limit and profiles sent back from worker processes"""
+        profiler = profiling.Profiler(directory=str(tmp_path), enabled=True, sample_rate=1.0,
+                                      mode='cprofile', max_files=2)
+        service = TextProcessorService(profiler=profiler)
+        request = text_processor_pb2.ProcessTextRequest(text="A good day. A bad night.")
+        for _ in range(3):
+            asyncio.run(service.ProcessText(request, rpc_context()))
+
+        files = sorted(tmp_path.iterdir())
+        assert profiler.profiled == 3
+        assert [path.suffix for path in files] == ['.prof', '.prof']
+        functions = {name for _, _, name in pstats.Stats(str(files[-1])).stats}
+        assert 'process' in functions
+
+        monkeypatch.setattr(workers, '_worker_processor', service.processor, raising=False)
+        _, _, part = workers._call_in_worker('process', ('stack', 0.001), "A good day.", AnalysisOptions())
+        assert part[0] == 'stack' and isinstance(part[1], dict)
+
+    def test_stack_mode_samples_only_the_request_work(self, tmp_path):
+        """Test that stack mode leaves the event loop thread alone and samples inline work"""
+        profiler = profiling.Profiler(directory=str(tmp_path), enabled=True, interval=0.001)
+
+        def own_work():
+            time.sleep(0.03)
+
+        def other_request():
+            time.sleep(0.03)
+
+        with profiler.profile('request', requested=True):
+            other_request()
+            profiling.call_sampled(own_work)
+
+        stacks = profiler.collapsed()
+        assert 'own_work' in stacks
+        assert 'other_request' not in stacks
+
+    def test_admin_route_on_sidecar(self):
+        """Test enabling, reading and resetting the profiler over the sidecar port"""
+        from urllib.request import Request, urlopen
+        service = TextProcessorService(profiler=profiling.Profiler(enabled=False))
+        routes = {'/debug/profile': service.profile_admin}
+        sidecar = metrics.start_metrics_server(0, registry=metrics.Registry(), routes=routes, admin_token='secret')
+        unguarded = metrics.start_metrics_server(0, registry=metrics.Registry(), routes=routes)
+        url = f"http://127.0.0.1:{sidecar.server_port}/debug/profile"
+        admin = {"X-Admin-Token": "secret"}
+        try:
+            for request, code in [(Request(url, method='POST'), 403),
+                                  (Request(url, headers={"X-Admin-Token": "wrong"}), 403),
+                                  (Request(f"http://127.0.0.1:{unguarded.server_port}/debug/profile"), 404),
+                                  (Request(url + "?sample_rate=2", headers=admin, method='POST'), 400)]:
+                with pytest.raises(Exception) as error:
+                    urlopen(request)
+                assert error.value.code == code
+            request = Request(url + "?enabled=1&sample_rate=0.25&mode=cprofile", headers=admin, method='POST')
+            with urlopen(request) as response:
+                settings = json.loads(response.read())
+            with urlopen(Request(url, headers=admin)) as response:
+                assert response.headers['Content-Type'].startswith('text/plain')
+        finally:
+            sidecar.shutdown()
+            unguarded.shutdown()
+        assert (settings["enabled"], settings["sample_rate"], settings["mode"]) == (True, 0.25, 'cprofile')
+
+class TestResultCache:
+    def test_cache_key_covers_exact_text_and_options(self):
+        """Test that keys differ with whitespace, unicode normalization and options"""
+        assert cache_key(" some text\n", top_n=5) != cache_key("some text", top_n=5)
+        assert cache_key("caf\u00e9", top_n=5) != cache_key("cafe\u0301", top_n=5)
+        assert cache_key("some text", top_n=5) != cache_key("some text", top_n=3)
+        assert cache_key("some text", top_n=5) != cache_key("other text", top_n=5)
+
+    @pytest.mark.parametrize("backend", ["memory", "sqlite"])
+    def test_lru_eviction(self, backend, tmp_path):
+        """Test that the least recently used entry is evicted first"""
+        store = MemoryBackend(2) if backend == "memory" else SqliteBackend(str(tmp_path / "cache.db"), 2)
+        cache = ResultCache(store)
+
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.evictions == 1
+        assert cache.stats()["size"] == 2
+
+    def test_sqlite_stores_encoded_values(self, tmp_path):
+        """Test that the sqlite backend keeps protobuf bytes rather than pickles"""
+        path = str(tmp_path / "cache.db")
+        cache = ResultCache(SqliteBackend(path, 10, protobuf_codec(text_processor_pb2.ProcessTextResponse)))
+        response = text_processor_pb2.ProcessTextResponse(summary="Short.", sentiment="neutral", keywords=["a"])
+        cache.set("a", response)
+
+        assert cache.get("a") == response
+        stored = sqlite3.connect(path).execute("SELECT value FROM results").fetchone()[0]
+        assert stored == response.SerializeToString()
+
+    def test_ttl_expiry(self, monkeypatch):
+        """Test that expired entries are reported as misses"""
+        from textproc import cache as cache_module
+        now = [1000.0]
+        monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+        cache = ResultCache(MemoryBackend(10), ttl=60)
+
+        cache.set("a", 1)
+        now[0] += 30
+        assert cache.get("a") == 1
+        now[0] += 31
+        assert cache.get("a") is None
+        assert cache.expirations == 1
+        assert cache.stats()["size"] == 0
+
+class TestResources:
+    def teardown_method(self):
+        resources.reset()
+
+    def test_bundle_loads_without_nltk_data(self, tmp_path, monkeypatch):
+        """Test that stopwords and the sentence model come from the bundled file"""
+        bundle = tmp_path / "resources.pickle"
+        with open(bundle, "wb") as f:
+            pickle.dump({
+                "version": resources.FORMAT_VERSION,
+                "language": "english",
+                "stop_words": frozenset(("the", "sat")),
+                "punkt": {"abbrev_types": {"dr"}, "collocations": set(), "sent_starters": set(),
+                          "ortho_context": {}},
+            }, f)
+        monkeypatch.setenv("TEXTPROC_RESOURCES", str(bundle))
+        resources.reset()
+
+        from textproc import analysis
+        assert resources.stop_words() == {"the", "sat"}
+        assert analysis.split_sentences("Dr. Smith arrived. He sat down.") == ["Dr. Smith arrived.", "He sat down."]
+
+    def test_build_round_trip(self, tmp_path, monkeypatch):
+        """Test that a built bundle is read back instead of the NLTK data"""
+        from nltk.corpus import stopwords
+        try:
+            stopwords.words("english")
+        except LookupError:
+            pytest.skip("building the bundle needs the NLTK stopwords corpus")
+        bundle = tmp_path / "data" / "resources.pickle"
+        store = tmp_path / "data" / "resources.store"
+        built = resources.build(str(bundle), store=str(store))
+        monkeypatch.setenv("TEXTPROC_RESOURCES", str(bundle))
+        monkeypatch.setenv("TEXTPROC_STORE", str(store))
+        resources.reset()
+
+        assert resources.load() == built
+        assert "the" in resources.stop_words()
+        assert set(resources.stop_words()) == built["stop_words"]
+
+    def test_nltk_without_punkt_tokenizer(self, monkeypatch):
+        """Test that an nltk older than 3.8.2 falls back to splitting on punctuation"""
+        monkeypatch.setitem(sys.modules, "nltk.tokenize.punkt", None)
+        assert resources._read_nltk_data()["punkt"] is None
+
+    def test_compiled_store_lookups(self, tmp_path):
+        """Test vocabulary ids, stopword membership and packed scores read through the mapping"""
+        from textproc.store import ResourceStore, write
+        path = tmp_path / "resources.store"
+        write(str(path), {"the", "a", "not"}, [("good", 0.7, 1.0, False), ("very", 0.2, 1.3, True),
+                                                ("café", 0.5, 1.0, False), ("not", 0.0, 1.0, False)])
+        store = ResourceStore(str(path))
+
+        assert len(store) == 6 and store.lexicon_words == 4
+        assert "the" in store.stop_words and "not" in store.stop_words
+        assert "good" not in store.stop_words and "missing" not in store.stop_words
+        assert sorted(store.stop_words) == ["a", "not", "the"] and len(store.stop_words) == 3
+
+        good = store.lexicon_index.get("good")
+        assert store.word(good) == "good" and store.polarity[good] == 0.7
+        assert store.modifier[store.lexicon_index.get("very")] == 1
+        assert store.intensity[store.lexicon_index.get("very")] == 1.3
+        assert store.lexicon_index.get("café") is not None
+        assert store.lexicon_index.get("the") is None and store.lexicon_index.get("bad") is None
+
+    def test_store_lexicon_matches_pattern(self, tmp_path, monkeypatch):
+        """Test that the mapped lexicon scores the corpus exactly like the in-memory one"""
+        from textproc.store import write
+        path = tmp_path / "resources.store"
+        write(str(path), resources.stop_words(), sentiment.pattern_entries())
+        processor = TextProcessorService().processor
+        corpus_path = os.path.join(os.path.dirname(__file__), 'sentiment_corpus.jsonl')
+        with open(corpus_path) as corpus:
+            documents = [processor.tokenize(json.loads(line)["text"]) for line in corpus]
+        documents.append(processor.tokenize("It is not very good, but really not bad!"))
+
+        in_memory = [sentiment.lexicon_polarity(doc) for doc in documents]
+        monkeypatch.setenv("TEXTPROC_STORE", str(path))
+        monkeypatch.setattr(sentiment, "_lexicon", None)
+        resources.reset()
+
+        assert [sentiment.lexicon_polarity(doc) for doc in documents] == in_memory
+        assert isinstance(sentiment.get_lexicon().index, type(resources.resource_store().lexicon_index))
+
+    def test_import_defers_nltk(self):
+        """Test that importing the package leaves NLTK, TextBlob and scipy to first use"""
+        root = os.path.join(os.path.dirname(__file__), "..", "..")
+        script = ("import sys, textproc; "
+                  "print(sorted(m for m in ('nltk', 'textblob', 'scipy') if m in sys.modules))")
+        output = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True, check=True)
+        assert output.stdout.strip() == "[]"
+
+class TestAggregates:
+    def test_count_min_never_undercounts(self):
+        """Test that sketch estimates are upper bounds that stay close on a skewed stream"""
+        from textproc.aggregates import CountMinSketch
+        sketch = CountMinSketch(width=64, depth=4)
+        truth = {f"word{i}": (i % 7) + (50 if i < 3 else 0) for i in range(200)}
+        for word, count in truth.items():
+            sketch.add(word, count)
+
+        estimates = {word: sketch.estimate(word) for word in truth}
+        assert all(estimates[word] >= count for word, count in truth.items())
+        assert all(estimates[f"word{i}"] - truth[f"word{i}"] <= 2 * sum(truth.values()) / 64 for i in range(3))
+
+    def test_sliding_window_heavy_hitters(self):
+        """Test that frequent keywords survive eviction and old buckets leave the window"""
+        from textproc.aggregates import Aggregates
+        now = [0.0]
+        aggregates = Aggregates(window_seconds=60, buckets=6, capacity=4, width=256, clock=lambda: now[0])
+        for i in range(40):
+            aggregates.add("positive" if i % 4 else "negative", ["solar", "solar", f"rare{i}"] + (["wind"] if i % 2 else []))
+            now[0] += 1
+
+        snapshot = aggregates.snapshot(top_k=2)
+        assert snapshot["documents"] == 40
+        assert snapshot["sentiment"] == {"positive": 30, "negative": 10}
+        assert snapshot["keywords"][0] == {"keyword": "solar", "count": 40}
+        assert snapshot["keywords"][1]["keyword"] == "wind" and snapshot["keywords"][1]["count"] >= 20
+
+        # The current bucket (40-50s) is still empty; the one before holds 30-39s
+        recent = aggregates.snapshot(window_seconds=15)
+        assert recent["window_seconds"] == 20 and recent["documents"] == 10
+
+        now[0] += 60
+        assert aggregates.snapshot()["documents"] == 0
+
+    def test_get_aggregates_rpc(self):
+        """Test that answered documents feed the GetAggregates RPC"""
+        from textproc.aggregates import Aggregates
+        service = TextProcessorService(aggregates=Aggregates())
+        for text in ["I love solar power. Solar power is great.", "Solar panels are terrible and awful."]:
+            asyncio.run(service.ProcessText(text_processor_pb2.ProcessTextRequest(text=text), rpc_context()))
+
+        context = rpc_context()
+        response = asyncio.run(service.GetAggregates(text_processor_pb2.GetAggregatesRequest(top_k=1), context))
+        assert response.documents == 2
+        assert dict(response.sentiment) == {"positive": 1, "negative": 1}
+        assert [(entry.keyword, entry.count) for entry in response.keywords] == [("solar", 2)]
+
+        context = rpc_context()
+        asyncio.run(TextProcessorService().GetAggregates(text_processor_pb2.GetAggregatesRequest(), context))
+        context.set_code.assert_called_with(grpc.StatusCode.FAILED_PRECONDITION)
+
+class TestJobs:
+    def test_job_lifecycle_over_grpc(self, tmp_path):
+        """Test that a submitted job runs in the background and its response can be polled"""
+        from textproc.jobs import JobQueue, JobStore
+        service = TextProcessorService()
+        service.jobs = JobQueue(JobStore(str(tmp_path / "jobs.db")), service.run_job)
+
+        async def run():
+            await service.jobs.start()
+            text = "Solar power is great. I love solar panels. They are excellent."
+            job = await service.SubmitJob(text_processor_pb2.ProcessTextRequest(text=text), rpc_context())
+            assert job.status == "queued" and job.id
+            for _ in range(100):
+                job = await service.GetJob(text_processor_pb2.JobRequest(id=job.id), rpc_context())
+                if job.status == "succeeded":
+                    break
+                await asyncio.sleep(0.01)
+            await service.jobs.close()
+            return job
+
+        job = asyncio.run(run())
+        assert job.status == "succeeded"
+        assert job.response.sentiment == "positive"
+        assert "solar" in job.response.keywords
+        assert job.expires_at > job.updated_at
+
+        context = rpc_context()
+        asyncio.run(service.GetJob(text_processor_pb2.JobRequest(id="missing"), context))
+        context.set_code.assert_called_with(grpc.StatusCode.NOT_FOUND)
+
+    def test_cancel_running_and_queued_jobs(self, tmp_path):
+        """Test that cancelling stops a running job and keeps a queued one from starting"""
+        from textproc.jobs import JobQueue, JobStore
+        started = []
+
+        async def handler(text, options):
+            started.append(text)
+            await asyncio.sleep(10)
+
+        queue = JobQueue(JobStore(str(tmp_path / "jobs.db")), handler, concurrency=1)
+
+        async def run():
+            await queue.start()
+            running = queue.submit("first", AnalysisOptions())
+            queued = queue.submit("second", AnalysisOptions())
+            await asyncio.sleep(0.01)
+            assert queue.get(running.id).status == "running"
+            assert queue.cancel(queued.id).status == "cancelled"
+            assert queue.cancel(running.id).status == "cancelled"
+            await asyncio.sleep(0.01)
+            stats = queue.stats()
+            await queue.close()
+            return stats
+
+        stats = asyncio.run(run())
+        assert started == ["first"]
+        assert stats["running"] == 0 and stats["cancelled"] == 2
+
+    def test_store_recovers_unfinished_jobs_and_expires_results(self, tmp_path, monkeypatch):
+        """Test that unfinished jobs are taken over once their lease lapses and results expire after the TTL"""
+        from textproc import jobs
+        path = str(tmp_path / "jobs.db")
+        store = jobs.JobStore(path, ttl=60, lease=30)
+        store.open()
+        options = AnalysisOptions(features=("keywords",), top_n=3)
+        interrupted = store.create("interrupted text", options)
+        store.claim(interrupted.id)
+        done = store.create("done text", options)
+        store.claim(done.id)
+        store.finish(done.id, "succeeded", result={"keywords": ["done"]})
+
+        now = time.time()
+        reopened = jobs.JobStore(path, ttl=60, lease=30)
+        reopened.open()
+        # The first process still holds the lease on the job it runs
+        assert reopened.adopt() == []
+        monkeypatch.setattr(jobs.time, "time", lambda: now + 20)
+        assert store.renew() == 1
+        monkeypatch.setattr(jobs.time, "time", lambda: now + 40)
+        assert reopened.adopt() == []
+
+        monkeypatch.setattr(jobs.time, "time", lambda: now + 51)
+        assert reopened.adopt() == [interrupted.id]
+        assert reopened.claim(interrupted.id) == ("interrupted text", options)
+        # The first process lost the job and can no longer finish it
+        assert not store.finish(interrupted.id, "succeeded", result={})
+        assert reopened.get(done.id).result == {"keywords": ["done"]}
+
+        monkeypatch.setattr(jobs.time, "time", lambda: now + 62)
+        assert reopened.get(done.id) is None
+        assert reopened.purge() == 0
+
+class TestBatch:
+    def test_batch_run_and_resume(self, tmp_path):
+        """Test that the batch driver writes results in input order and resumes from its checkpoint"""
+        from textproc import batch
+        source = tmp_path / "documents.jsonl"
+        texts = ["I love this. It is great.", "This is awful and terrible.", "Solar panels on the roof.",
+                 "Wind turbines spin.", "The best day ever!"]
+        lines = [json.dumps({"id": f"doc{i}", "text": text}) for i, text in enumerate(texts)]
+        source.write_text("\n".join(lines[:2] + ["", '{"id": "broken"}'] + lines[2:]) + "\n")
+        output = tmp_path / "results.jsonl"
+
+        summary = batch.run(str(source), str(output), workers=1, batch_size=2)
+        full = output.read_bytes()
+        results = [json.loads(line) for line in full.splitlines()]
+        assert summary["documents"] == 6 and summary["failed"] == 1
+        assert [result["id"] for result in results] == ["doc0", "doc1", "broken", "doc2", "doc3", "doc4"]
+        assert [result["index"] for result in results] == list(range(6))
+        assert results[0]["sentiment"] == "positive" and results[1]["sentiment"] == "negative"
+        assert results[2]["error"] == "No text in field 'text'"
+        assert not os.path.exists(f"{output}.checkpoint")
+
+        # A run that died after its first batch, halfway through writing the second
+        first_batch = b"".join(full.splitlines(keepends=True)[:2])
+        output.write_bytes(first_batch + b'{"id": "doc')
+        position = len(("\n".join(lines[:2]) + "\n").encode())
+        with open(f"{output}.checkpoint", "w") as f:
+            json.dump({"input": str(source), "documents": 2, "failed": 0, "position": position,
+                       "output_bytes": len(first_batch)}, f)
+
+        resumed = batch.run(str(source), str(output), workers=1, batch_size=2)
+        assert resumed["resumed_at"] == 2 and resumed["processed"] == 4
+        assert output.read_bytes() == full
+
+class TestCoalescing:
+    def test_identical_concurrent_requests_share_one_computation(self):
+        """Test that concurrent identical texts are computed once, in one processing slot, for every caller"""
+        service = TextProcessorService(cache=None, admission=AdmissionController(max_concurrent=1, max_queue=0))
+        text = "I love solar power. It is great."
+
+        async def run():
+            requests = [text] * 4 + ["  " + text]
+            return await asyncio.gather(*(
+                service.ProcessText(text_processor_pb2.ProcessTextRequest(text=item), rpc_context()) for item in requests
+            ))
+
+        responses = asyncio.run(run())
+        assert {response.sentiment for response in responses} == {"positive"}
+        assert [response.original_length for response in responses] == [len(text)] * 4 + [len(text) + 2]
+        stats = service.in_flight.stats()
+        assert stats["computations"] == 2 and stats["coalesced"] == 3 and stats["coalescing_ratio"] == 0.6
+        assert stats["in_flight"] == 0
+
+    def test_errors_reach_every_waiter_and_abandoned_work_is_cancelled(self):
+        """Test that a failure is raised to all waiters, and the task stops once every waiter leaves"""
+        from textproc.coalescing import SingleFlight
+        flight = SingleFlight()
+        started = []
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        async def slow():
+            started.append(True)
+            await asyncio.sleep(10)
+
+        async def run():
+            outcomes = await asyncio.gather(*(flight.run("a", failing) for _ in range(3)), return_exceptions=True)
+            assert [str(outcome) for outcome in outcomes] == ["boom"] * 3
+
+            waiters = [asyncio.create_task(flight.run("b", slow)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            shared = flight._calls["b"].task
+            waiters[0].cancel()
+            await asyncio.sleep(0)
+            assert not shared.cancelled()
+            waiters[1].cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+            await asyncio.sleep(0)
+            return shared
+
+        shared = asyncio.run(run())
+        assert shared.cancelled() and started == [True]
+        assert flight.stats() == {
+            "in_flight": 0, "computations": 2, "coalesced": 3, "abandoned": 1, "expired": 0, "coalescing_ratio": 0.6
+        }
+
+    def test_each_waiter_keeps_its_own_deadline(self):
+        """Test that the first caller timing out does not fail later callers with more time"""
+        from textproc.coalescing import SingleFlight
+        flight = SingleFlight()
+        admission = AdmissionController(max_concurrent=1, max_queue=1)
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            return await asyncio.gather(
+                flight.run("a", slow, admission, ("low", loop.time() + 0.01)),
+                flight.run("a", slow, admission, ("high", None)),
+                return_exceptions=True
+            )
+
+        hasty, patient = asyncio.run(run())
+        assert isinstance(hasty, Rejected) and hasty.reason == "expired"
+        assert patient == "done"
+        assert flight.stats()["expired"] == 1 and flight.stats()["abandoned"] == 0
+
+    def test_shared_computation_waits_with_the_most_urgent_priority(self):
+        """Test that a high-priority caller joining a queued low-priority computation moves it up"""
+        from textproc.coalescing import SingleFlight
+        flight = SingleFlight()
+        admission = AdmissionController(max_concurrent=1, max_queue=2)
+        order = []
+
+        def work(name):
+            async def compute():
+                order.append(name)
+                await asyncio.sleep(0.01)
+                return name
+            return compute
+
+        async def run():
+            tasks = [asyncio.create_task(flight.run("busy", work("busy"), admission, ("normal", None)))]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(flight.run("other", work("other"), admission, ("normal", None))))
+            tasks.append(asyncio.create_task(flight.run("shared", work("shared"), admission, ("low", None))))
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(flight.run("shared", work("shared"), admission, ("high", None))))
+            return await asyncio.gather(*tasks)
+
+        assert asyncio.run(run()) == ["busy", "other", "shared", "shared"]
+        assert order == ["busy", "shared", "other"]
+
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -1,76 +1,485 @@
 import grpc
 import asyncio
 import logging
+import itertools
 import os
-from typing import Optional
+import time
+from typing import AsyncIterable, AsyncIterator, Iterable, List, Optional, Sequence, Tuple, Union
 
 # Import the generated gRPC files
-import text_processor_pb2
-import text_processor_pb2_grpc
+from textproc import keepalive, text_processor_pb2, text_processor_pb2_grpc
+from grpc_health.v1 import health_pb2, health_pb2_grpc
+from textproc.aggregates import merge_snapshots
+from textproc.metrics import Histogram
+from resilience import (
+    ENDPOINT_FAILURES, RETRYABLE, BackendUnavailable, CircuitBreaker, DeadlinePolicy, LatencyTracker, RetryBudget
+)
 
 logger = logging.getLogger(__name__)
 
+# Name the processing service registers with the standard health service
+HEALTH_SERVICE = 'text_processor.TextProcessor'
+
+
+def parse_targets(hosts: Union[str, Sequence[str]], default_port: int) -> List[str]:
+    """Turn "a,b:50052" or ["a", "b:50052"] into host:port targets"""
+    if isinstance(hosts, str):
+        hosts = hosts.split(',')
+
+    targets = []
+    for host in hosts:
+        host = host.strip()
+        if not host:
+            continue
+        if host.count(':') > 1 and not host.startswith('['):
+            # Bare IPv6 address
+            host = f'[{host}]'
+        has_port = ']:' in host if host.startswith('[') else ':' in host
+        targets.append(host if has_port else f'{host}:{default_port}')
+    return targets
+
+
 class GRPCClient:
-    def __init__(self, host: str = None, port: int = None):
-        self.host = host or os.getenv('PROCESSING_HOST', 'localhost')
+    """Client for the processing service over a pool of long-lived channels.
+
+    ``PROCESSING_HOST`` may list several endpoints separated by commas; each
+    gets ``GRPC_CHANNELS_PER_HOST`` channels with their own connection, and
+    calls are spread over all of them round-robin.
+
+    Unary calls get a deadline sized to their input, are hedged to a second
+    endpoint once they run slower than the recent ``GRPC_HEDGE_PERCENTILE``
+    latency, and are retried on another endpoint when refused. Endpoints that
+    keep failing are skipped by their circuit breaker, and hedges and retries
+    together are held to the retry budget.
+    """
+
+    def __init__(self, host: Union[str, Sequence[str]] = None, port: int = None, channels_per_host: int = None):
         self.port = port or int(os.getenv('PROCESSING_PORT', '50051'))
-        self.channel = None
-        self.stub = None
-        
-    async def connect(self):
-        """Establish connection to gRPC server"""
+        self.targets = parse_targets(host or os.getenv('PROCESSING_HOST', 'localhost'), self.port)
+        self.channels_per_host = channels_per_host or int(os.getenv('GRPC_CHANNELS_PER_HOST', '2'))
+        self.connect_timeout = float(os.getenv('GRPC_CONNECT_TIMEOUT_SECONDS', '5'))
+        # Room for a maximum-size text at up to 4 bytes per character in UTF-8
+        max_message_bytes = int(os.getenv(
+            'GRPC_MAX_MESSAGE_BYTES', str(4 * int(os.getenv('MAX_TEXT_CHARS', '5000000')) + 1024 * 1024)
+        ))
+        self.channel_options = [
+            ('grpc.max_send_message_length', max_message_bytes),
+            ('grpc.max_receive_message_length', max_message_bytes),
+            *keepalive.client_options(),
+            # Without this, channels to the same target share one connection
+            ('grpc.use_local_subchannel_pool', 1),
+        ]
+        self.health_cache_seconds = float(os.getenv('HEALTH_CACHE_SECONDS', '2'))
+        self.endpoint_health = {}
+        self._health = None  # (checked at, healthy)
+        self.max_retries = int(os.getenv('GRPC_MAX_RETRIES', '1'))
+        self.deadlines = DeadlinePolicy()
+        self.latency = LatencyTracker()
+        self.retry_budget = RetryBudget()
+        self.breakers = {target: CircuitBreaker() for target in self.targets}
+        self.call_latency = Histogram()
+        self.counters = {
+            "calls": 0,
+            "hedges": 0,
+            "hedges_won": 0,
+            "retries": 0,
+            "deadline_exceeded": 0,
+            "rejected": 0,
+        }
+        self.channels = []
+        self._stubs = []
+        self._next = None
+
+    @property
+    def stub(self) -> Optional[text_processor_pb2_grpc.TextProcessorStub]:
+        """The next stub in round-robin order, or None before connect()"""
+        if not self._stubs:
+            return None
+        return next(self._next)[1]
+
+    def _pick(self, avoid=()):
+        """Next (target, stub) whose breaker admits a call, preferring targets not in ``avoid``"""
+        fallback = None
+        # Each breaker is asked at most once, however many channels its target has
+        refused = set()
+        for _ in range(len(self._stubs)):
+            target, stub = next(self._next)
+            if target in refused:
+                continue
+            if target in avoid:
+                fallback = fallback or (target, stub)
+            elif self.breakers[target].allow():
+                return target, stub
+            else:
+                refused.add(target)
+        if fallback is not None and self.breakers[fallback[0]].allow():
+            return fallback
+        return None
+
+    async def connect(self, warm_up: bool = True):
+        """Open the channel pool and, unless disabled, wait for the connections.
+
+        Endpoints that are not reachable yet are only logged: their channels
+        keep reconnecting in the background.
+        """
         try:
-            self.channel = grpc.aio.insecure_channel(f'{self.host}:{self.port}')
-            self.stub = text_processor_pb2_grpc.TextProcessorStub(self.channel)
-            logger.info(f"Connected to gRPC server at {self.host}:{self.port}")
+            for target in self.targets:
+                for _ in range(self.channels_per_host):
+                    channel = grpc.aio.insecure_channel(target, options=self.channel_options)
+                    self.channels.append((target, channel))
+                    self._stubs.append((target, text_processor_pb2_grpc.TextProcessorStub(channel)))
+            self._next = itertools.cycle(self._stubs)
         except Exception as e:
             logger.error(f"Failed to connect to gRPC server: {str(e)}")
             raise
 
-    async def close(self):
-        """Close gRPC connection"""
-        if self.channel:
-            await self.channel.close()
-            logger.info("gRPC channel closed")
+        if warm_up:
+            ready = await asyncio.gather(*(self._wait_ready(target, channel) for target, channel in self.channels))
+            logger.info(f"Connected {sum(ready)} of {len(ready)} gRPC channels to {', '.join(self.targets)}")
+        else:
+            logger.info(f"Opened {len(self.channels)} gRPC channels to {', '.join(self.targets)}")
 
-    async def health_check(self) -> bool:
-        """Check if gRPC server is healthy"""
+    async def _wait_ready(self, target, channel) -> bool:
         try:
-            if not self.stub:
-                return False
-            
-            # Send a simple request to check connectivity
-            request = text_processor_pb2.ProcessTextRequest(text="health check")
-            await asyncio.wait_for(self.stub.ProcessText(request), timeout=5.0)
+            await asyncio.wait_for(channel.channel_ready(), timeout=self.connect_timeout)
             return True
-        except Exception as e:
-            logger.warning(f"gRPC health check failed: {str(e)}")
+        except asyncio.TimeoutError:
+            logger.warning(f"gRPC channel to {target} not ready after {self.connect_timeout}s")
             return False
 
-    async def process_text(self, text: str) -> Optional[text_processor_pb2.ProcessTextResponse]:
-        """Send text to processing service"""
+    async def close(self):
+        """Close every channel in the pool"""
+        if self.channels:
+            await asyncio.gather(*(channel.close() for _, channel in self.channels))
+            logger.info(f"{len(self.channels)} gRPC channels closed")
+        self.channels = []
+        self._stubs = []
+        self._next = None
+        self._health = None
+
+    def stats(self) -> dict:
+        """Channel states and breaker of each endpoint, call counters and latency"""
+        states = {target: [] for target in self.targets}
+        for target, channel in self.channels:
+            states[target].append(channel.get_state().name.lower())
+        return {
+            "channels_per_host": self.channels_per_host,
+            "targets": {
+                target: {
+                    "channels": states[target],
+                    "health": self.endpoint_health.get(target),
+                    "breaker": self.breakers[target].stats(),
+                }
+                for target in self.targets
+            },
+            "calls": dict(self.counters),
+            "retry_budget": self.retry_budget.stats(),
+            "latency_seconds": self.call_latency.snapshot(),
+        }
+
+    def metric_families(self):
+        """Collector output for call counters, breaker states and the retry budget"""
+        return [
+            ('text_grpc_client_events_total', 'Calls, hedges, retries and failures by kind', 'counter', [
+                ({'event': event}, count) for event, count in self.counters.items()
+            ]),
+            ('text_grpc_breaker_state', 'Circuit breaker state of each endpoint, 1 for the current one',
+             'gauge', [
+                 ({'target': target, 'state': state}, breaker.state == state)
+                 for target, breaker in self.breakers.items()
+                 for state in ('closed', 'open', 'half_open')
+             ]),
+            ('text_grpc_breaker_opened_total', 'Times each endpoint\'s breaker opened', 'counter', [
+                ({'target': target}, breaker.opened) for target, breaker in self.breakers.items()
+            ]),
+            ('text_grpc_retry_budget_tokens', 'Retries and hedges currently affordable', 'gauge', [
+                ({}, float(self.retry_budget.tokens))
+            ]),
+        ]
+
+    async def _attempt(self, target, call, request, timeout):
+        """One call to one endpoint, reporting its outcome to the endpoint's breaker"""
+        breaker = self.breakers[target]
+        try:
+            response = await call(request, timeout=max(timeout, 0.001))
+        except grpc.RpcError as e:
+            if e.code() in ENDPOINT_FAILURES:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            if e.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+                self.counters["deadline_exceeded"] += 1
+            raise
+        except asyncio.CancelledError:
+            # A losing hedge says nothing about its endpoint
+            breaker.release()
+            raise
+        breaker.record_success()
+        return response
+
+    async def _call(self, method, request, chars, hedge=True):
+        """Make a unary call with a size-based deadline, hedging and retries.
+
+        The first attempt gets the whole deadline. If it runs past the hedge
+        delay, a second attempt is raced against it on another endpoint and
+        the first answer wins; an attempt refused with a retryable code is
+        retried elsewhere. Both extra kinds of attempt spend from the retry
+        budget and must finish within the original deadline.
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + self.deadlines.timeout_for(chars)
+        hedge_delay = self.latency.hedge_delay(chars) if hedge else None
+        self.counters["calls"] += 1
+        self.retry_budget.deposit()
+        tried = []
+
+        def launch():
+            picked = self._pick(avoid=tried)
+            if picked is None:
+                return None
+            target, stub = picked
+            tried.append(target)
+            return asyncio.ensure_future(
+                self._attempt(target, getattr(stub, method), request, deadline - loop.time())
+            )
+
+        first = launch()
+        if first is None:
+            self.counters["rejected"] += 1
+            raise BackendUnavailable(f"Circuit breakers open for every endpoint: {', '.join(self.targets)}")
+
+        pending = {first}
+        hedged = None
+        retries = 0
+        error = None
+        try:
+            while pending:
+                timeout = None
+                if hedge_delay is not None:
+                    timeout = max(start + hedge_delay - loop.time(), 0)
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Slower than usual: race another endpoint
+                    hedge_delay = None
+                    if self.retry_budget.try_spend():
+                        hedged = launch()
+                        if hedged is not None:
+                            pending.add(hedged)
+                            self.counters["hedges"] += 1
+                    continue
+
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedged:
+                            self.counters["hedges_won"] += 1
+                        elapsed = loop.time() - start
+                        self.latency.observe(chars, elapsed)
+                        self.call_latency.observe(elapsed)
+                        return task.result()
+                    error = task.exception()
+
+                retryable = isinstance(error, grpc.RpcError) and error.code() in RETRYABLE
+                if not pending and retryable and retries < self.max_retries and loop.time() < deadline:
+                    if self.retry_budget.try_spend():
+                        retry = launch()
+                        if retry is not None:
+                            pending.add(retry)
+                            retries += 1
+                            self.counters["retries"] += 1
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def health_check(self) -> bool:
+        """Whether any endpoint reports SERVING on the standard gRPC health service.
+
+        Answers are reused for ``HEALTH_CACHE_SECONDS`` so frequent probes of
+        this service don't turn into a probe of every processing replica.
+        """
+        if not self.channels:
+            return False
+
+        now = time.monotonic()
+        if self._health is not None and now - self._health[0] < self.health_cache_seconds:
+            return self._health[1]
+
+        # One channel per endpoint is enough to tell if the replica is up
+        channels = {}
+        for target, channel in self.channels:
+            channels.setdefault(target, channel)
+        statuses = await asyncio.gather(*(self._check_endpoint(target, channels[target]) for target in self.targets))
+        self.endpoint_health = dict(zip(self.targets, statuses))
+        healthy = 'serving' in statuses
+        self._health = (now, healthy)
+        return healthy
+
+    async def _check_endpoint(self, target, channel) -> str:
+        try:
+            response = await health_pb2_grpc.HealthStub(channel).Check(
+                health_pb2.HealthCheckRequest(service=HEALTH_SERVICE), timeout=1.0
+            )
+            return health_pb2.HealthCheckResponse.ServingStatus.Name(response.status).lower()
+        except grpc.RpcError as e:
+            logger.warning(f"gRPC health check of {target} failed: {e.code()}")
+            return 'unreachable'
+
+    async def get_aggregates(self, top_k: int = 20, window_seconds: Optional[float] = None) -> Optional[dict]:
+        """Keyword and sentiment aggregates of every endpoint, added together.
+
+        Each replica is asked for twice ``top_k`` keywords so that a keyword
+        ranked just outside one replica's list still counts. Returns None when
+        no endpoint answers.
+        """
+        if not self.channels:
+            return None
+
+        channels = {}
+        for target, channel in self.channels:
+            channels.setdefault(target, channel)
+        request = text_processor_pb2.GetAggregatesRequest(top_k=2 * top_k, window_seconds=window_seconds or 0)
+        snapshots = await asyncio.gather(*(
+            self._endpoint_aggregates(target, channels[target], request) for target in self.targets
+        ))
+        answered = [snapshot for snapshot in snapshots if snapshot is not None]
+        if not answered:
+            return None
+
+        merged = merge_snapshots(answered, top_k)
+        merged["endpoints"] = {"answered": len(answered), "total": len(self.targets)}
+        return merged
+
+    async def _endpoint_aggregates(self, target, channel, request) -> Optional[dict]:
         try:
-            if not self.stub:
+            response = await text_processor_pb2_grpc.TextProcessorStub(channel).GetAggregates(request, timeout=2.0)
+        except grpc.RpcError as e:
+            logger.warning(f"Aggregates of {target} unavailable: {e.code()} - {e.details()}")
+            return None
+        return {
+            "window_seconds": response.window_seconds,
+            "documents": response.documents,
+            "sentiment": dict(response.sentiment),
+            "keywords": [{"keyword": entry.keyword, "count": entry.count} for entry in response.keywords],
+        }
+
+    async def process_text(
+        self,
+        text: str,
+        features: Optional[Iterable[str]] = None,
+        num_sentences: Optional[int] = None,
+        top_n: Optional[int] = None,
+        sentiment_engine: Optional[str] = None
+    ) -> Optional[text_processor_pb2.ProcessTextResponse]:
+        """Send text to processing service.
+
+        ``features`` picks any of "summary", "sentiment" and "keywords"; the
+        fields of the others are left empty. Unset options use the server defaults.
+        Returns None on failure, except that a call the service shed
+        (RESOURCE_EXHAUSTED) or that ran out of time (DEADLINE_EXCEEDED)
+        raises its grpc.RpcError, so callers can answer with 429 or 504.
+        """
+        try:
+            if not self._stubs:
                 logger.error("gRPC stub not initialized")
                 return None
                 
-            request = text_processor_pb2.ProcessTextRequest(text=text)
-            
-            # Add timeout for the request
-            response = await asyncio.wait_for(
-                self.stub.ProcessText(request), 
-                timeout=30.0
+            request = text_processor_pb2.ProcessTextRequest(
+                text=text,
+                features=features or [],
+                num_sentences=num_sentences or 0,
+                top_n=top_n or 0,
+                sentiment_engine=sentiment_engine or ''
             )
             
+            response = await self._call('ProcessText', request, len(text))
+            
             logger.info("Successfully processed text via gRPC")
             return response
             
-        except asyncio.TimeoutError:
-            logger.error("gRPC request timed out")
+        except BackendUnavailable as e:
+            logger.error(str(e))
             return None
         except grpc.RpcError as e:
+            if e.code() in (grpc.StatusCode.RESOURCE_EXHAUSTED, grpc.StatusCode.DEADLINE_EXCEEDED):
+                raise
             logger.error(f"gRPC error: {e.code()} - {e.details()}")
             return None
         except Exception as e:
             logger.error(f"Unexpected error in gRPC call: {str(e)}")
             return None
+
+    async def process_batch(self, texts: List[str]) -> Optional[List[text_processor_pb2.ProcessTextBatchResult]]:
+        """Send many texts in one call; each result carries its own status code"""
+        try:
+            if not self._stubs:
+                logger.error("gRPC stub not initialized")
+                return None
+
+            request = text_processor_pb2.ProcessTextBatchRequest(
+                requests=[text_processor_pb2.ProcessTextRequest(text=text) for text in texts]
+            )
+
+            # Hedging would repeat the whole batch, so only retry refused calls
+            response = await self._call('ProcessTextBatch', request, sum(map(len, texts)), hedge=False)
+
+            logger.info(f"Successfully processed batch of {len(texts)} texts via gRPC")
+            return list(response.results)
+
+        except BackendUnavailable as e:
+            logger.error(str(e))
+            return None
+        except grpc.RpcError as e:
+            logger.error(f"gRPC error: {e.code()} - {e.details()}")
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error in gRPC batch call: {str(e)}")
+            return None
+
+    async def process_stream(
+        self,
+        documents: Union[Iterable[Tuple[str, str]], AsyncIterable[Tuple[str, str]]]
+    ) -> AsyncIterator[text_processor_pb2.ProcessTextStreamResponse]:
+        """Stream (id, text) pairs over one call and yield results as they finish.
+
+        Results can arrive out of order; match them to inputs by ``id``. Unlike
+        the unary helpers a broken stream raises ``grpc.RpcError`` rather than
+        ending silently, so callers can tell a finished backfill from a failed one.
+        Streams have no deadline and are neither hedged nor retried.
+        """
+        if not self._stubs:
+            raise RuntimeError("gRPC stub not initialized")
+        picked = self._pick()
+        if picked is None:
+            raise BackendUnavailable(f"Circuit breakers open for every endpoint: {', '.join(self.targets)}")
+        target, stub = picked
+        breaker = self.breakers[target]
+
+        async def requests():
+            if hasattr(documents, '__aiter__'):
+                async for doc_id, text in documents:
+                    yield text_processor_pb2.ProcessTextStreamRequest(id=doc_id, text=text)
+            else:
+                for doc_id, text in documents:
+                    yield text_processor_pb2.ProcessTextStreamRequest(id=doc_id, text=text)
+
+        received = 0
+        try:
+            async for response in stub.ProcessTextStream(requests()):
+                received += 1
+                yield response
+        except grpc.RpcError as e:
+            if e.code() in ENDPOINT_FAILURES:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            logger.error(f"gRPC stream error after {received} results: {e.code()} - {e.details()}")
+            raise
+        except BaseException:
+            # Closed or cancelled by the caller
+            breaker.release()
+            raise
+
+        breaker.record_success()
+        logger.info(f"Successfully processed stream of {received} texts via gRPC")
@@ -1,25 +1,28 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from google.protobuf.message import DecodeError
+from starlette.routing import Match
+from pydantic import BaseModel, Field, ValidationError, field_validator
+import hmac
 import logging
-from typing import List
-import nltk
-from textblob import TextBlob
-from collections import Counter
-import re
-
-# Download NLTK data
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
-
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
-
-from nltk.corpus import stopwords
-from nltk.tokenize import sent_tokenize, word_tokenize
+from typing import List, Literal, Optional
+from contextlib import asynccontextmanager
+import os
+import time
+import asyncio
+import grpc
+import orjson
+from textproc import analysis, engines, metrics, profiling, text_processor_pb2, tiers
+from textproc.admission import Rejected, create_admission, readiness_problem
+from textproc.aggregates import create_aggregates
+from textproc.cache import cache_key, create_cache
+from textproc.coalescing import SingleFlight
+from textproc.jobs import create_jobs
+from textproc.pipeline import TextProcessor, compute
+from textproc.workers import WorkerPool
+from grpc_client import GRPCClient
+from streaming import NDJSONStreamingResponse, map_bounded, ndjson_lines
 
 # Configure logging
 logging.basicConfig(
@@ -28,139 +31,370 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+PROCESSING_MODES = ('local', 'grpc')
+
+# /summarize reads and writes ProcessTextRequest / ProcessTextResponse messages under this type
+PROTOBUF_MEDIA_TYPE = 'application/x-protobuf'
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm the worker pool or the gRPC channels and start the job queue, release them on shutdown"""
+    if processing_mode == 'grpc':
+        await grpc_client.connect()
+    else:
+        # Accept connections straight away; /health answers 503 until the pool is warm
+        warm_up = asyncio.create_task(worker_pool.warm_up())
+    if jobs is not None:
+        await jobs.start()
+    yield
+    if jobs is not None:
+        await jobs.close()
+    if processing_mode == 'grpc':
+        await grpc_client.close()
+    else:
+        warm_up.cancel()
+        worker_pool.shutdown()
+
 # Create FastAPI app
 app = FastAPI(
     title="Text Processing API",
     description="A microservice for text processing with summarization, sentiment analysis, and keyword extraction",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Size tiers and the hard input limit
+tier_policy = tiers.TierPolicy()
+
+HTTP_REQUESTS = metrics.REGISTRY.counter(
+    'http_requests_total', 'HTTP requests completed, by route and status', ('method', 'path', 'status')
+)
+HTTP_LATENCY = metrics.REGISTRY.histogram(
+    'http_request_duration_seconds', 'Time to answer an HTTP request', ('method', 'path')
+)
+HTTP_IN_FLIGHT = metrics.REGISTRY.gauge('http_requests_in_flight', 'HTTP requests currently being handled')
+tier_policy.register_metrics()
+
+def route_template(request):
+    """Path of the route a request matches, so unknown URLs share one series"""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return 'unmatched'
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count, time and track every request by method, route and status"""
+    path = route_template(request)
+    in_flight = HTTP_IN_FLIGHT.labels()
+    in_flight.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        in_flight.dec()
+        HTTP_LATENCY.labels(request.method, path).observe(time.perf_counter() - start)
+        HTTP_REQUESTS.labels(request.method, path, status).inc()
+
 # Pydantic models
 class TextRequest(BaseModel):
-    text: str = Field(..., min_length=1, description="Text to process")
+    text: str = Field(..., min_length=1, max_length=tier_policy.max_chars, description="Text to process")
+    sentiment_engine: Optional[str] = Field(
+        None, description="Registered sentiment engine to use, such as lexicon or textblob; defaults to SENTIMENT_ENGINE"
+    )
+    features: Optional[List[Literal['summary', 'sentiment', 'keywords']]] = Field(
+        None, description="Analyses to run; all of them when omitted or empty"
+    )
+    num_sentences: int = Field(analysis.DEFAULT_NUM_SENTENCES, ge=1, description="Sentences in the summary")
+    top_n: int = Field(analysis.DEFAULT_TOP_N, ge=1, description="Number of keywords")
+
+    @field_validator('sentiment_engine')
+    @classmethod
+    def registered_engine(cls, engine):
+        if engine is not None:
+            engines.get('sentiment', engine)
+        return engine
+
+    def options(self, default_engine):
+        """Analysis options for this request in canonical form"""
+        requested = self.features or analysis.FEATURES
+        return analysis.AnalysisOptions(
+            features=tuple(feature for feature in analysis.FEATURES if feature in requested),
+            num_sentences=self.num_sentences,
+            top_n=self.top_n,
+            sentiment_engine=self.sentiment_engine or default_engine
+        )
 
 class ProcessingResult(BaseModel):
-    summary: str
-    sentiment: str
-    keywords: List[str]
+    # Analyses that were not requested are null
+    summary: Optional[str] = None
+    sentiment: Optional[str] = None
+    keywords: Optional[List[str]] = None
     original_length: int
     processed_length: int
 
+class ProfileSettings(BaseModel):
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = Field(None, ge=0, le=1, description="Fraction of requests to profile")
+    mode: Optional[Literal['stack', 'cprofile']] = None
+
 class SummarizeResponse(BaseModel):
     success: bool
     result: ProcessingResult = None
     error: str = None
 
-# Text processing class
-class TextProcessor:
-    def __init__(self):
-        try:
-            self.stop_words = set(stopwords.words('english'))
-        except:
-            # Fallback if NLTK stopwords fail
-            self.stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'shall', 'can', 'this', 'that', 'these', 'those'}
-        logger.info("TextProcessor initialized successfully")
-
-    def extractive_summarization(self, text, num_sentences=2):
-        """Simple extractive summarization based on sentence scoring"""
-        try:
-            sentences = sent_tokenize(text)
-            
-            if len(sentences) <= num_sentences:
-                return text
-            
-            # Score sentences based on word frequency
-            words = word_tokenize(text.lower())
-            words = [word for word in words if word.isalnum() and word not in self.stop_words]
-            
-            word_freq = Counter(words)
-            
-            sentence_scores = {}
-            for sentence in sentences:
-                sentence_words = word_tokenize(sentence.lower())
-                sentence_words = [word for word in sentence_words if word.isalnum()]
-                
-                score = 0
-                word_count = 0
-                for word in sentence_words:
-                    if word in word_freq:
-                        score += word_freq[word]
-                        word_count += 1
-                
-                if word_count > 0:
-                    sentence_scores[sentence] = score / word_count
-            
-            # Get top sentences
-            top_sentences = sorted(sentence_scores.items(), key=lambda x: x[1], reverse=True)
-            summary_sentences = [sent[0] for sent in top_sentences[:num_sentences]]
-            
-            # Maintain original order
-            summary = []
-            for sentence in sentences:
-                if sentence in summary_sentences:
-                    summary.append(sentence)
-            
-            return ' '.join(summary)
-            
-        except Exception as e:
-            logger.error(f"Error in summarization: {str(e)}")
-            # Fallback: return first few sentences
-            sentences = text.split('.')
-            return '. '.join(sentences[:2]) + '.' if len(sentences) > 2 else text
-
-    def analyze_sentiment(self, text):
-        """Analyze sentiment using TextBlob"""
-        try:
-            blob = TextBlob(text)
-            polarity = blob.sentiment.polarity
-            
-            if polarity > 0.1:
-                return "positive"
-            elif polarity < -0.1:
-                return "negative"
-            else:
-                return "neutral"
-                
-        except Exception as e:
-            logger.error(f"Error in sentiment analysis: {str(e)}")
-            # Fallback: simple keyword-based sentiment
-            positive_words = ['good', 'great', 'excellent', 'amazing', 'wonderful', 'fantastic', 'love', 'like', 'best', 'awesome']
-            negative_words = ['bad', 'terrible', 'awful', 'horrible', 'hate', 'worst', 'disgusting', 'annoying', 'frustrating']
-            
-            text_lower = text.lower()
-            positive_count = sum(1 for word in positive_words if word in text_lower)
-            negative_count = sum(1 for word in negative_words if word in text_lower)
-            
-            if positive_count > negative_count:
-                return "positive"
-            elif negative_count > positive_count:
-                return "negative"
-            else:
-                return "neutral"
+class FastJSONResponse(Response):
+    """JSON encoded by orjson from plain dicts and lists, with no model validation on the way out"""
+    media_type = 'application/json'
 
-    def extract_keywords(self, text, top_n=5):
-        """Extract keywords using simple frequency analysis"""
-        try:
-            words = word_tokenize(text.lower())
-            words = [word for word in words if word.isalnum() and len(word) > 2 and word not in self.stop_words]
-            
-            word_freq = Counter(words)
-            top_words = word_freq.most_common(top_n)
-            
-            return [word for word, _ in top_words]
-            
-        except Exception as e:
-            logger.error(f"Error in keyword extraction: {str(e)}")
-            # Fallback: simple regex-based extraction
-            words = re.findall(r'\b\w{3,}\b', text.lower())
-            word_freq = Counter(words)
-            common_words = {'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'had', 'her', 'was', 'one', 'our', 'out', 'day', 'get', 'has', 'him', 'his', 'how', 'man', 'new', 'now', 'old', 'see', 'two', 'way', 'who', 'boy', 'did', 'its', 'let', 'put', 'say', 'she', 'too', 'use'}
-            filtered_words = {word: count for word, count in word_freq.items() if word not in common_words}
-            top_words = sorted(filtered_words.items(), key=lambda x: x[1], reverse=True)[:top_n]
-            return [word for word, _ in top_words]
+    def render(self, content):
+        return orjson.dumps(content)
+
+class StreamRequest(TextRequest):
+    id: Optional[str] = Field(None, description="Echoed back on the result line")
+
+class StreamResult(SummarizeResponse):
+    id: Optional[str] = None
+    line: int
+
+class JobResponse(BaseModel):
+    id: str
+    status: Literal['queued', 'running', 'succeeded', 'failed', 'cancelled']
+    created_at: float
+    updated_at: float
+    expires_at: Optional[float] = Field(None, description="When a finished job is forgotten")
+    result: Optional[ProcessingResult] = None
+    error: Optional[str] = None
 
 # Initialize processor
 processor = TextProcessor()
+tier_policy.check_engines(processor)
+
+# NLP runs in worker processes so the event loop stays free for other requests
+worker_pool = WorkerPool(
+    processor,
+    mode=os.getenv('WORKER_MODE', 'process'),
+    max_workers=int(os.getenv('WORKER_COUNT', '0')) or None
+)
+
+# Repeated texts are answered from here without running the pipeline again
+result_cache = create_cache('serving')
+
+# Identical texts arriving together share one computation or one call to the processing service
+in_flight = SingleFlight()
+
+# 'local' runs NLP in this service; 'grpc' forwards to the processing service so
+# the HTTP tier can scale separately from the CPU-heavy one
+processing_mode = os.getenv('PROCESSING_MODE', 'local')
+if processing_mode not in PROCESSING_MODES:
+    raise ValueError(f"Unknown processing mode '{processing_mode}', expected one of {PROCESSING_MODES}")
+
+# Channels are opened by the lifespan hook in grpc mode
+grpc_client = GRPCClient()
+
+# Rolling keyword and sentiment counts; in grpc mode the processing service keeps them
+aggregates = create_aggregates() if processing_mode == 'local' else None
+
+# Local processing is CPU-bound; forwarding mostly waits on the network
+admission = create_admission(2 * worker_pool.max_workers if processing_mode == 'local' else 256)
+
+# Cache, pool and admission stats are read when /metrics is scraped; the pool
+# only does work in local mode, the client's breakers only in grpc mode
+metrics.REGISTRY.add_collector(lambda: metrics.component_families(
+    result_cache, worker_pool if processing_mode == 'local' else None, admission, coalescing=in_flight
+))
+if processing_mode == 'grpc':
+    metrics.REGISTRY.histogram(
+        'text_grpc_client_call_duration_seconds', 'Time to get an answer from the processing service',
+        children={(): grpc_client.call_latency}
+    )
+    metrics.REGISTRY.add_collector(grpc_client.metric_families)
+
+# Off unless PROFILE_ENABLED or POST /debug/profile turns it on
+profiler = profiling.Profiler(service='serving')
+
+# The /debug endpoints exist only when this is set, and require it in X-Admin-Token
+PROFILE_ADMIN_TOKEN = os.getenv('PROFILE_ADMIN_TOKEN')
+
+def check_admin_token(token):
+    if not PROFILE_ADMIN_TOKEN or not hmac.compare_digest((token or '').encode(), PROFILE_ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+# Running requests with none finishing for this long means the workers are wedged
+HEALTH_STALL_SECONDS = float(os.getenv('HEALTH_STALL_SECONDS', '60'))
+
+def request_deadline(timeout):
+    """Event loop time by which a client that sent X-Request-Timeout gives up"""
+    if timeout is None:
+        return None
+    return asyncio.get_running_loop().time() + timeout
+
+async def fetch_remote(text, options, ticket=None):
+    """ProcessTextResponse for a text from the processing service, shared by identical concurrent requests.
+
+    ``ticket`` is the caller's (priority, deadline) for admission; requests
+    sharing a call hold one slot between them. The response may be shared:
+    copy it before changing it.
+    """
+    async def call():
+        try:
+            response = await grpc_client.process_text(
+                text,
+                features=options.features,
+                num_sentences=options.num_sentences,
+                top_n=options.top_n,
+                sentiment_engine=options.sentiment_engine
+            )
+        except grpc.RpcError as e:
+            # Shed or out of time on the processing service: answered 429 or 504 like local admission
+            reason = 'expired' if e.code() == grpc.StatusCode.DEADLINE_EXCEEDED else 'queue_full'
+            raise Rejected(reason) from e
+        if response is None:
+            raise RuntimeError("Processing service unavailable")
+        return response
+
+    return await in_flight.run(cache_key(text, **options._asdict()), call, admission, ticket)
+
+async def analyze_remote(text, options, ticket=None):
+    """Return (summary, sentiment, keywords) computed by the processing service"""
+    response = await fetch_remote(text, options, ticket)
+    return (
+        response.summary if options.wants('summary') else None,
+        response.sentiment if options.wants('sentiment') else None,
+        list(response.keywords) if options.wants('keywords') else None
+    )
+
+async def analyze_text(text, options=None, ticket=None):
+    """Return (summary, sentiment, keywords), from the cache or an identical request in flight when possible"""
+    options = options or analysis.AnalysisOptions(sentiment_engine=processor.sentiment_engine)
+    if processing_mode == 'grpc':
+        # The processing service keeps its own cache
+        return await analyze_remote(text, options, ticket)
+
+    async def compute_and_cache():
+        result = await compute(processor, worker_pool, tier_policy, text, options)
+        if result_cache is not None:
+            result_cache.set(key, result)
+        return result
+
+    key = cache_key(text, **options._asdict())
+    result = result_cache.get(key) if result_cache is not None else None
+    if result is None:
+        result = await in_flight.run(key, compute_and_cache, admission, ticket)
+
+    if aggregates is not None:
+        _, sentiment, keywords = result
+        aggregates.add(sentiment, keywords)
+    return result
+
+def processing_result(text, summary, sentiment, keywords):
+    return ProcessingResult(
+        summary=summary,
+        sentiment=sentiment,
+        keywords=keywords,
+        original_length=len(text),
+        processed_length=len(summary or '')
+    )
+
+async def run_job(text, options):
+    """Job handler: process a text like /summarize, outside admission control"""
+    metrics.INPUT_CHARS.labels().observe(len(text))
+    return processing_result(text, *await analyze_text(text, options)).model_dump()
+
+# Large texts submitted to /jobs run here in the background, JOB_CONCURRENCY at a time;
+# the lifespan hook opens the store
+jobs = create_jobs(run_job, 'serving')
+if jobs is not None:
+    metrics.REGISTRY.add_collector(lambda: metrics.component_families(jobs=jobs))
+
+# Documents of one /summarize/stream request in flight; no more lines are read until a result is sent
+STREAM_MAX_IN_FLIGHT = int(os.getenv('STREAM_MAX_IN_FLIGHT', '32'))
+# Longest stream line: a maximum-size text at up to 6 bytes per character of JSON, plus the other fields
+STREAM_MAX_LINE_BYTES = 6 * tier_policy.max_chars + 64 * 1024
+
+def validation_details(error):
+    return "; ".join(
+        f"{'.'.join(map(str, item['loc']))}: {item['msg']}" if item['loc'] else item['msg'] for item in error.errors()
+    )
+
+async def process_stream_line(number, line, priority):
+    """Result line for one NDJSON request line; a failed line does not fail the stream"""
+    if line is None:
+        return StreamResult(line=number, success=False, error=f"Line exceeds {STREAM_MAX_LINE_BYTES} bytes")
+    try:
+        item = StreamRequest.model_validate_json(line)
+    except ValidationError as e:
+        return StreamResult(line=number, success=False, error=f"Invalid request: {validation_details(e)}")
+
+    try:
+        metrics.INPUT_CHARS.labels().observe(len(item.text))
+        # Every document of a stream needs its own slot, unless it shares a computation in flight
+        summary, sentiment, keywords = await analyze_text(
+            item.text, item.options(processor.sentiment_engine), (priority, None)
+        )
+    except Rejected:
+        return StreamResult(id=item.id, line=number, success=False, error="Server is at capacity, retry later")
+    except Exception as e:
+        logger.error(f"Error processing stream line {number}: {str(e)}")
+        return StreamResult(id=item.id, line=number, success=False, error=f"Processing error: {str(e)}")
+
+    return StreamResult(
+        id=item.id, line=number, success=True,
+        result=processing_result(item.text, summary, sentiment, keywords)
+    )
+
+async def read_text_request(request):
+    """The /summarize body as a TextRequest, validated in one pass from JSON or protobuf bytes"""
+    body = await request.body()
+    try:
+        if request.headers.get('content-type', '').startswith(PROTOBUF_MEDIA_TYPE):
+            message = text_processor_pb2.ProcessTextRequest.FromString(body)
+            # Unset proto3 fields arrive as zero values; leave them to the model defaults
+            fields = {"text": message.text, "sentiment_engine": message.sentiment_engine or None,
+                      "features": list(message.features) or None}
+            if message.num_sentences:
+                fields["num_sentences"] = message.num_sentences
+            if message.top_n:
+                fields["top_n"] = message.top_n
+            return TextRequest.model_validate(fields)
+        return TextRequest.model_validate_json(body)
+    except DecodeError:
+        raise RequestValidationError([
+            {"type": "protobuf_invalid", "loc": ("body",), "msg": "Invalid ProcessTextRequest message", "input": None}
+        ])
+    except ValidationError as e:
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)
+        ])
+
+def local_response(text, summary, sentiment, keywords):
+    return text_processor_pb2.ProcessTextResponse(
+        summary=summary or '',
+        sentiment=sentiment or '',
+        keywords=keywords or [],
+        original_length=len(text),
+        processed_length=len(summary or '')
+    )
+
+def encode_summarize_response(response, options, protobuf):
+    """Serialize a ProcessTextResponse as the message itself, or straight to the JSON of a SummarizeResponse"""
+    if protobuf:
+        return Response(response.SerializeToString(), media_type=PROTOBUF_MEDIA_TYPE)
+    return FastJSONResponse({
+        "success": True,
+        "result": {
+            "summary": response.summary if options.wants('summary') else None,
+            "sentiment": response.sentiment if options.wants('sentiment') else None,
+            "keywords": list(response.keywords) if options.wants('keywords') else None,
+            "original_length": response.original_length,
+            "processed_length": response.processed_length,
+        },
+        "error": None,
+    })
 
 @app.get("/")
 async def root():
@@ -169,59 +403,213 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Detailed health check"""
-    return {
+    """Detailed health check; 503 when this instance should not get traffic"""
+    health = {
         "status": "healthy",
         "service": "text-processing-api",
         "version": "1.0.0",
+        "processing_mode": processing_mode,
         "features": ["summarization", "sentiment_analysis", "keyword_extraction"]
     }
+    if processing_mode == 'grpc':
+        connected = await grpc_client.health_check()
+        health["grpc_connection"] = "ok" if connected else "unavailable"
+        health["endpoints"] = grpc_client.endpoint_health
+        if not connected:
+            health["status"] = "unhealthy"
+    else:
+        problem = readiness_problem(worker_pool, admission, HEALTH_STALL_SECONDS)
+        if problem is not None:
+            health["status"] = "unhealthy"
+            health["reason"] = problem
 
-@app.post("/summarize", response_model=SummarizeResponse)
-async def summarize_text(request: TextRequest):
+    if health["status"] != "healthy":
+        return JSONResponse(status_code=503, content=health)
+    return health
+
+@app.post(
+    "/summarize",
+    response_model=SummarizeResponse,
+    openapi_extra={"requestBody": {"required": True, "content": {
+        "application/json": {"schema": {"$ref": "#/components/schemas/TextRequest"}},
+        PROTOBUF_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}},
+    }}},
+    responses={200: {"content": {PROTOBUF_MEDIA_TYPE: {}}}}
+)
+async def summarize_text(
+    http_request: Request,
+    accept: Optional[str] = Header(None),
+    x_priority: Optional[Literal['high', 'normal', 'low']] = Header(None),
+    x_request_timeout: Optional[float] = Header(None, gt=0),
+    x_profile: Optional[str] = Header(None)
+):
     """
     Process text to get summary, sentiment analysis, and keywords
     """
+    # Parsed here rather than as a body parameter so the bytes are validated once, as JSON or protobuf
+    request = await read_text_request(http_request)
+    protobuf = PROTOBUF_MEDIA_TYPE in (accept or '')
     try:
         logger.info(f"Processing text with {len(request.text)} characters")
         
-        # Process text using internal methods
-        summary = processor.extractive_summarization(request.text)
-        sentiment = processor.analyze_sentiment(request.text)
-        keywords = processor.extract_keywords(request.text)
+        options = request.options(processor.sentiment_engine)
+        metrics.INPUT_CHARS.labels().observe(len(request.text))
+        ticket = (x_priority or 'normal', request_deadline(x_request_timeout))
+        with profiler.profile('summarize', profiling.requested(x_profile)):
+            if processing_mode == 'grpc':
+                # Passed on as received; the processing service keeps its own cache
+                response = await fetch_remote(request.text, options, ticket)
+            else:
+                response = local_response(request.text, *await analyze_text(request.text, options, ticket))
         
-        result = ProcessingResult(
-            summary=summary,
-            sentiment=sentiment,
-            keywords=keywords,
-            original_length=len(request.text),
-            processed_length=len(summary)
-        )
+        with metrics.stage_timer('serialization'):
+            encoded = encode_summarize_response(response, options, protobuf)
         
         logger.info("Text processing completed successfully")
-        return SummarizeResponse(success=True, result=result)
+        return encoded
+
+    except Rejected as e:
+        logger.warning(f"Shed text request: {e.reason}")
+        if e.reason == 'expired':
+            raise HTTPException(status_code=504, detail="Request timed out while waiting to be processed")
+        raise HTTPException(status_code=429, detail="Server is at capacity, retry later", headers={"Retry-After": "1"})
         
     except Exception as e:
         logger.error(f"Error processing text: {str(e)}")
-        return SummarizeResponse(
-            success=False, 
-            error=f"Processing error: {str(e)}"
+        # A protobuf caller gets the error as JSON under a 500, since it cannot be a ProcessTextResponse
+        return FastJSONResponse(
+            {"success": False, "result": None, "error": f"Processing error: {str(e)}"},
+            status_code=500 if protobuf else 200
         )
 
+@app.post("/summarize/stream", response_class=NDJSONStreamingResponse)
+async def summarize_stream(
+    request: Request,
+    ordered: bool = Query(False, description="Send results in input order rather than as each finishes"),
+    x_priority: Optional[Literal['high', 'normal', 'low']] = Header(None)
+):
+    """
+    Process a chunked NDJSON body of /summarize requests, streaming an NDJSON result line per document
+    """
+    priority = x_priority or 'normal'
+
+    async def process(entry):
+        return (await process_stream_line(*entry, priority)).model_dump_json() + '\n'
+
+    logger.info("Processing NDJSON stream")
+    lines = ndjson_lines(request.stream(), STREAM_MAX_LINE_BYTES)
+    return NDJSONStreamingResponse(map_bounded(lines, process, STREAM_MAX_IN_FLIGHT, ordered))
+
+def available_endpoints():
+    """Paths of the registered endpoints; /debug/profile only exists with PROFILE_ADMIN_TOKEN"""
+    paths = ["/", "/health", "/summarize", "/summarize/stream", "/jobs", "/aggregates", "/stats", "/metrics"]
+    if any(getattr(route, 'path', None) == "/debug/profile" for route in app.routes):
+        paths.append("/debug/profile")
+    return paths
+
 @app.get("/stats")
 async def get_stats():
     """Get API statistics"""
     return {
         "api_version": "1.0.0",
         "service_name": "text-processing-api",
-        "available_endpoints": ["/", "/health", "/summarize", "/stats"],
+        "available_endpoints": available_endpoints(),
         "processing_features": [
             "extractive_summarization",
             "sentiment_analysis", 
             "keyword_extraction"
-        ]
+        ],
+        "processing_mode": processing_mode,
+        "grpc": grpc_client.stats() if processing_mode == 'grpc' else None,
+        "cache": result_cache.stats() if result_cache is not None else None,
+        "tiers": tier_policy.stats(),
+        "admission": admission.stats(),
+        "coalescing": in_flight.stats(),
+        "aggregates": aggregates.stats() if aggregates is not None else None,
+        "jobs": jobs.stats() if jobs is not None else None,
+        "profiling": profiler.stats()
     }
 
+def job_queue():
+    if jobs is None:
+        raise HTTPException(status_code=404, detail="The job API is disabled")
+    return jobs
+
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+async def submit_job(request: TextRequest):
+    """Queue a text to be processed in the background; poll GET /jobs/{id} for the result"""
+    try:
+        job = job_queue().submit(request.text, request.options(processor.sentiment_engine))
+    except Rejected:
+        raise HTTPException(status_code=429, detail="Too many queued jobs, retry later", headers={"Retry-After": "5"})
+    logger.info(f"Queued job {job.id} with {len(request.text)} characters")
+    return job._asdict()
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Status of a job, with its result once it succeeded"""
+    job = job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job, or its result has expired")
+    return job._asdict()
+
+@app.delete("/jobs/{job_id}", response_model=JobResponse)
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; a finished one is returned unchanged"""
+    job = job_queue().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job, or its result has expired")
+    return job._asdict()
+
+@app.get("/aggregates")
+async def get_aggregates(
+    top_k: int = Query(20, ge=1, le=1000),
+    window_seconds: Optional[float] = Query(None, gt=0)
+):
+    """Top keywords and sentiment mix of the documents processed over the recent window"""
+    if processing_mode == 'grpc':
+        # Every processing replica counts the documents it answered
+        snapshot = await grpc_client.get_aggregates(top_k, window_seconds)
+        if snapshot is None:
+            raise HTTPException(status_code=503, detail="Processing service unavailable")
+        return snapshot
+    if aggregates is None:
+        raise HTTPException(status_code=404, detail="Aggregates are disabled")
+    return aggregates.snapshot(top_k, window_seconds)
+
+async def get_profile(x_admin_token: Optional[str] = Header(None)):
+    """Collapsed stack samples of the profiled requests, for flamegraph.pl or speedscope"""
+    check_admin_token(x_admin_token)
+    return profiler.collapsed()
+
+async def configure_profile(settings: ProfileSettings, x_admin_token: Optional[str] = Header(None)):
+    """Turn profiling on or off, or change its sample rate or mode"""
+    check_admin_token(x_admin_token)
+    profiler.configure(**settings.model_dump())
+    return profiler.stats()
+
+async def reset_profile(x_admin_token: Optional[str] = Header(None)):
+    """Forget the stack samples collected so far"""
+    check_admin_token(x_admin_token)
+    profiler.reset()
+    return profiler.stats()
+
+def add_profile_admin(app):
+    """Register the /debug/profile endpoints, which check X-Admin-Token against PROFILE_ADMIN_TOKEN"""
+    app.add_api_route("/debug/profile", get_profile, methods=["GET"], response_class=PlainTextResponse)
+    app.add_api_route("/debug/profile", configure_profile, methods=["POST"])
+    app.add_api_route("/debug/profile", reset_profile, methods=["DELETE"])
+
+if PROFILE_ADMIN_TOKEN:
+    add_profile_admin(app)
+else:
+    logger.info("PROFILE_ADMIN_TOKEN not set, /debug/profile disabled")
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition of request, stage and component metrics"""
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,167 @@
+import os
+import time
+from collections import deque
+
+import grpc
+
+# Codes that say something about the endpoint rather than about the request
+ENDPOINT_FAILURES = frozenset((
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+    grpc.StatusCode.INTERNAL,
+    grpc.StatusCode.UNKNOWN,
+))
+
+# Codes worth sending to another endpoint straight away
+RETRYABLE = frozenset((
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+))
+
+
+class BackendUnavailable(Exception):
+    """Every endpoint's circuit breaker is open"""
+
+
+class DeadlinePolicy:
+    """Per-call deadline that grows with the size of the input.
+
+    A call gets ``base_seconds`` plus ``per_kchar_seconds`` for every thousand
+    characters, capped at ``max_seconds``, so a slow replica cannot hold a
+    short text for as long as a multi-megabyte one.
+    """
+
+    def __init__(self, base_seconds=None, per_kchar_seconds=None, max_seconds=None):
+        self.base_seconds = base_seconds or float(os.getenv('GRPC_DEADLINE_BASE_SECONDS', '2'))
+        self.per_kchar_seconds = per_kchar_seconds or float(os.getenv('GRPC_DEADLINE_PER_KCHAR_SECONDS', '0.01'))
+        self.max_seconds = max_seconds or float(os.getenv('GRPC_DEADLINE_MAX_SECONDS', '60'))
+
+    def timeout_for(self, chars):
+        return min(self.base_seconds + self.per_kchar_seconds * chars / 1000, self.max_seconds)
+
+
+class LatencyTracker:
+    """Recent call latencies by input size class, used to decide when to hedge.
+
+    Size classes double in width (under 1k characters, 1-2k, 2-4k, ...) so
+    long texts don't make every short one look fast.
+    """
+
+    def __init__(self, percentile=None, min_samples=None, window=200):
+        self.percentile = percentile if percentile is not None else float(os.getenv('GRPC_HEDGE_PERCENTILE', '95'))
+        self.min_samples = min_samples or int(os.getenv('GRPC_HEDGE_MIN_SAMPLES', '20'))
+        self.window = window
+        self._samples = {}
+
+    @staticmethod
+    def size_class(chars):
+        return (chars // 1000).bit_length()
+
+    def observe(self, chars, seconds):
+        samples = self._samples.setdefault(self.size_class(chars), deque(maxlen=self.window))
+        samples.append(seconds)
+
+    def hedge_delay(self, chars):
+        """Seconds after which a call is slower than usual, or None to never hedge"""
+        if not self.percentile:
+            return None
+        samples = self._samples.get(self.size_class(chars))
+        if samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[int(self.percentile / 100 * (len(ordered) - 1))]
+
+
+class CircuitBreaker:
+    """Per-endpoint breaker: closed, open after repeated failures, half-open to probe.
+
+    After ``failure_threshold`` consecutive endpoint failures the breaker
+    opens and the endpoint gets no traffic for ``reset_seconds``; then a
+    single probe call is let through, and its outcome closes or reopens it.
+    """
+
+    def __init__(self, failure_threshold=None, reset_seconds=None):
+        self.failure_threshold = failure_threshold or int(os.getenv('GRPC_BREAKER_FAILURES', '5'))
+        self.reset_seconds = reset_seconds or float(os.getenv('GRPC_BREAKER_RESET_SECONDS', '10'))
+        self.state = 'closed'
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self):
+        """Whether a call may go to the endpoint now; a half-open probe counts as a call"""
+        if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self.state = 'half_open'
+        if self.state == 'closed':
+            return True
+        if self.state == 'half_open' and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.state = 'closed'
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            if self.state != 'open':
+                self.opened += 1
+            self.state = 'open'
+            self._opened_at = time.monotonic()
+
+    def release(self):
+        """Forget a call that ended without telling anything about the endpoint"""
+        self._probing = False
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class RetryBudget:
+    """Caps retries and hedges at a fraction of regular calls.
+
+    Every call deposits ``ratio`` tokens and every retry or hedge spends one,
+    so during an overload extra attempts add at most ``ratio`` to the load;
+    ``min_per_second`` tokens trickle in regardless so a quiet client can
+    still retry.
+    """
+
+    def __init__(self, ratio=None, min_per_second=None, max_tokens=None):
+        self.ratio = ratio if ratio is not None else float(os.getenv('GRPC_RETRY_BUDGET_RATIO', '0.1'))
+        self.min_per_second = min_per_second if min_per_second is not None else \
+            float(os.getenv('GRPC_RETRY_BUDGET_MIN_PER_SECOND', '1'))
+        self.max_tokens = max_tokens or 10 * max(self.min_per_second, 1.0)
+        self.tokens = self.max_tokens
+        self.spent = 0
+        self.denied = 0
+        self._refilled_at = time.monotonic()
+
+    def deposit(self):
+        self.tokens = min(self.tokens + self.ratio, self.max_tokens)
+
+    def try_spend(self):
+        now = time.monotonic()
+        self.tokens = min(self.tokens + (now - self._refilled_at) * self.min_per_second, self.max_tokens)
+        self._refilled_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.spent += 1
+            return True
+        self.denied += 1
+        return False
+
+    def stats(self):
+        return {"tokens": round(self.tokens, 2), "spent": self.spent, "denied": self.denied}
@@ -0,0 +1,115 @@
+import asyncio
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Optional, Tuple, TypeVar
+
+from starlette.responses import StreamingResponse
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+async def ndjson_lines(chunks: AsyncIterable[bytes], max_line_bytes: int) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """Split a chunked body into (line number, line) pairs as the chunks arrive.
+
+    Only the line being assembled is held in memory. A line longer than
+    ``max_line_bytes`` is skipped and reported as None; blank lines are
+    skipped silently. Line numbers start at 1 and count blank lines.
+    """
+    buffer = bytearray()
+    oversized = False
+    number = 0
+    async for chunk in chunks:
+        *complete, tail = chunk.split(b'\n')
+        for piece in complete:
+            number += 1
+            if oversized or len(buffer) + len(piece) > max_line_bytes:
+                yield number, None
+            else:
+                buffer += piece
+                if buffer.strip():
+                    yield number, bytes(buffer)
+            buffer.clear()
+            oversized = False
+        if not oversized:
+            if len(buffer) + len(tail) > max_line_bytes:
+                oversized = True
+                buffer.clear()
+            else:
+                buffer += tail
+
+    number += 1
+    if oversized:
+        yield number, None
+    elif buffer.strip():
+        yield number, bytes(buffer)
+
+
+async def map_bounded(
+    items: AsyncIterable[T], fn: Callable[[T], Awaitable[R]], limit: int, ordered: bool = False
+) -> AsyncIterator[R]:
+    """Await ``fn`` on every item, at most ``limit`` at a time, yielding results as they finish.
+
+    With ``ordered`` results are yielded in input order instead, holding
+    back ones that finish early. Either way input is only read while fewer
+    than ``limit`` items are running or waiting to be yielded, so memory
+    stays bounded however long the input is. ``fn`` should not raise.
+    """
+    window = asyncio.Semaphore(limit)
+    results = asyncio.Queue()
+    pending = set()
+
+    async def run(index, item):
+        await results.put((index, await fn(item)))
+
+    async def read():
+        try:
+            index = 0
+            async for item in items:
+                # Backpressure: stop reading until a result has been yielded
+                await window.acquire()
+                task = asyncio.create_task(run(index, item))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                index += 1
+            await asyncio.gather(*pending)
+        finally:
+            results.put_nowait(None)
+
+    reader = asyncio.create_task(read())
+    finished = {}
+    next_index = 0
+    try:
+        while True:
+            entry = await results.get()
+            if entry is None:
+                # Re-raise any error from reading the input
+                await reader
+                break
+            index, result = entry
+            if not ordered:
+                window.release()
+                yield result
+                continue
+            finished[index] = result
+            while next_index in finished:
+                window.release()
+                yield finished.pop(next_index)
+                next_index += 1
+    finally:
+        reader.cancel()
+        for task in list(pending):
+            task.cancel()
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """Streams NDJSON while the endpoint is still reading the request body.
+
+    StreamingResponse watches for a client disconnect by reading from the
+    request, which would swallow body chunks the endpoint has not read
+    yet. Here only the endpoint reads, and a disconnect ends the body with
+    ClientDisconnect.
+    """
+
+    media_type = 'application/x-ndjson'
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
@@ -1,18 +1,29 @@
+import asyncio
+import itertools
+import os
+import sys
+import time
+from unittest.mock import AsyncMock, Mock
+
+import grpc
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, AsyncMock
-import sys
-import os
+from grpc_health.v1 import health, health_pb2, health_pb2_grpc
 
-# Add the parent directory to Python path to import modules
+# Add the service and the repository root (for textproc) to Python path to import modules
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
+from grpc_client import HEALTH_SERVICE, GRPCClient, parse_targets
 from main import app
+from resilience import CircuitBreaker, DeadlinePolicy, RetryBudget
+from textproc import keepalive
 
 # Mock the gRPC client for testing
 class MockGRPCClient:
     def __init__(self):
         self.connected = True
+        self.endpoint_health = {"localhost:50051": "serving"}
     
     async def connect(self):
         pass
@@ -23,7 +34,8 @@ class MockGRPCClient:
     async def health_check(self):
         return True
     
-    async def process_text(self, text):
+    async def process_text(self, text, **options):
+        self.last_options = options
         # Mock response
         mock_response = Mock()
         mock_response.summary = f"Summary of: {text[:50]}..."
@@ -33,6 +45,31 @@ class MockGRPCClient:
         mock_response.processed_length = len(mock_response.summary)
         return mock_response
 
+class FakeStub:
+    """Processing stub answering after a delay, or failing with a status code"""
+
+    def __init__(self, name, delay=0.0, code=None):
+        self.name = name
+        self.delay = delay
+        self.code = code
+        self.calls = 0
+
+    async def ProcessText(self, request, timeout=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.code is not None:
+            raise grpc.aio.AioRpcError(self.code, grpc.aio.Metadata(), grpc.aio.Metadata(), "fake failure")
+        return self.name
+
+def fake_backend_client(*stubs, budget=None):
+    """GRPCClient whose endpoints are fake stubs, one channel each"""
+    client = GRPCClient(host=[f"{stub.name}:1" for stub in stubs], channels_per_host=1)
+    client._stubs = [(f"{stub.name}:1", stub) for stub in stubs]
+    client._next = itertools.cycle(client._stubs)
+    if budget is not None:
+        client.retry_budget = budget
+    return client
+
 @pytest.fixture
 def client():
     """Create test client"""
@@ -58,6 +95,29 @@ class TestFastAPIService:
         assert "message" in data
         assert data["status"] == "healthy"
 
+    def test_health_reflects_worker_readiness(self, client, monkeypatch):
+        """Test that /health is 503 until the worker pool is warm"""
+        import main
+        monkeypatch.setattr(main.worker_pool, 'ready', False)
+        response = client.get("/health")
+        assert response.status_code == 503
+        assert response.json()["reason"] == "warming up"
+
+        monkeypatch.setattr(main.worker_pool, 'ready', True)
+        response = client.get("/health")
+        assert response.status_code == 200
+        assert response.json()["status"] == "healthy"
+
+    def test_health_uses_grpc_backend(self, client, mock_grpc_client, monkeypatch):
+        """Test that grpc mode reports the processing service health"""
+        import main
+        monkeypatch.setattr(main, 'processing_mode', 'grpc')
+
+        response = client.get("/health")
+
+        assert response.status_code == 200
+        assert response.json()["endpoints"] == {"localhost:50051": "serving"}
+
     def test_stats_endpoint(self, client, mock_grpc_client):
         """Test stats endpoint"""
         response = client.get("/stats")
@@ -65,6 +125,7 @@ class TestFastAPIService:
         data = response.json()
         assert "api_version" in data
         assert "available_endpoints" in data
+        assert "/debug/profile" not in data["available_endpoints"]
 
     def test_summarize_valid_text(self, client, mock_grpc_client):
         """Test summarize endpoint with valid text"""
@@ -93,6 +154,310 @@ class TestFastAPIService:
         # Should return validation error for empty text
         assert response.status_code == 422
 
+    def test_summarize_unknown_sentiment_engine(self, client, mock_grpc_client):
+        """Test summarize endpoint with an unsupported sentiment engine"""
+        response = client.post(
+            "/summarize",
+            json={"text": "Some text.", "sentiment_engine": "vader"}
+        )
+
+        assert response.status_code == 422
+
+    def test_summarize_selected_features(self, client):
+        """Test that only the requested analyses are returned"""
+        test_text = ("Solar power is growing fast. Wind farms produce cheap power. "
+                     "Battery storage makes solar and wind power reliable.")
+
+        response = client.post(
+            "/summarize",
+            json={"text": test_text, "features": ["keywords"], "top_n": 2}
+        )
+
+        result = response.json()["result"]
+        assert result["keywords"] == ["power", "solar"]
+        assert result["summary"] is None and result["sentiment"] is None
+
+        response = client.post("/summarize", json={"text": test_text, "features": ["translation"]})
+        assert response.status_code == 422
+
+    def test_summarize_text_too_large(self, client):
+        """Test summarize endpoint rejects text over the size limit"""
+        import main
+        response = client.post(
+            "/summarize",
+            json={"text": "x" * (main.tier_policy.max_chars + 1)}
+        )
+
+        assert response.status_code == 422
+
+    def test_stats_reports_tier_latency(self, client):
+        """Test that per-tier latency histograms are exposed"""
+        client.post("/summarize", json={"text": "A short text. It is processed inline."})
+
+        tiers = client.get("/stats").json()["tiers"]
+
+        assert set(tiers["latency_seconds"]) == {"inline", "pool", "chunked"}
+        assert tiers["latency_seconds"]["inline"]["count"] >= 1
+
+    def test_metrics_endpoint(self, client):
+        """Test that /metrics exposes request counts, stage latency and component stats"""
+        client.post("/summarize", json={"text": "A short text. It is processed inline."})
+        client.get("/does-not-exist")
+
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        body = response.text
+        assert 'http_requests_total{method="POST",path="/summarize",status="200"}' in body
+        assert 'http_requests_total{method="GET",path="unmatched",status="404"}' in body
+        assert 'text_processing_stage_duration_seconds_count{stage="tokenize"}' in body
+        assert 'text_processing_tier_duration_seconds_bucket{tier="inline",le="+Inf"}' in body
+        assert 'text_admission_active 0' in body.splitlines()
+
+    def test_profile_admin_and_flagged_request(self, client, monkeypatch, tmp_path):
+        """Test enabling profiling, profiling an X-Profile request and reading collapsed stacks"""
+        import main
+        from textproc import profiling
+        monkeypatch.setattr(main, 'profiler', profiling.Profiler(directory=str(tmp_path), interval=0.001))
+        assert client.post("/debug/profile", json={"enabled": True}).status_code == 404
+        monkeypatch.setattr(main, 'PROFILE_ADMIN_TOKEN', 'secret')
+        monkeypatch.setattr(main.app.router, 'routes', list(main.app.router.routes))
+        main.add_profile_admin(main.app)
+        assert "/debug/profile" in client.get("/stats").json()["available_endpoints"]
+
+        assert client.post("/debug/profile", json={"enabled": True}).status_code == 403
+        settings = client.post(
+            "/debug/profile", json={"enabled": True, "mode": "stack"}, headers={"X-Admin-Token": "secret"}
+        ).json()
+        client.post("/summarize", json={"text": "A short text. It is processed inline."},
+                    headers={"X-Profile": "1"})
+        client.post("/summarize", json={"text": "This one is not profiled."})
+
+        assert settings["enabled"] is True
+        assert main.profiler.profiled == 1
+        assert len(list(tmp_path.iterdir())) == 1
+        response = client.get("/debug/profile", headers={"X-Admin-Token": "secret"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert client.delete("/debug/profile", headers={"X-Admin-Token": "secret"}).json()["profiled"] == 0
+
+    def test_summarize_forwards_to_grpc_backend(self, client, mock_grpc_client, monkeypatch):
+        """Test that grpc mode forwards the request and its options to the processing service"""
+        import main
+        monkeypatch.setattr(main, 'processing_mode', 'grpc')
+
+        response = client.post(
+            "/summarize",
+            json={"text": "Forward this text.", "features": ["summary", "keywords"], "top_n": 3}
+        )
+
+        result = response.json()["result"]
+        assert result["summary"] == "Summary of: Forward this text...."
+        assert result["keywords"] == ["test", "mock", "keywords"]
+        assert result["sentiment"] is None
+        assert mock_grpc_client.last_options["features"] == ("summary", "keywords")
+        assert mock_grpc_client.last_options["top_n"] == 3
+
+    @pytest.mark.parametrize("code, status", [
+        (grpc.StatusCode.RESOURCE_EXHAUSTED, 429),
+        (grpc.StatusCode.DEADLINE_EXCEEDED, 504),
+    ])
+    def test_grpc_backend_shedding_keeps_its_status(self, client, monkeypatch, code, status):
+        """Test that a shed or timed out processing call is answered 429 or 504, not 200 with success false"""
+        import main
+        monkeypatch.setattr(main, 'processing_mode', 'grpc')
+        monkeypatch.setattr(main, 'grpc_client', fake_backend_client(FakeStub("backend", code=code)))
+
+        response = client.post("/summarize", json={"text": "Shed this text."})
+
+        assert response.status_code == status
+        if status == 429:
+            assert response.headers["retry-after"] == "1"
+
+    def test_aggregates_endpoint(self, client, monkeypatch):
+        """Test that local processing feeds the rolling keyword and sentiment aggregates"""
+        import main
+        from textproc.aggregates import Aggregates
+        monkeypatch.setattr(main, 'aggregates', Aggregates())
+        for text in ["I love solar power. Solar power is great.", "Solar panels are terrible and awful."]:
+            client.post("/summarize", json={"text": text})
+
+        response = client.get("/aggregates", params={"top_k": 1})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["documents"] == 2
+        assert body["sentiment"] == {"positive": 1, "negative": 1}
+        assert body["keywords"] == [{"keyword": "solar", "count": 2}]
+
+        assert client.get("/aggregates", params={"top_k": 0}).status_code == 422
+        monkeypatch.setattr(main, 'aggregates', None)
+        assert client.get("/aggregates").status_code == 404
+
+    def test_job_lifecycle(self, mock_grpc_client, monkeypatch, tmp_path):
+        """Test that a submitted job is answered with 202 and its result can be polled"""
+        import main
+        from textproc.jobs import JobQueue, JobStore
+        monkeypatch.setattr(main, 'processing_mode', 'grpc')
+        monkeypatch.setattr(main, 'jobs', JobQueue(JobStore(str(tmp_path / "jobs.db")), main.run_job))
+
+        # The lifespan starts the job workers
+        with TestClient(app) as client:
+            response = client.post("/jobs", json={"text": "A long report. " * 100, "features": ["keywords"]})
+            assert response.status_code == 202
+            job = response.json()
+            assert job["status"] == "queued" and job["result"] is None
+
+            for _ in range(100):
+                job = client.get(f"/jobs/{job['id']}").json()
+                if job["status"] == "succeeded":
+                    break
+                time.sleep(0.01)
+            assert job["status"] == "succeeded"
+            assert job["result"]["keywords"] == ["test", "mock", "keywords"]
+            assert job["result"]["summary"] is None
+            assert job["result"]["original_length"] == 1500
+
+            # Cancelling a finished job leaves it as it was
+            assert client.delete(f"/jobs/{job['id']}").json()["status"] == "succeeded"
+            assert client.get("/jobs/unknown").status_code == 404
+            assert main.jobs.stats()["succeeded"] == 1
+
+        monkeypatch.setattr(main, 'jobs', None)
+        assert TestClient(app).post("/jobs", json={"text": "Some text."}).status_code == 404
+
+    def test_summarize_stream_ndjson(self, client, mock_grpc_client, monkeypatch):
+        """Test that an NDJSON body gets one result line per document, bad lines included"""
+        import json
+        import main
+        monkeypatch.setattr(main, 'processing_mode', 'grpc')
+        lines = [json.dumps({"id": f"doc{i}", "text": f"Text number {i}.", "features": ["sentiment"]}) for i in range(5)]
+        body = "\n".join(lines[:3] + ["", "{not json", json.dumps({"text": ""})] + lines[3:])
+
+        response = client.post(
+            "/summarize/stream", params={"ordered": True}, content=body,
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        results = [json.loads(line) for line in response.text.splitlines()]
+        assert [result["line"] for result in results] == [1, 2, 3, 5, 6, 7, 8]
+        assert [result["id"] for result in results if result["success"]] == [f"doc{i}" for i in range(5)]
+        assert results[0]["result"] == {
+            "summary": None, "sentiment": "neutral", "keywords": None, "original_length": 14, "processed_length": 0
+        }
+        assert results[3]["error"].startswith("Invalid request: Invalid JSON")
+        assert results[4]["error"] == "Invalid request: text: String should have at least 1 character"
+
+    def test_ndjson_lines_split_across_chunks(self):
+        """Test that lines are reassembled across chunks and oversized lines are skipped"""
+        from streaming import ndjson_lines
+
+        async def collect(chunks):
+            async def body():
+                for chunk in chunks:
+                    yield chunk
+            return [entry async for entry in ndjson_lines(body(), max_line_bytes=8)]
+
+        assert asyncio.run(collect([b'{"a"', b':1}\n\n{"b":2}', b'\n', b'{"c":3}'])) == [
+            (1, b'{"a":1}'), (3, b'{"b":2}'), (4, b'{"c":3}')
+        ]
+        assert asyncio.run(collect([b'short\n0123', b'456789', b'\nok\n0123456789'])) == [
+            (1, b'short'), (2, None), (3, b'ok'), (4, None)
+        ]
+
+    def test_map_bounded_limits_in_flight_and_keeps_order(self):
+        """Test that at most limit items run at once, and ordered output follows the input"""
+        from streaming import map_bounded
+        running = []
+        peak = []
+
+        async def slow(item):
+            running.append(item)
+            peak.append(len(running))
+            await asyncio.sleep(0.01 * (5 - item % 5))
+            running.remove(item)
+            return item
+
+        async def collect(ordered):
+            async def items():
+                for item in range(12):
+                    yield item
+            return [result async for result in map_bounded(items(), slow, limit=3, ordered=ordered)]
+
+        assert asyncio.run(collect(ordered=True)) == list(range(12))
+        assert max(peak) <= 3
+        unordered = asyncio.run(collect(ordered=False))
+        assert sorted(unordered) == list(range(12)) and unordered != list(range(12))
+
+    def test_summarize_protobuf_content_type(self, client):
+        """Test that internal callers can send and receive protobuf messages instead of JSON"""
+        from textproc import text_processor_pb2
+        request = text_processor_pb2.ProcessTextRequest(
+            text="I love this library. It is great.", features=["sentiment", "keywords"], top_n=2
+        )
+        protobuf = "application/x-protobuf"
+
+        response = client.post(
+            "/summarize", content=request.SerializeToString(),
+            headers={"Content-Type": protobuf, "Accept": protobuf}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == protobuf
+        message = text_processor_pb2.ProcessTextResponse.FromString(response.content)
+        assert message.sentiment == "positive"
+        assert list(message.keywords) == ["love", "library"]
+        assert message.summary == "" and message.original_length == len(request.text)
+
+        # The same body answered as JSON, and a body that is not a message
+        assert client.post(
+            "/summarize", content=request.SerializeToString(), headers={"Content-Type": protobuf}
+        ).json()["result"]["keywords"] == ["love", "library"]
+        assert client.post("/summarize", content=b"\xff\xff", headers={"Content-Type": protobuf}).status_code == 422
+
+    def test_identical_concurrent_texts_are_coalesced(self, mock_grpc_client, monkeypatch):
+        """Test that identical texts in flight together make one call to the processing service"""
+        import main
+        from textproc.analysis import AnalysisOptions
+        from textproc.coalescing import SingleFlight
+        monkeypatch.setattr(main, 'processing_mode', 'grpc')
+        monkeypatch.setattr(main, 'in_flight', SingleFlight())
+        calls = []
+        process_text = mock_grpc_client.process_text
+
+        async def counted(text, **options):
+            calls.append(text)
+            await asyncio.sleep(0.01)
+            return await process_text(text, **options)
+
+        mock_grpc_client.process_text = counted
+
+        async def run():
+            options = AnalysisOptions()
+            return await asyncio.gather(
+                *(main.analyze_text("Same viral text.", options) for _ in range(5)),
+                main.analyze_text("Another text.", options)
+            )
+
+        results = asyncio.run(run())
+        assert len(calls) == 2
+        assert results[0] == results[4] and results[5][0].startswith("Summary of: Another")
+        assert main.in_flight.stats()["coalesced"] == 4
+
+    def test_summarize_sheds_load_with_429(self, client, monkeypatch):
+        """Test that a saturated service refuses requests with 429 and Retry-After"""
+        import main
+        from textproc.admission import AdmissionController
+        monkeypatch.setattr(main, 'admission', AdmissionController(max_concurrent=0, max_queue=0))
+
+        response = client.post("/summarize", json={"text": "Some text."}, headers={"X-Priority": "high"})
+
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+        assert client.get("/stats").json()["admission"]["queue_full"] == 1
+
     def test_summarize_no_text_field(self, client, mock_grpc_client):
         """Test summarize endpoint without text field"""
         response = client.post(
@@ -131,5 +496,209 @@ class TestGRPCClient:
         assert hasattr(result, 'sentiment')
         assert hasattr(result, 'keywords')
 
+    @pytest.mark.asyncio
+    async def test_health_check_uses_health_service_and_caches(self):
+        """Test that health probes use grpc.health.v1 and are reused briefly"""
+        servicer = health.aio.HealthServicer()
+        await servicer.set(HEALTH_SERVICE, health_pb2.HealthCheckResponse.NOT_SERVING)
+        server = grpc.aio.server()
+        health_pb2_grpc.add_HealthServicer_to_server(servicer, server)
+        port = server.add_insecure_port("127.0.0.1:0")
+        await server.start()
+
+        client = GRPCClient(host=f"127.0.0.1:{port}", channels_per_host=1)
+        client.health_cache_seconds = 60
+        await client.connect(warm_up=False)
+        try:
+            assert await client.health_check() is False
+            assert client.endpoint_health == {f"127.0.0.1:{port}": "not_serving"}
+
+            await servicer.set(HEALTH_SERVICE, health_pb2.HealthCheckResponse.SERVING)
+            assert await client.health_check() is False  # cached
+
+            client.health_cache_seconds = 0
+            assert await client.health_check() is True
+        finally:
+            await client.close()
+            await server.stop(0)
+
+    @pytest.mark.asyncio
+    async def test_aggregates_merged_across_endpoints(self):
+        """Test that every replica's aggregates are added together"""
+        from textproc import text_processor_pb2, text_processor_pb2_grpc
+
+        class Replica(text_processor_pb2_grpc.TextProcessorServicer):
+            def __init__(self, documents, keywords):
+                self.documents = documents
+                self.keywords = keywords
+
+            async def GetAggregates(self, request, context):
+                return text_processor_pb2.GetAggregatesResponse(
+                    window_seconds=3600, documents=self.documents, sentiment={"positive": self.documents},
+                    keywords=[text_processor_pb2.KeywordCount(keyword=k, count=c) for k, c in self.keywords]
+                )
+
+        servers = []
+        ports = []
+        for replica in (Replica(3, [("solar", 3), ("wind", 1)]), Replica(2, [("wind", 2), ("hydro", 1)])):
+            server = grpc.aio.server()
+            text_processor_pb2_grpc.add_TextProcessorServicer_to_server(replica, server)
+            ports.append(server.add_insecure_port("127.0.0.1:0"))
+            await server.start()
+            servers.append(server)
+
+        client = GRPCClient(host=",".join(f"127.0.0.1:{port}" for port in ports), channels_per_host=1)
+        await client.connect(warm_up=False)
+        try:
+            merged = await client.get_aggregates(top_k=2)
+            assert merged["documents"] == 5
+            assert merged["sentiment"] == {"positive": 5}
+            assert merged["keywords"] == [{"keyword": "solar", "count": 3}, {"keyword": "wind", "count": 3}]
+            assert merged["endpoints"] == {"answered": 2, "total": 2}
+        finally:
+            await client.close()
+            for server in servers:
+                await server.stop(0)
+
+    @pytest.mark.asyncio
+    async def test_server_accepts_keepalive_pings_on_idle_channels(self, monkeypatch):
+        """Test that the processing server's ping policy keeps the client's idle channels connected"""
+        monkeypatch.setenv("GRPC_KEEPALIVE_TIME_MS", "1000")
+        client_options = dict(keepalive.client_options())
+        server_options = dict(keepalive.server_options())
+        assert server_options["grpc.keepalive_permit_without_calls"] == client_options["grpc.keepalive_permit_without_calls"]
+        assert server_options["grpc.http2.min_ping_interval_without_data_ms"] <= client_options["grpc.keepalive_time_ms"]
+
+        server = grpc.aio.server(options=keepalive.server_options())
+        health_pb2_grpc.add_HealthServicer_to_server(health.aio.HealthServicer(), server)
+        port = server.add_insecure_port("127.0.0.1:0")
+        await server.start()
+
+        client = GRPCClient(host=f"127.0.0.1:{port}", channels_per_host=1)
+        await client.connect(warm_up=False)
+        try:
+            assert dict(client.channel_options)["grpc.keepalive_time_ms"] == 1000
+            await client.health_check()
+            # A server refusing the pings answers GOAWAY too_many_pings within a few seconds
+            await asyncio.sleep(5)
+            assert client.channels[0][1].get_state() == grpc.ChannelConnectivity.READY
+        finally:
+            await client.close()
+            await server.stop(0)
+
+    def test_parse_targets(self):
+        """Test that PROCESSING_HOST lists get the default port where missing"""
+        assert parse_targets("a, b:50052,,[::1]", 50051) == ["a:50051", "b:50052", "[::1]:50051"]
+        assert parse_targets(["[::1]:7000", "::1"], 50051) == ["[::1]:7000", "[::1]:50051"]
+
+    @pytest.mark.asyncio
+    async def test_channel_pool_round_robin(self):
+        """Test that calls are spread over every channel of every endpoint"""
+        client = GRPCClient(host="localhost:1,localhost:2", channels_per_host=2)
+        await client.connect(warm_up=False)
+        try:
+            assert len(client.channels) == 4
+            stubs = [client.stub for _ in range(8)]
+            assert len({id(stub) for stub in stubs}) == 4
+            assert stubs[:4] == stubs[4:]
+            assert set(client.stats()["targets"]) == {"localhost:1", "localhost:2"}
+        finally:
+            await client.close()
+        assert client.stub is None
+
+    @pytest.mark.asyncio
+    async def test_slow_call_is_hedged_to_another_endpoint(self):
+        """Test that a call slower than the hedge percentile is raced on a second endpoint"""
+        slow, fast = FakeStub("slow", delay=5.0), FakeStub("fast")
+        client = fake_backend_client(slow, fast)
+        for _ in range(client.latency.min_samples):
+            client.latency.observe(100, 0.01)
+
+        result = await asyncio.wait_for(client._call('ProcessText', None, 100), timeout=1.0)
+
+        assert result == "fast"
+        assert client.counters["hedges"] == 1 and client.counters["hedges_won"] == 1
+
+    @pytest.mark.asyncio
+    async def test_breaker_steers_traffic_away_from_failing_endpoint(self):
+        """Test that refused calls are retried elsewhere until the breaker opens"""
+        down, up = FakeStub("down", code=grpc.StatusCode.UNAVAILABLE), FakeStub("up")
+        client = fake_backend_client(down, up, budget=RetryBudget(ratio=1.0))
+
+        results = [await client._call('ProcessText', None, 100) for _ in range(12)]
+
+        assert results == ["up"] * 12
+        assert down.calls == client.breakers["down:1"].failure_threshold
+        assert client.stats()["targets"]["down:1"]["breaker"]["state"] == "open"
+
+    @pytest.mark.asyncio
+    async def test_retry_budget_limits_retries(self):
+        """Test that retries stop once the budget is spent"""
+        down, also_down = FakeStub("down", code=grpc.StatusCode.UNAVAILABLE), \
+            FakeStub("also_down", code=grpc.StatusCode.UNAVAILABLE)
+        client = fake_backend_client(down, also_down, budget=RetryBudget(ratio=0.0, min_per_second=0.0, max_tokens=1))
+
+        for _ in range(3):
+            with pytest.raises(grpc.RpcError):
+                await client._call('ProcessText', None, 100)
+
+        assert client.counters["retries"] == 1
+        assert client.retry_budget.denied == 2
+        assert down.calls + also_down.calls == 4
+
+    def test_circuit_breaker_half_open_probe(self, monkeypatch):
+        """Test that an open breaker admits one probe after the reset timeout"""
+        import resilience
+        now = [0.0]
+        monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+        breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10)
+
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open" and not breaker.allow()
+
+        now[0] = 10.0
+        assert breaker.allow() and not breaker.allow()
+        breaker.record_success()
+        assert breaker.state == "closed" and breaker.allow()
+
+    def test_open_breaker_is_asked_once_per_pick(self):
+        """Test that a host with several channels counts one refusal per pick, not one per channel"""
+        down, up = FakeStub("down"), FakeStub("up")
+        client = GRPCClient(host="down:1,up:1", channels_per_host=3)
+        client._stubs = [("down:1", down)] * 3 + [("up:1", up)] * 3
+        client._next = itertools.cycle(client._stubs)
+        client.breakers["down:1"].state = "open"
+        client.breakers["down:1"]._opened_at = float("inf")
+
+        assert client._pick() == ("up:1", up)
+        assert client.breakers["down:1"].rejected == 1
+
+        client.breakers["up:1"].state = "open"
+        client.breakers["up:1"]._opened_at = float("inf")
+        assert client._pick() is None
+        assert client.breakers["down:1"].rejected == 2 and client.breakers["up:1"].rejected == 1
+
+    def test_breaker_metrics(self):
+        """Test that breaker states are exported one-hot per endpoint"""
+        client = GRPCClient(host="a,b", port=50051)
+        client.breakers["a:50051"].state = "open"
+
+        families = {name: samples for name, _, _, samples in client.metric_families()}
+
+        states = {(labels["target"], labels["state"]): value for labels, value in families["text_grpc_breaker_state"]}
+        assert states[("a:50051", "open")] and not states[("a:50051", "closed")]
+        assert states[("b:50051", "closed")]
+        assert ({"event": "hedges"}, 0) in families["text_grpc_client_events_total"]
+
+    def test_deadline_grows_with_input_size(self):
+        """Test that deadlines scale with text length up to the cap"""
+        policy = DeadlinePolicy(base_seconds=1.0, per_kchar_seconds=0.5, max_seconds=10.0)
+
+        assert policy.timeout_for(0) == 1.0
+        assert policy.timeout_for(4000) == 3.0
+        assert policy.timeout_for(10 ** 6) == 10.0
+
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -0,0 +1,12 @@
+"""Text processing core shared by the processing and serving services.
+
+The NLP pipeline, its pluggable engines, the size tiers, worker pool, result
+cache, admission control, metrics and profiler live here once, along with
+the generated gRPC modules, so both services run the same code.
+"""
+from textproc import engines
+from textproc.analysis import FEATURES, AnalysisOptions, Document
+from textproc import sentiment, summarizer
+from textproc.pipeline import TextProcessor, compute
+
+__all__ = ['AnalysisOptions', 'Document', 'FEATURES', 'TextProcessor', 'compute', 'engines']
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# Most important first
+PRIORITIES = ('high', 'normal', 'low')
+
+
+class Rejected(Exception):
+    """A request was shed: ``reason`` is 'queue_full' or 'expired'"""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Ticket:
+    """Priority of a request waiting for a slot, which may still be raised while it waits"""
+
+    def __init__(self, priority='normal'):
+        self.priority = priority if priority in PRIORITIES else 'normal'
+        self._controller = None
+        self._entry = None
+
+    def raise_to(self, priority):
+        """Wait with ``priority`` from now on if it is more urgent than the current one"""
+        if priority not in PRIORITIES or PRIORITIES.index(priority) >= PRIORITIES.index(self.priority):
+            return
+        if self._entry is not None:
+            self._controller._move(self._entry, self.priority, priority)
+        self.priority = priority
+
+
+class AdmissionController:
+    """Bounded admission queue in front of the processing work.
+
+    At most ``max_concurrent`` requests run at once and ``max_queue`` more
+    wait for a slot, highest priority first; anything beyond that is rejected
+    immediately rather than queued until its caller gives up. A full queue
+    makes room for a request by shedding the newest waiter of a lower
+    priority, and waiters whose deadline passes are dropped before they run.
+    """
+
+    def __init__(self, max_concurrent, max_queue=None):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv('ADMISSION_MAX_QUEUE', '64'))
+        self.active = 0
+        self._waiters = {priority: deque() for priority in PRIORITIES}
+        self.counters = {"admitted": 0, "queue_full": 0, "expired": 0, "shed": 0}
+        # Last time a request finished, or started on an idle controller
+        self._progress_at = time.monotonic()
+
+    @property
+    def queued(self):
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    @property
+    def saturated(self):
+        """Every slot busy and the queue full: new requests are being refused"""
+        return self.active >= self.max_concurrent and self.queued >= self.max_queue
+
+    def stalled(self, seconds):
+        """Requests are running but none has finished for ``seconds``"""
+        return self.active > 0 and time.monotonic() - self._progress_at > seconds
+
+    @asynccontextmanager
+    async def admit(self, priority='normal', deadline=None, ticket=None):
+        """Hold a processing slot for the enclosed block.
+
+        ``deadline`` is an event loop time after which the caller has given
+        up. A ``ticket`` replaces ``priority`` and lets it be raised while
+        waiting. Raises Rejected when the queue is full or the deadline
+        passes while waiting.
+        """
+        if ticket is not None:
+            priority = ticket.priority
+        elif priority not in PRIORITIES:
+            priority = 'normal'
+        await self._acquire(priority, deadline, ticket)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority, deadline, ticket=None):
+        loop = asyncio.get_running_loop()
+        if deadline is not None and deadline <= loop.time():
+            self.counters["expired"] += 1
+            raise Rejected('expired')
+
+        if self.active < self.max_concurrent and not self.queued:
+            if not self.active:
+                self._progress_at = time.monotonic()
+            self.active += 1
+            self.counters["admitted"] += 1
+            return
+
+        if self.queued >= self.max_queue and not self._shed_below(priority):
+            self.counters["queue_full"] += 1
+            raise Rejected('queue_full')
+
+        waiter = loop.create_future()
+        entry = (waiter, deadline)
+        self._waiters[priority].append(entry)
+        if ticket is not None:
+            ticket._controller, ticket._entry = self, entry
+        timeout = None if deadline is None else deadline - loop.time()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            if self._forget(entry):
+                self.counters["expired"] += 1
+                raise Rejected('expired')
+            # Settled just as the deadline passed: take that outcome
+        except asyncio.CancelledError:
+            if not self._forget(entry) and not waiter.exception():
+                # The slot was handed over just as the caller went away
+                self._release()
+            raise
+        finally:
+            if ticket is not None:
+                ticket._entry = None
+
+        # Settled by _release with the slot, or with Rejected by _shed_below or _release
+        waiter.result()
+        self.counters["admitted"] += 1
+
+    def _forget(self, entry):
+        """Remove a waiter that gave up; False if it had already left the queue"""
+        for waiters in self._waiters.values():
+            try:
+                waiters.remove(entry)
+                return True
+            except ValueError:
+                pass
+        return False
+
+    def _move(self, entry, priority, raised):
+        """Requeue a waiting entry behind the others of the ``raised`` priority"""
+        try:
+            self._waiters[priority].remove(entry)
+        except ValueError:
+            return
+        self._waiters[raised].append(entry)
+
+    def _shed_below(self, priority):
+        """Reject the newest waiter less important than ``priority`` to make room"""
+        for lower in reversed(PRIORITIES[PRIORITIES.index(priority) + 1:]):
+            if self._waiters[lower]:
+                waiter, _ = self._waiters[lower].pop()
+                waiter.set_exception(Rejected('queue_full'))
+                self.counters["shed"] += 1
+                return True
+        return False
+
+    def _release(self):
+        """Hand the slot to the next live waiter, or give it back"""
+        loop = asyncio.get_running_loop()
+        self._progress_at = time.monotonic()
+        for priority in PRIORITIES:
+            waiters = self._waiters[priority]
+            while waiters:
+                waiter, deadline = waiters.popleft()
+                if waiter.done():
+                    continue
+                if deadline is not None and deadline <= loop.time():
+                    waiter.set_exception(Rejected('expired'))
+                    self.counters["expired"] += 1
+                    continue
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self):
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": self.queued,
+            **self.counters,
+        }
+
+
+def readiness_problem(worker_pool, admission, stall_seconds):
+    """Why a process can't take traffic right now: 'warming up', 'saturated' or 'stalled', else None"""
+    if not worker_pool.ready:
+        return 'warming up'
+    if admission.saturated:
+        return 'saturated'
+    if admission.stalled(stall_seconds):
+        return 'stalled'
+    return None
+
+
+def create_admission(default_concurrency):
+    """Build the controller from ADMISSION_* environment variables"""
+    max_concurrent = int(os.getenv('ADMISSION_MAX_CONCURRENT', '0')) or default_concurrency
+    controller = AdmissionController(max_concurrent)
+    logger.info(f"Admission control: {controller.max_concurrent} concurrent, {controller.max_queue} queued")
+    return controller
@@ -0,0 +1,203 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class CountMinSketch:
+    """Approximate counts of a stream of keys in ``depth`` rows of ``width`` counters.
+
+    An estimate never undercounts, and overcounts by at most ``2 * total /
+    width`` with probability ``1 - 2 ** -depth``. Sketches of the same shape
+    add up, which is how a window sums its buckets.
+    """
+
+    def __init__(self, width=1024, depth=4, table=None):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64) if table is None else table
+        self._rows = np.arange(depth)
+
+    def columns(self, key):
+        """Counter of ``key`` in each row, by double hashing one stable 64-bit digest"""
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+        first = int.from_bytes(digest[:4], 'little')
+        second = int.from_bytes(digest[4:], 'little') | 1
+        return [(first + row * second) % self.width for row in range(self.depth)]
+
+    def add(self, key, count=1):
+        self.table[self._rows, self.columns(key)] += count
+
+    def estimate(self, key):
+        return int(self.table[self._rows, self.columns(key)].min())
+
+
+class SpaceSaving:
+    """The ``capacity`` most frequent keys of a stream, in bounded memory.
+
+    A new key takes over the slot of the current minimum and inherits its
+    count as ``error``, so every key with more than ``total / capacity``
+    occurrences is guaranteed to be kept.
+    """
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+
+    def add(self, key, count=1):
+        if key in self.counts:
+            self.counts[key] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = count
+            self.errors[key] = 0
+        else:
+            evicted = min(self.counts, key=self.counts.get)
+            floor = self.counts.pop(evicted)
+            del self.errors[evicted]
+            self.counts[key] = floor + count
+            self.errors[key] = floor
+
+
+class _Bucket:
+    __slots__ = ('start', 'documents', 'sentiment', 'heavy')
+
+    def __init__(self, start, capacity):
+        self.start = start
+        self.documents = 0
+        self.sentiment = Counter()
+        self.heavy = SpaceSaving(capacity)
+
+
+class Aggregates:
+    """Keyword heavy hitters and the sentiment mix over a sliding time window.
+
+    The window is a ring of ``buckets`` time slices. Each slice keeps a
+    Count-Min sketch of keyword counts, a Space-Saving summary of its most
+    frequent keywords and a sentiment counter, so memory stays bounded
+    however many documents arrive; a slice is reset when the ring comes back
+    round to it. Queries sum the sketches of the live slices and rank the
+    union of their heavy hitters by the summed estimate.
+    """
+
+    def __init__(self, window_seconds=3600, buckets=60, capacity=256, width=1024, depth=4, clock=time.time):
+        self.window_seconds = window_seconds
+        self.buckets = buckets
+        self.bucket_seconds = window_seconds / buckets
+        self.capacity = capacity
+        self.width = width
+        self.depth = depth
+        self.clock = clock
+        self._buckets = [None] * buckets
+        self._tables = np.zeros((buckets, depth, width), dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def _bucket(self, now):
+        """The live bucket for ``now``, recycling its slot if it holds an older slice"""
+        start = int(now // self.bucket_seconds)
+        slot = start % self.buckets
+        bucket = self._buckets[slot]
+        if bucket is None or bucket.start != start:
+            bucket = self._buckets[slot] = _Bucket(start, self.capacity)
+            self._tables[slot] = 0
+        return slot, bucket
+
+    def add(self, sentiment=None, keywords=()):
+        """Count one processed document, with its sentiment label and keywords if they were requested"""
+        with self._lock:
+            slot, bucket = self._bucket(self.clock())
+            bucket.documents += 1
+            if sentiment:
+                bucket.sentiment[sentiment] += 1
+            sketch = CountMinSketch(self.width, self.depth, self._tables[slot])
+            # A keyword counts once per document, however often the text repeats it
+            for keyword in set(keywords or ()):
+                sketch.add(keyword)
+                bucket.heavy.add(keyword)
+
+    def snapshot(self, top_k=20, window_seconds=None):
+        """Documents, sentiment counts and the ``top_k`` keywords of the last ``window_seconds``.
+
+        The window is rounded up to whole buckets and capped at the configured
+        window. Keyword counts are Count-Min estimates: they may be slightly
+        high, never low.
+        """
+        window_seconds = min(window_seconds or self.window_seconds, self.window_seconds)
+        with self._lock:
+            now = self.clock()
+            current = int(now // self.bucket_seconds)
+            oldest = current - max(1, int(-(-window_seconds // self.bucket_seconds))) + 1
+            live = [
+                (slot, bucket) for slot, bucket in enumerate(self._buckets)
+                if bucket is not None and oldest <= bucket.start <= current
+            ]
+
+            documents = sum(bucket.documents for _, bucket in live)
+            sentiment = Counter()
+            candidates = set()
+            for _, bucket in live:
+                sentiment.update(bucket.sentiment)
+                candidates.update(bucket.heavy.counts)
+            summed = CountMinSketch(self.width, self.depth, self._tables[[slot for slot, _ in live]].sum(axis=0))
+            ranked = sorted(((summed.estimate(keyword), keyword) for keyword in candidates), reverse=True)
+
+        return {
+            "window_seconds": (current - oldest + 1) * self.bucket_seconds,
+            "documents": documents,
+            "sentiment": dict(sentiment),
+            "keywords": [{"keyword": keyword, "count": count} for count, keyword in ranked[:top_k]],
+        }
+
+    def stats(self):
+        return {
+            "window_seconds": self.window_seconds,
+            "buckets": self.buckets,
+            "capacity": self.capacity,
+            "sketch_bytes": self._tables.nbytes,
+        }
+
+
+def merge_snapshots(snapshots, top_k=20):
+    """Combine the snapshots of several replicas by adding their counts"""
+    documents = 0
+    sentiment = Counter()
+    keywords = Counter()
+    window_seconds = 0.0
+    for snapshot in snapshots:
+        documents += snapshot["documents"]
+        sentiment.update(snapshot["sentiment"])
+        keywords.update({entry["keyword"]: entry["count"] for entry in snapshot["keywords"]})
+        window_seconds = max(window_seconds, snapshot["window_seconds"])
+    return {
+        "window_seconds": window_seconds,
+        "documents": documents,
+        "sentiment": dict(sentiment),
+        "keywords": [{"keyword": keyword, "count": count} for keyword, count in keywords.most_common(top_k)],
+    }
+
+
+def create_aggregates():
+    """Build the aggregates from AGGREGATE_* environment variables.
+
+    Returns None when ``AGGREGATE_WINDOW_SECONDS=0`` turns them off.
+    """
+    window_seconds = float(os.getenv('AGGREGATE_WINDOW_SECONDS', '3600'))
+    if window_seconds <= 0:
+        logger.info("Keyword and sentiment aggregates disabled")
+        return None
+
+    aggregates = Aggregates(
+        window_seconds=window_seconds,
+        buckets=int(os.getenv('AGGREGATE_BUCKETS', '60')),
+        capacity=int(os.getenv('AGGREGATE_CAPACITY', '256')),
+        width=int(os.getenv('AGGREGATE_SKETCH_WIDTH', '1024')),
+        depth=int(os.getenv('AGGREGATE_SKETCH_DEPTH', '4')),
+    )
+    logger.info(f"Aggregating keywords and sentiment over {window_seconds:.0f}s in {aggregates.buckets} buckets")
+    return aggregates
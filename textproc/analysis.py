@@ -0,0 +1,139 @@
+import re
+from collections import Counter
+from typing import List, NamedTuple, Tuple
+
+from textproc import engines, resources
+
+# Used when the punkt model is not available
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+FEATURES = ('summary', 'sentiment', 'keywords')
+DEFAULT_NUM_SENTENCES = 2
+DEFAULT_TOP_N = 5
+
+_WARM_UP_TEXT = "Models load lazily on first use. This sentence makes them load now."
+
+_word_tokenizer = None
+
+
+class Document:
+    """Text tokenized once and shared by every analysis stage.
+
+    ``tokens`` holds the lowercased word tokens of all sentences back to back,
+    ``sentence_spans[i]`` is the ``(start, end)`` slice of ``tokens`` belonging
+    to ``sentences[i]``, and ``word_mask`` / ``stop_mask`` flag alphanumeric
+    tokens and stopwords respectively.
+    """
+
+    __slots__ = ('text', 'sentences', 'sentence_spans', 'tokens', 'word_mask', 'stop_mask')
+
+    def __init__(self, text: str, sentences: List[str], sentence_spans: List[Tuple[int, int]],
+                 tokens: List[str], word_mask: List[bool], stop_mask: List[bool]):
+        self.text = text
+        self.sentences = sentences
+        self.sentence_spans = sentence_spans
+        self.tokens = tokens
+        self.word_mask = word_mask
+        self.stop_mask = stop_mask
+
+    def content_words(self, min_length=1) -> List[str]:
+        """Alphanumeric, non-stopword tokens of at least ``min_length`` characters"""
+        return [
+            token for token, is_word, is_stop in zip(self.tokens, self.word_mask, self.stop_mask)
+            if is_word and not is_stop and len(token) >= min_length
+        ]
+
+
+class AnalysisOptions(NamedTuple):
+    """Which analyses to run on a text and their parameters.
+
+    Hashable and picklable, so it can be part of a cache key and be sent to
+    pool workers.
+    """
+
+    features: Tuple[str, ...] = FEATURES
+    num_sentences: int = DEFAULT_NUM_SENTENCES
+    top_n: int = DEFAULT_TOP_N
+    sentiment_engine: str = 'lexicon'
+
+    def wants(self, feature: str) -> bool:
+        return feature in self.features
+
+    @property
+    def needs_sentences(self) -> bool:
+        """Only the summary depends on accurate sentence boundaries"""
+        return self.wants('summary')
+
+    @property
+    def needs_tokens(self) -> bool:
+        """Summary and keywords need word tokens; sentiment engines such as TextBlob may not"""
+        return (
+            self.wants('summary') or self.wants('keywords')
+            or (self.wants('sentiment') and engines.get('sentiment', self.sentiment_engine).needs_tokens)
+        )
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences, falling back to punctuation rules without punkt"""
+    tokenizer = resources.sentence_tokenizer()
+    if tokenizer is None:
+        return _split_on_punctuation(text)
+    return tokenizer.tokenize(text)
+
+
+def _split_on_punctuation(text: str) -> List[str]:
+    return [sentence for sentence in _SENTENCE_BOUNDARY.split(text.strip()) if sentence]
+
+
+def word_tokenizer():
+    """NLTK's Treebank-style word tokenizer, imported on first use"""
+    global _word_tokenizer
+    if _word_tokenizer is None:
+        from nltk.tokenize.destructive import NLTKWordTokenizer
+        _word_tokenizer = NLTKWordTokenizer()
+    return _word_tokenizer
+
+
+def tokenize(text: str, stop_words, sentences=True, words=True) -> Document:
+    """Run sentence and word tokenization over the text exactly once.
+
+    Without ``sentences`` the text is split on punctuation only, which skips
+    the punkt model but can break at abbreviations; without ``words`` nothing
+    is tokenized and the document only carries the text.
+    """
+    if not words:
+        return Document(text, [], [], [], [], [])
+
+    split = split_sentences if sentences else _split_on_punctuation
+    sentences = split(text)
+
+    tokenizer = word_tokenizer()
+    tokens = []
+    sentence_spans = []
+    for sentence in sentences:
+        start = len(tokens)
+        # Sentences are already split, so tokenize each as one line
+        tokens.extend(tokenizer.tokenize(sentence.lower()))
+        sentence_spans.append((start, len(tokens)))
+
+    word_mask = [token.isalnum() for token in tokens]
+    stop_mask = [token in stop_words for token in tokens]
+
+    return Document(text, sentences, sentence_spans, tokens, word_mask, stop_mask)
+
+
+def tokenize_for(text: str, stop_words, options: AnalysisOptions) -> Document:
+    """Tokenize only as much as the requested analyses need"""
+    return tokenize(text, stop_words, sentences=options.needs_sentences, words=options.needs_tokens)
+
+
+@engines.register('keywords', 'frequency', chunkable=True)
+def top_keywords(doc: Document, top_n=5) -> List[str]:
+    """Extract keywords using simple frequency analysis"""
+    word_freq = Counter(doc.content_words(min_length=3))
+    return [word for word, _ in word_freq.most_common(top_n)]
+
+
+def warm_up():
+    """Import NLTK and load the punkt model and stopwords before the first request needs them"""
+    tokenize(_WARM_UP_TEXT, resources.stop_words())
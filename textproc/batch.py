@@ -0,0 +1,290 @@
+"""Offline batch processing of JSON lines or Parquet files on every core.
+
+    python -m textproc.batch documents.jsonl results.jsonl
+    python -m textproc.batch archive.parquet results.jsonl --features sentiment keywords --workers 16
+
+Writes one JSON line per input document, in input order, and records its
+progress in ``<output>.checkpoint`` so an interrupted run picks up where it
+stopped.
+"""
+import argparse
+import json
+import logging
+import mmap
+import multiprocessing
+import os
+import signal
+import time
+from collections import deque
+
+from textproc import analysis, engines
+from textproc.pipeline import TextProcessor
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('jsonl', 'parquet')
+
+# Processor and options owned by a worker process, set by the initializer
+_worker_processor = None
+_worker_options = None
+
+
+def _initialize_worker(options):
+    global _worker_processor, _worker_options
+    # Ctrl-C reaches the whole process group; the parent stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_processor = TextProcessor(options.sentiment_engine)
+    _worker_options = options
+
+
+def _process_document(index, document, text_field, id_field):
+    """Result record for one document: a raw JSON line, or a dict read from Parquet"""
+    record = {"id": None, "index": index}
+    try:
+        if isinstance(document, bytes):
+            document = json.loads(document)
+        record["id"] = document.get(id_field)
+        text = document.get(text_field)
+        if not isinstance(text, str) or not text.strip():
+            raise ValueError(f"No text in field '{text_field}'")
+        summary, label, keywords = _worker_processor.process(text, _worker_options)
+        record.update(
+            summary=summary,
+            sentiment=label,
+            keywords=keywords,
+            original_length=len(text),
+            processed_length=len(summary or '')
+        )
+    except Exception as e:
+        record["error"] = str(e)
+    return record
+
+
+def _process_batch(documents, text_field, id_field):
+    """Encoded result lines of a batch and how many of its documents failed"""
+    records = [_process_document(index, document, text_field, id_field) for index, document in documents]
+    lines = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+    return lines.encode('utf-8'), sum(1 for record in records if "error" in record)
+
+
+def read_jsonl(path, start=0):
+    """Yield (offset after the line, line) for each non-blank line from byte ``start``.
+
+    The file is read through a read-only memory map, so only the pages
+    being split are resident; parsing is left to the workers.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            size = len(data)
+            position = start
+            while position < size:
+                end = data.find(b'\n', position)
+                if end < 0:
+                    end = size
+                line = data[position:end]
+                position = end + 1
+                if line.strip():
+                    yield min(position, size), line
+
+
+def read_parquet(path, start=0, text_field='text', id_field='id', batch_rows=8192):
+    """Yield (rows read, document) for each row from row ``start``, a record batch at a time"""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Reading Parquet files needs pyarrow: pip install pyarrow") from None
+
+    parquet = pq.ParquetFile(path, memory_map=True)
+    columns = [name for name in (text_field, id_field) if name in parquet.schema_arrow.names]
+    if text_field not in columns:
+        raise ValueError(f"{path} has no '{text_field}' column")
+
+    row = 0
+    for batch in parquet.iter_batches(batch_size=batch_rows, columns=columns):
+        if row + batch.num_rows <= start:
+            row += batch.num_rows
+            continue
+        skip = max(0, start - row)
+        batch = batch.slice(skip)
+        row += skip
+        values = {name: batch.column(name).to_pylist() for name in columns}
+        for i in range(batch.num_rows):
+            row += 1
+            yield row, {name: values[name][i] for name in columns}
+
+
+def _batches(documents, first_index, batch_size):
+    """Group (position, document) pairs into (position after the batch, [(index, document)])"""
+    batch = []
+    index = first_index
+    position = None
+    for position, document in documents:
+        batch.append((index, document))
+        index += 1
+        if len(batch) == batch_size:
+            yield position, batch
+            batch = []
+    if batch:
+        yield position, batch
+
+
+def _read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_checkpoint(path, state):
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w') as f:
+        json.dump(state, f)
+    os.replace(temporary, path)
+
+
+def detect_format(path):
+    return 'parquet' if path.endswith(('.parquet', '.pq')) else 'jsonl'
+
+
+def run(input_path, output_path, options=None, workers=None, batch_size=256, input_format=None,
+        text_field='text', id_field='id', restart=False, report_seconds=10.0):
+    """Process every document of ``input_path`` into JSON lines at ``output_path``.
+
+    Batches of ``batch_size`` documents are spread over ``workers``
+    processes, at most two each in flight, and their results are appended
+    in input order. After each batch the input position and output size are
+    saved to ``<output_path>.checkpoint``; a later run with the same input
+    truncates the output to the saved size and carries on from there,
+    unless ``restart`` is set. The checkpoint is removed when the input is
+    done. Returns the run's counters and throughput.
+    """
+    options = options or analysis.AnalysisOptions()
+    workers = workers or os.cpu_count() or 1
+    input_format = input_format or detect_format(input_path)
+    if input_format not in FORMATS:
+        raise ValueError(f"Unknown input format '{input_format}', expected one of {FORMATS}")
+    # Fail here rather than in every worker's initializer
+    engines.get('sentiment', options.sentiment_engine)
+
+    checkpoint_path = f"{output_path}.checkpoint"
+    state = {"input": os.path.abspath(input_path), "documents": 0, "failed": 0, "position": 0, "output_bytes": 0}
+    saved = None if restart else _read_checkpoint(checkpoint_path)
+    if saved is not None and saved["input"] == state["input"] and os.path.exists(output_path):
+        state = saved
+        output = open(output_path, 'r+b')
+        # Drop anything written after the last checkpoint
+        output.truncate(state["output_bytes"])
+        output.seek(state["output_bytes"])
+        logger.info(f"Resuming after {state['documents']} documents")
+    else:
+        output = open(output_path, 'wb')
+
+    if input_format == 'jsonl':
+        documents = read_jsonl(input_path, state["position"])
+    else:
+        documents = read_parquet(input_path, state["position"], text_field, id_field)
+
+    resumed_at = state["documents"]
+    start = last_report = time.perf_counter()
+    # spawn rather than fork, as in the worker pool
+    pool = multiprocessing.get_context('spawn').Pool(workers, initializer=_initialize_worker, initargs=(options,))
+    pending = deque()
+
+    def write_oldest():
+        nonlocal last_report
+        position, count, result = pending.popleft()
+        lines, failed = result.get()
+        output.write(lines)
+        output.flush()
+        state.update(
+            documents=state["documents"] + count,
+            failed=state["failed"] + failed,
+            position=position,
+            output_bytes=output.tell()
+        )
+        _write_checkpoint(checkpoint_path, state)
+        now = time.perf_counter()
+        if now - last_report >= report_seconds:
+            done = state["documents"] - resumed_at
+            logger.info(f"{state['documents']} documents, {done / (now - start):.0f} docs/sec")
+            last_report = now
+
+    try:
+        for position, batch in _batches(documents, state["documents"], batch_size):
+            pending.append((position, len(batch), pool.apply_async(_process_batch, (batch, text_field, id_field))))
+            if len(pending) >= 2 * workers:
+                write_oldest()
+        while pending:
+            write_oldest()
+        pool.close()
+    finally:
+        # Interrupted runs stop at once: the checkpoint already covers every batch written
+        pool.terminate()
+        pool.join()
+        output.close()
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    elapsed = time.perf_counter() - start
+    processed = state["documents"] - resumed_at
+    summary = {
+        "documents": state["documents"],
+        "processed": processed,
+        "failed": state["failed"],
+        "resumed_at": resumed_at,
+        "workers": workers,
+        "elapsed_seconds": elapsed,
+        "docs_per_second": processed / elapsed if elapsed else 0.0,
+    }
+    logger.info(f"Processed {processed} documents in {elapsed:.1f}s, {summary['docs_per_second']:.0f} docs/sec "
+                f"on {workers} workers, {state['failed']} failed")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m textproc.batch',
+        description="Summarize, score sentiment and extract keywords from a JSONL or Parquet file on every core"
+    )
+    parser.add_argument('input', help="JSON lines file, or Parquet file (.parquet, needs pyarrow)")
+    parser.add_argument('output', help="Where to write one JSON result line per document")
+    parser.add_argument('--format', choices=FORMATS, help="Input format (default: from the file extension)")
+    parser.add_argument('--text-field', default='text', help="Field or column holding the text (default: text)")
+    parser.add_argument('--id-field', default='id', help="Field or column copied to each result (default: id)")
+    parser.add_argument('--features', nargs='+', choices=analysis.FEATURES, default=list(analysis.FEATURES))
+    parser.add_argument('--num-sentences', type=int, default=analysis.DEFAULT_NUM_SENTENCES)
+    parser.add_argument('--top-n', type=int, default=analysis.DEFAULT_TOP_N)
+    parser.add_argument('--sentiment-engine', default=None, help="Registered sentiment engine (default: SENTIMENT_ENGINE)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: number of CPU cores)")
+    parser.add_argument('--batch-size', type=int, default=256, help="Documents per task sent to a worker")
+    parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint of an interrupted run")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    options = analysis.AnalysisOptions(
+        features=tuple(feature for feature in analysis.FEATURES if feature in args.features),
+        num_sentences=args.num_sentences,
+        top_n=args.top_n,
+        sentiment_engine=args.sentiment_engine or os.getenv('SENTIMENT_ENGINE', 'lexicon')
+    )
+    try:
+        summary = run(
+            args.input, args.output, options,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            input_format=args.format,
+            text_field=args.text_field,
+            id_field=args.id_field,
+            restart=args.restart
+        )
+    except KeyboardInterrupt:
+        logger.warning(f"Interrupted; run the same command again to resume from {args.output}.checkpoint")
+        raise SystemExit(130)
+    print(json.dumps(summary))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from textproc.state import connection, state_path
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKENDS = ('memory', 'sqlite', 'none')
+
+
+def json_codec():
+    """(encode, decode) for results made of JSON types; tuples come back as lists"""
+    return (lambda value: json.dumps(value).encode('utf-8')), json.loads
+
+
+def protobuf_codec(message_type):
+    """(encode, decode) for results that are protobuf messages of ``message_type``"""
+    return (lambda message: message.SerializeToString()), message_type.FromString
+
+
+def cache_key(text, **options):
+    """Content hash of the text plus the processing options.
+
+    The text is hashed exactly as received: a summary can be the text
+    itself, so texts differing only in whitespace or unicode normalization
+    must not share a result.
+    """
+    digest = hashlib.sha256(text.encode('utf-8'))
+    digest.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class MemoryBackend:
+    """In-process LRU store bounded by number of entries"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, expires_at):
+        """Store an entry and return how many entries were evicted to make room"""
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SqliteBackend:
+    """LRU store in a local sqlite file, shared by every process on the host.
+
+    Values are written with ``codec``'s encoder and read back with its
+    decoder, JSON by default; nothing read from the file is unpickled.
+    """
+
+    def __init__(self, path, max_entries, codec=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.encode, self.decode = codec or json_codec()
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'key TEXT PRIMARY KEY, value BLOB, expires_at REAL, accessed_at REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)')
+
+    def _connection(self):
+        return connection(self._local, self.path)
+
+    def get(self, key):
+        with self._connection() as conn:
+            row = conn.execute('SELECT value, expires_at FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE results SET accessed_at = ? WHERE key = ?', (time.time(), key))
+        return self.decode(row[0]), row[1]
+
+    def set(self, key, value, expires_at):
+        """Store an entry and return how many entries were evicted to make room"""
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO results (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, self.encode(value), expires_at, time.time())
+            )
+            evicted = conn.execute(
+                'DELETE FROM results WHERE key IN ('
+                'SELECT key FROM results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            ).rowcount
+        return evicted
+
+    def delete(self, key):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM results WHERE key = ?', (key,))
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+
+class ResultCache:
+    """Processing results keyed by content hash, with optional TTL and counters"""
+
+    def __init__(self, backend, ttl=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return the cached value, or None on a miss or an expired entry"""
+        entry = self.backend.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            self.backend.delete(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        self.evictions += self.backend.set(key, value, expires_at)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "size": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def create_cache(service, backend=None, max_entries=None, ttl=None, path=None, codec=None):
+    """Build ``service``'s result cache from arguments or CACHE_* environment variables.
+
+    The sqlite backend defaults to a file in the service's state directory
+    and stores values with ``codec``. Returns None when caching is disabled
+    with ``CACHE_BACKEND=none``.
+    """
+    backend = backend or os.getenv('CACHE_BACKEND', 'memory')
+    max_entries = max_entries or int(os.getenv('CACHE_MAX_ENTRIES', '10000'))
+    ttl = ttl or float(os.getenv('CACHE_TTL_SECONDS', '0')) or None
+
+    if backend == 'memory':
+        store = MemoryBackend(max_entries)
+    elif backend == 'sqlite':
+        store = SqliteBackend(path or os.getenv('CACHE_PATH') or state_path(service, 'cache.db'), max_entries, codec)
+    elif backend == 'none':
+        logger.info("Result cache disabled")
+        return None
+    else:
+        raise ValueError(f"Unknown cache backend '{backend}', expected one of {CACHE_BACKENDS}")
+
+    logger.info(f"Result cache enabled: {backend} backend, {max_entries} entries, TTL {ttl or 'none'}")
+    return ResultCache(store, ttl)
@@ -0,0 +1,108 @@
+import asyncio
+from contextlib import nullcontext
+
+from textproc.admission import Rejected, Ticket
+
+
+class _Call:
+    __slots__ = ('task', 'waiters', 'ticket')
+
+    def __init__(self, ticket):
+        self.task = None
+        self.waiters = 0
+        self.ticket = ticket
+
+
+class SingleFlight:
+    """Shares one computation between concurrent requests for the same key.
+
+    The first caller for a key starts the computation as a task; callers
+    that arrive while it runs wait for the same task instead of starting
+    their own, and all of them get its result or its exception. A caller
+    that is cancelled or reaches its deadline leaves without disturbing the
+    others, and the task is cancelled once every caller has left. Nothing is
+    kept after the task finishes: repeated requests are the result cache's
+    job.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.computations = 0
+        self.coalesced = 0
+        self.abandoned = 0
+        self.expired = 0
+
+    async def run(self, key, compute, admission=None, ticket=None):
+        """Result of ``compute()``, shared with any concurrent call for ``key``.
+
+        ``ticket`` is the caller's (priority, deadline). With an
+        ``admission`` controller the computation holds one of its slots,
+        waiting with the most urgent priority of the callers that brought a
+        ticket and with no deadline of its own. Each caller stops waiting
+        at its own deadline instead, raising Rejected('expired').
+        """
+        priority, deadline = ticket if ticket is not None else (None, None)
+        loop = asyncio.get_running_loop()
+        if deadline is not None and deadline <= loop.time():
+            # Given up already: neither start nor join anything
+            self.expired += 1
+            raise Rejected('expired')
+
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = _Call(Ticket(priority) if priority is not None else None)
+            call.task = asyncio.ensure_future(self._compute(compute, admission, call))
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.computations += 1
+        else:
+            self.coalesced += 1
+            if priority is not None:
+                if call.ticket is None:
+                    call.ticket = Ticket(priority)
+                else:
+                    call.ticket.raise_to(priority)
+
+        call.waiters += 1
+        try:
+            timeout = None if deadline is None else deadline - loop.time()
+            # The shield keeps one caller's cancellation or timeout from cancelling the shared task
+            return await asyncio.wait_for(asyncio.shield(call.task), timeout)
+        except asyncio.TimeoutError:
+            if call.task.done():
+                # Finished just as the deadline passed: take that outcome
+                return call.task.result()
+            self.expired += 1
+            raise Rejected('expired') from None
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self.abandoned += 1
+                self._forget(key, call)
+                call.task.cancel()
+
+    @staticmethod
+    async def _compute(compute, admission, call):
+        # Callers that join while it waits for a slot can still raise the ticket's priority
+        ticket = call.ticket
+        async with admission.admit(ticket=ticket) if admission is not None and ticket is not None else nullcontext():
+            return await compute()
+
+    def _forget(self, key, call):
+        # A newer call may already hold the key once this one was abandoned
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    @property
+    def in_flight(self):
+        return len(self._calls)
+
+    def stats(self):
+        requests = self.computations + self.coalesced
+        return {
+            "in_flight": self.in_flight,
+            "computations": self.computations,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+            "expired": self.expired,
+            "coalescing_ratio": self.coalesced / requests if requests else 0.0,
+        }
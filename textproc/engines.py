@@ -0,0 +1,46 @@
+ENGINE_KINDS = ('summarizer', 'sentiment', 'keywords')
+
+_engines = {kind: {} for kind in ENGINE_KINDS}
+# (kind, name) of the engines whose results the chunked tier reproduces
+_chunkable = set()
+
+
+def register(kind, name, engine=None, chunkable=False):
+    """Make ``engine`` selectable as ``name`` for one kind of analysis.
+
+    Summarizers are called as ``engine(document, num_sentences)`` and
+    keyword extractors as ``engine(document, top_n)``; sentiment engines are
+    ``sentiment.SentimentEngine`` instances. Without ``engine`` this returns
+    a decorator.
+
+    Large texts are analysed in chunks that ``textproc.tiers`` scores by
+    word frequency and merges. Only summarizers and keyword extractors
+    registered as ``chunkable`` give the same answer that way; sentiment
+    engines merge their own ``polarity_parts``.
+    """
+    if kind not in _engines:
+        raise ValueError(f"Unknown engine kind '{kind}', expected one of {ENGINE_KINDS}")
+
+    def add(engine):
+        _engines[kind][name] = engine
+        if chunkable or kind == 'sentiment':
+            _chunkable.add((kind, name))
+        return engine
+
+    return add if engine is None else add(engine)
+
+
+def get(kind, name):
+    try:
+        return _engines[kind][name]
+    except KeyError:
+        raise ValueError(f"Unknown {kind} engine '{name}', expected one of {names(kind)}") from None
+
+
+def names(kind):
+    return tuple(_engines[kind])
+
+
+def chunkable(kind, name):
+    """Whether the chunked tier computes what engine ``name`` would"""
+    return (kind, name) in _chunkable
@@ -0,0 +1,323 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import NamedTuple, Optional
+
+from textproc.admission import Rejected
+from textproc.analysis import AnalysisOptions
+from textproc.state import connection, state_path
+
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+FINISHED_STATES = ('succeeded', 'failed', 'cancelled')
+UNFINISHED = "status IN ('queued', 'running')"
+
+
+class Job(NamedTuple):
+    """Status of a submitted text; ``result`` is set once it succeeded, ``error`` once it failed"""
+
+    id: str
+    status: str
+    created_at: float
+    updated_at: float
+    expires_at: Optional[float] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+
+class JobStore:
+    """Jobs, their texts and their results in a local sqlite file.
+
+    A job keeps its text until it finishes, so queued work survives a
+    restart. A finished job keeps its result for ``ttl`` seconds, then is
+    forgotten.
+
+    Unfinished jobs are leased to the process that submitted or claimed
+    them, which renews the lease while it is alive. Processes sharing the
+    file only take over jobs whose lease has not been renewed for ``lease``
+    seconds, so a restart or a crash never leaves work behind and a live
+    process never loses a job it is running.
+    """
+
+    def __init__(self, path, ttl=3600.0, lease=30.0):
+        self.path = path
+        self.ttl = ttl
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+
+    def open(self):
+        """Create the file and its table if needed; nothing touches the file before this"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), mode=0o700, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, status TEXT, text TEXT, options TEXT, result TEXT, error TEXT, '
+                'created_at REAL, updated_at REAL, expires_at REAL, owner TEXT, heartbeat_at REAL)'
+            )
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(jobs)')}
+            for column, kind in (('owner', 'TEXT'), ('heartbeat_at', 'REAL')):
+                if column not in columns:
+                    # Files written before jobs were leased
+                    conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {kind}')
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)')
+
+    def _connection(self):
+        return connection(self._local, self.path)
+
+    def create(self, text, options):
+        now = time.time()
+        job = Job(uuid.uuid4().hex, 'queued', now, now)
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, status, text, options, created_at, updated_at, owner, heartbeat_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job.id, job.status, text, json.dumps(options._asdict()), now, now, self.owner, now)
+            )
+        return job
+
+    def get(self, job_id):
+        """The job, or None when it is unknown or its result has expired"""
+        row = self._connection().execute(
+            'SELECT id, status, created_at, updated_at, expires_at, result, error FROM jobs WHERE id = ?',
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job_id, status, created_at, updated_at, expires_at, result, error = row
+        if expires_at is not None and expires_at <= time.time():
+            self.delete(job_id)
+            return None
+        return Job(job_id, status, created_at, updated_at, expires_at,
+                   json.loads(result) if result is not None else None, error)
+
+    def claim(self, job_id):
+        """Mark a queued job as running and return its (text, options), or None if it was cancelled"""
+        now = time.time()
+        with self._connection() as conn:
+            claimed = conn.execute(
+                "UPDATE jobs SET status = 'running', updated_at = ?, owner = ?, heartbeat_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (now, self.owner, now, job_id)
+            ).rowcount
+            if not claimed:
+                return None
+            text, options = conn.execute('SELECT text, options FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        options = json.loads(options)
+        options['features'] = tuple(options['features'])
+        return text, AnalysisOptions(**options)
+
+    def finish(self, job_id, status, result=None, error=None):
+        """Record the outcome of a running job and drop its text.
+
+        False if it was cancelled meanwhile, or taken over by another process
+        after this one let its lease lapse.
+        """
+        now = time.time()
+        with self._connection() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, text = NULL, updated_at = ?, expires_at = ? "
+                "WHERE id = ? AND status = 'running' AND owner = ?",
+                (status, json.dumps(result) if result is not None else None, error, now, now + self.ttl, job_id,
+                 self.owner)
+            ).rowcount == 1
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; True if it had not finished yet"""
+        now = time.time()
+        with self._connection() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = 'cancelled', text = NULL, updated_at = ?, expires_at = ? "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                (now, now + self.ttl, job_id)
+            ).rowcount == 1
+
+    def renew(self):
+        """Extend the lease on this process's unfinished jobs; returns how many it holds"""
+        with self._connection() as conn:
+            return conn.execute(
+                f'UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND {UNFINISHED}', (time.time(), self.owner)
+            ).rowcount
+
+    def adopt(self):
+        """Requeue the unfinished jobs whose lease has lapsed as this process's; their ids, oldest first"""
+        now = time.time()
+        lapsed = f'{UNFINISHED} AND (heartbeat_at IS NULL OR heartbeat_at < ?)'
+        adopted = []
+        with self._connection() as conn:
+            rows = conn.execute(f'SELECT id FROM jobs WHERE {lapsed} ORDER BY created_at', (now - self.lease,))
+            for job_id, in rows.fetchall():
+                # Checked again row by row, in case another process adopted the job meanwhile
+                if conn.execute(
+                    f"UPDATE jobs SET status = 'queued', owner = ?, heartbeat_at = ? WHERE id = ? AND {lapsed}",
+                    (self.owner, now, job_id, now - self.lease)
+                ).rowcount:
+                    adopted.append(job_id)
+        return adopted
+
+    def delete(self, job_id):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+
+    def purge(self):
+        """Forget finished jobs whose results have expired; returns how many"""
+        with self._connection() as conn:
+            return conn.execute('DELETE FROM jobs WHERE expires_at <= ?', (time.time(),)).rowcount
+
+    def counts(self):
+        rows = self._connection().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return {status: dict(rows).get(status, 0) for status in JOB_STATES}
+
+
+class JobQueue:
+    """Runs submitted texts in the background, ``concurrency`` at a time.
+
+    ``handler(text, options)`` is awaited for each job and returns a
+    JSON-serializable result. Jobs wait in submission order, and at most
+    ``max_queued`` may wait before submissions are rejected. Cancelling a
+    running job abandons its handler; work already handed to a worker
+    process still runs to completion there, but its result is discarded.
+    """
+
+    def __init__(self, store, handler, concurrency=1, max_queued=1000):
+        self.store = store
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.counters = {"submitted": 0, "succeeded": 0, "failed": 0, "cancelled": 0, "rejected": 0}
+        self._queue = None
+        self._tasks = []
+        self._running = {}
+
+    async def start(self):
+        """Open the store, start the workers and take over jobs that other processes left unfinished"""
+        self.store.open()
+        self._queue = asyncio.Queue()
+        self._adopt()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+        self._tasks.append(asyncio.create_task(self._sweep()))
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def queued(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def submit(self, text, options):
+        """Store a job and queue it; raises Rejected when the queue is full"""
+        if self._queue is None:
+            raise RuntimeError("Job queue is not started")
+        if self.queued >= self.max_queued:
+            self.counters["rejected"] += 1
+            raise Rejected('queue_full')
+        job = self.store.create(text, options)
+        self._queue.put_nowait(job.id)
+        self.counters["submitted"] += 1
+        return job
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a job that has not finished; returns its status, or None if it is unknown"""
+        if self.store.cancel(job_id):
+            self.counters["cancelled"] += 1
+            task = self._running.get(job_id)
+            if task is not None:
+                task.cancel()
+        return self.store.get(job_id)
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            claimed = self.store.claim(job_id)
+            if claimed is None:
+                continue
+
+            task = asyncio.create_task(self.handler(*claimed))
+            self._running[job_id] = task
+            try:
+                # Wait without letting the job's cancellation end this worker
+                await asyncio.wait((task,))
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+            finally:
+                del self._running[job_id]
+
+            if task.cancelled():
+                logger.info(f"Job {job_id} cancelled")
+            elif task.exception() is not None:
+                logger.error(f"Job {job_id} failed: {task.exception()}")
+                if self.store.finish(job_id, 'failed', error=f"Processing error: {task.exception()}"):
+                    self.counters["failed"] += 1
+            elif self.store.finish(job_id, 'succeeded', result=task.result()):
+                self.counters["succeeded"] += 1
+
+    def _adopt(self):
+        adopted = self.store.adopt()
+        for job_id in adopted:
+            self._queue.put_nowait(job_id)
+        if adopted:
+            logger.info(f"Resuming {len(adopted)} unfinished jobs")
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.store.lease / 3)
+            self.store.renew()
+            # Jobs of a process that stopped renewing its lease, e.g. one that crashed
+            self._adopt()
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(min(self.store.ttl, 60.0))
+            purged = self.store.purge()
+            if purged:
+                logger.info(f"Dropped {purged} expired job results")
+
+    def stats(self):
+        return {
+            "concurrency": self.concurrency,
+            "max_queued": self.max_queued,
+            "queued": self.queued,
+            "running": len(self._running),
+            "result_ttl_seconds": self.store.ttl,
+            "lease_seconds": self.store.lease,
+            **self.counters,
+        }
+
+
+def create_jobs(handler, service, path=None, concurrency=None, ttl=None):
+    """Build ``service``'s job queue from arguments or JOB_* environment variables.
+
+    The store is opened when the queue starts. Returns None when
+    ``JOB_CONCURRENCY=0`` turns the job API off.
+    """
+    concurrency = int(os.getenv('JOB_CONCURRENCY', '1')) if concurrency is None else concurrency
+    if concurrency <= 0:
+        logger.info("Job API disabled")
+        return None
+
+    store = JobStore(
+        path or os.getenv('JOB_STORE_PATH') or state_path(service, 'jobs.db', create=False),
+        ttl=ttl or float(os.getenv('JOB_RESULT_TTL_SECONDS', '3600')),
+        lease=float(os.getenv('JOB_LEASE_SECONDS', '30'))
+    )
+    queue = JobQueue(store, handler, concurrency, max_queued=int(os.getenv('JOB_MAX_QUEUED', '1000')))
+    logger.info(f"Job API enabled: {concurrency} concurrent, results kept {store.ttl:.0f}s in {store.path}")
+    return queue
@@ -0,0 +1,29 @@
+import os
+
+
+def keepalive_time_ms():
+    """Interval between keepalive pings on the serving service's channels: GRPC_KEEPALIVE_TIME_MS"""
+    return int(os.getenv('GRPC_KEEPALIVE_TIME_MS', '30000'))
+
+
+def client_options():
+    """Channel options that keep idle connections to the processing service open with pings"""
+    return [
+        ('grpc.keepalive_time_ms', keepalive_time_ms()),
+        ('grpc.keepalive_timeout_ms', int(os.getenv('GRPC_KEEPALIVE_TIMEOUT_MS', '10000'))),
+        ('grpc.keepalive_permit_without_calls', 1),
+        ('grpc.http2.max_pings_without_data', 0),
+    ]
+
+
+def server_options():
+    """Server options accepting the pings of ``client_options``.
+
+    A gRPC server otherwise refuses pings on connections without calls, or
+    more often than every five minutes, and answers them with GOAWAY
+    too_many_pings, closing the client's pooled connection.
+    """
+    return [
+        ('grpc.keepalive_permit_without_calls', 1),
+        ('grpc.http2.min_ping_interval_without_data_ms', keepalive_time_ms()),
+    ]
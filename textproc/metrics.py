@@ -0,0 +1,371 @@
+import bisect
+import hmac
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; wide enough to cover a tiny review and a chunked multi-megabyte document
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Characters; from a tweet to the maximum input size
+INPUT_SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 5000000)
+
+STAGES = ('tokenize', 'summarize', 'sentiment', 'keywords', 'serialization')
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @property
+    def count(self):
+        return sum(self._counts)
+
+    def snapshot(self):
+        """Counts of observations <= each bucket bound, plus sum and count"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+
+        cumulative = []
+        running = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            running += count
+            cumulative.append(('+Inf' if bound == float('inf') else bound, running))
+
+        return {"buckets": dict(cumulative), "sum": total, "count": running}
+
+
+class Counter:
+    """Monotonically increasing value"""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    """Value that can go up and down"""
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class MetricFamily:
+    """A named metric with one child per combination of label values"""
+
+    def __init__(self, name, help, kind, labelnames=(), factory=None, children=None):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._children = dict(children or {})
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._factory())
+        return child
+
+    def samples(self):
+        """(suffix, labels, value) for every child, in exposition order"""
+        for values, child in sorted(self._children.items()):
+            labels = dict(zip(self.labelnames, values))
+            if self.kind == 'histogram':
+                snapshot = child.snapshot()
+                for bound, count in snapshot["buckets"].items():
+                    yield '_bucket', {**labels, 'le': str(bound)}, count
+                yield '_sum', labels, snapshot["sum"]
+                yield '_count', labels, snapshot["count"]
+            else:
+                yield '', labels, child.value
+
+
+class Registry:
+    """Metric families plus collectors that read other components' stats at scrape time.
+
+    Renders everything in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._families = {}
+        self._collectors = []
+
+    def _register(self, family):
+        if family.name in self._families:
+            raise ValueError(f"Metric {family.name} already registered")
+        self._families[family.name] = family
+        return family
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(MetricFamily(name, help, 'counter', labelnames, Counter))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(MetricFamily(name, help, 'gauge', labelnames, Gauge))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS, children=None):
+        """Histogram family; ``children`` adopts existing histograms keyed by label values"""
+        return self._register(MetricFamily(
+            name, help, 'histogram', labelnames, lambda: Histogram(buckets), children
+        ))
+
+    def add_collector(self, collect):
+        """Register a callable returning ``(name, help, kind, [(labels, value), ...])`` tuples"""
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for family in self._families.values():
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for suffix, labels, value in family.samples():
+                lines.append(f"{family.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+
+        for collect in self._collectors:
+            try:
+                collected = collect()
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {str(e)}")
+                continue
+            for name, help, kind, samples in collected:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float):
+        if value == float('inf'):
+            return '+Inf'
+        return repr(value)
+    return str(value)
+
+
+# Process-wide registry exported by /metrics and the sidecar port
+REGISTRY = Registry()
+
+STAGE_LATENCY = REGISTRY.histogram(
+    'text_processing_stage_duration_seconds', 'Time spent in each analysis stage', ('stage',)
+)
+
+INPUT_CHARS = REGISTRY.histogram(
+    'text_processing_input_chars', 'Characters per text analysed', buckets=INPUT_SIZE_BUCKETS
+)
+
+_capture = threading.local()
+
+
+@contextmanager
+def stage_timer(stage):
+    """Time one analysis stage into the stage latency histogram"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def record_stage(stage, seconds):
+    records = getattr(_capture, 'records', None)
+    if records is not None:
+        records.append((stage, seconds))
+    else:
+        STAGE_LATENCY.labels(stage).observe(seconds)
+
+
+@contextmanager
+def capture_stages():
+    """Collect stage timings instead of recording them, to ship them to another process"""
+    _capture.records = records = []
+    try:
+        yield records
+    finally:
+        _capture.records = None
+
+
+def replay_stages(records):
+    """Record stage timings captured in a worker process"""
+    for stage, seconds in records:
+        STAGE_LATENCY.labels(stage).observe(seconds)
+
+
+def component_families(cache=None, worker_pool=None, admission=None, jobs=None, coalescing=None):
+    """Collector output for the result cache, worker pool, admission queue, job queue and coalescing stats"""
+    families = []
+    if cache is not None:
+        stats = cache.stats()
+        families += [
+            ('text_cache_hits_total', 'Result cache hits', 'counter', [({}, stats["hits"])]),
+            ('text_cache_misses_total', 'Result cache misses, expired entries included', 'counter',
+             [({}, stats["misses"])]),
+            ('text_cache_evictions_total', 'Results evicted to make room', 'counter', [({}, stats["evictions"])]),
+            ('text_cache_expirations_total', 'Results dropped after their TTL', 'counter',
+             [({}, stats["expirations"])]),
+            ('text_cache_entries', 'Results currently cached', 'gauge', [({}, stats["size"])]),
+        ]
+    if worker_pool is not None:
+        stats = worker_pool.stats()
+        families += [
+            ('text_worker_pool_workers', 'Worker processes or threads', 'gauge',
+             [({'mode': stats["mode"]}, stats["workers"])]),
+            ('text_worker_pool_ready', 'Whether the workers have loaded their models', 'gauge',
+             [({}, stats["ready"])]),
+            ('text_worker_pool_in_flight', 'Tasks submitted to the workers and not yet finished', 'gauge',
+             [({}, stats["in_flight"])]),
+        ]
+    if admission is not None:
+        stats = admission.stats()
+        families += [
+            ('text_admission_active', 'Requests holding a processing slot', 'gauge', [({}, stats["active"])]),
+            ('text_admission_queued', 'Requests waiting for a processing slot', 'gauge', [({}, stats["queued"])]),
+            ('text_admission_limit', 'Configured slots and queue depth', 'gauge', [
+                ({'limit': 'concurrent'}, stats["max_concurrent"]),
+                ({'limit': 'queue'}, stats["max_queue"]),
+            ]),
+            ('text_admission_admitted_total', 'Requests given a processing slot', 'counter',
+             [({}, stats["admitted"])]),
+            ('text_admission_rejected_total', 'Requests shed by admission control', 'counter', [
+                ({'reason': reason}, stats[reason]) for reason in ('queue_full', 'expired', 'shed')
+            ]),
+        ]
+    if jobs is not None:
+        stats = jobs.stats()
+        families += [
+            ('text_jobs_queued', 'Jobs waiting for a job worker', 'gauge', [({}, stats["queued"])]),
+            ('text_jobs_running', 'Jobs being processed', 'gauge', [({}, stats["running"])]),
+            ('text_jobs_total', 'Jobs submitted, rejected, and finished by outcome', 'counter', [
+                ({'event': event}, stats[event])
+                for event in ('submitted', 'succeeded', 'failed', 'cancelled', 'rejected')
+            ]),
+        ]
+    if coalescing is not None:
+        stats = coalescing.stats()
+        families += [
+            ('text_coalesced_requests_total', 'Requests answered by sharing an identical in-flight computation',
+             'counter', [({}, stats["coalesced"])]),
+            ('text_coalescing_computations_total', 'Computations started for requests that found none in flight',
+             'counter', [({}, stats["computations"])]),
+            ('text_coalescing_abandoned_total', 'Shared computations cancelled after every waiting request left',
+             'counter', [({}, stats["abandoned"])]),
+            ('text_coalescing_in_flight', 'Distinct computations currently shared', 'gauge',
+             [({}, stats["in_flight"])]),
+        ]
+    return families
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+    # path -> callable(method, query params) returning (status, content type, body)
+    routes = {}
+    # Required in the X-Admin-Token header of every call to ``routes``
+    admin_token = None
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def _dispatch(self, method):
+        path, _, query = self.path.partition('?')
+        if path == '/metrics' and method == 'GET':
+            self._send(200, CONTENT_TYPE, self.registry.render())
+            return
+        route = self.routes.get(path)
+        if route is None:
+            self.send_error(404)
+            return
+        if not hmac.compare_digest(self.headers.get('X-Admin-Token', '').encode(), self.admin_token.encode()):
+            self._send(403, 'text/plain; charset=utf-8', "Admin token required\n")
+            return
+        try:
+            status, content_type, body = route(method, dict(parse_qsl(query)))
+        except ValueError as e:
+            status, content_type, body = 400, 'text/plain; charset=utf-8', f"{str(e)}\n"
+        self._send(status, content_type, body)
+
+    def _send(self, status, content_type, body):
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are frequent; keep them out of the service log
+        pass
+
+
+def start_metrics_server(port, host='127.0.0.1', registry=REGISTRY, routes=None, admin_token=None):
+    """Serve ``registry`` on http://host:port/metrics from a background thread.
+
+    ``routes`` adds admin endpoints next to it, keyed by path, which are
+    only served with an ``admin_token`` and only to callers sending it.
+    """
+    if routes and not admin_token:
+        logger.warning(f"No admin token set, not serving {', '.join(sorted(routes))}")
+        routes = None
+    handler = type('MetricsHandler', (_MetricsHandler,), {
+        'registry': registry, 'routes': dict(routes or {}), 'admin_token': admin_token
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+    thread.start()
+    logger.info(f"Metrics available on http://{host}:{server.server_port}/metrics")
+    return server
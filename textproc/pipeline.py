@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+import re
+from collections import Counter
+
+from textproc import analysis, engines, profiling, resources, sentiment, tiers
+from textproc.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+_POSITIVE_WORDS = ('good', 'great', 'excellent', 'amazing', 'wonderful', 'fantastic', 'love', 'like', 'best', 'awesome')
+_NEGATIVE_WORDS = ('bad', 'terrible', 'awful', 'horrible', 'hate', 'worst', 'disgusting', 'annoying', 'frustrating')
+
+
+class TextProcessor:
+    """The NLP pipeline shared by both services.
+
+    Tokenizes a text once and feeds the document to the summarizer,
+    sentiment and keyword engines picked from ``textproc.engines``. Holds no
+    per-request state: one instance serves the event loop and thread
+    workers, and each worker process builds its own.
+    """
+
+    def __init__(self, sentiment_engine=None, summarizer_engine=None, keyword_engine=None):
+        self.sentiment_engine = sentiment_engine or os.getenv('SENTIMENT_ENGINE', 'lexicon')
+        self.summarizer_engine = summarizer_engine or os.getenv('SUMMARIZER_ENGINE', 'frequency')
+        self.keyword_engine = keyword_engine or os.getenv('KEYWORD_ENGINE', 'frequency')
+        # Fail at start-up rather than on the first request
+        engines.get('sentiment', self.sentiment_engine)
+        self._summarize = engines.get('summarizer', self.summarizer_engine)
+        self._keywords = engines.get('keywords', self.keyword_engine)
+        self.stop_words = resources.stop_words()
+        logger.info("TextProcessor initialized")
+
+    def default_options(self):
+        return analysis.AnalysisOptions(sentiment_engine=self.sentiment_engine)
+
+    def tokenize(self, text, options=None):
+        """Build the shared tokenized document for the requested analysis stages"""
+        if options is None:
+            return analysis.tokenize(text, self.stop_words)
+        return analysis.tokenize_for(text, self.stop_words, options)
+
+    def process(self, text, options=None):
+        """Run the requested analysis stages over one text.
+
+        Returns (summary, sentiment, keywords), with None for stages that were
+        not requested.
+        """
+        options = options or self.default_options()
+
+        # Tokenize once and feed every stage from the same document
+        with stage_timer('tokenize'):
+            document = self.tokenize(text, options)
+        summary = label = keywords = None
+        if options.wants('summary'):
+            with stage_timer('summarize'):
+                summary = self.extractive_summarization(text, options.num_sentences, document=document)
+        if options.wants('sentiment'):
+            with stage_timer('sentiment'):
+                label = self.analyze_sentiment(text, document=document, engine=options.sentiment_engine)
+        if options.wants('keywords'):
+            with stage_timer('keywords'):
+                keywords = self.extract_keywords(text, top_n=options.top_n, document=document)
+        return summary, label, keywords
+
+    def process_chunk(self, text, options):
+        """Partial results for one piece of a large text, merged by compute"""
+        with stage_timer('tokenize'):
+            document = self.tokenize(text, options)
+        return tiers.analyze_chunk(document, options)
+
+    def extractive_summarization(self, text, num_sentences=2, document=None):
+        """Extractive summary of the highest scoring sentences"""
+        try:
+            document = document or self.tokenize(text)
+            return self._summarize(document, num_sentences)
+
+        except Exception as e:
+            logger.error(f"Error in summarization: {str(e)}")
+            return text[:200] + "..." if len(text) > 200 else text
+
+    def analyze_sentiment(self, text, document=None, engine=None):
+        """Sentiment label from the chosen engine, falling back to TextBlob and then to word lists"""
+        try:
+            document = document or self.tokenize(text)
+            engine = engine or self.sentiment_engine
+            try:
+                polarity = sentiment.polarity(document, engine)
+            except Exception as e:
+                if engine == 'textblob':
+                    raise
+                logger.warning(f"{engine} sentiment engine failed, falling back to TextBlob: {str(e)}")
+                polarity = sentiment.textblob_polarity(document)
+            return sentiment.sentiment_label(polarity)
+
+        except Exception as e:
+            logger.error(f"Error in sentiment analysis: {str(e)}")
+            text_lower = text.lower()
+            positive_count = sum(1 for word in _POSITIVE_WORDS if word in text_lower)
+            negative_count = sum(1 for word in _NEGATIVE_WORDS if word in text_lower)
+            if positive_count > negative_count:
+                return "positive"
+            elif negative_count > positive_count:
+                return "negative"
+            return "neutral"
+
+    def extract_keywords(self, text, top_n=5, document=None):
+        """Most significant words of the text"""
+        try:
+            document = document or self.tokenize(text)
+            return self._keywords(document, top_n)
+
+        except Exception as e:
+            logger.error(f"Error in keyword extraction: {str(e)}")
+            words = re.findall(r'\b\w{3,}\b', text.lower())
+            word_freq = Counter(word for word in words if word not in self.stop_words)
+            return [word for word, _ in word_freq.most_common(top_n)]
+
+
+async def compute(processor, worker_pool, tier_policy, text, options):
+    """Process small texts inline, medium ones on the pool, and chunk large ones.
+
+    Returns (summary, sentiment, keywords) like ``TextProcessor.process``.
+    """
+    tier = tier_policy.tier_for(text)
+    with tier_policy.timed(tier):
+        if tier == 'inline':
+            return profiling.call_sampled(processor.process, text, options)
+        if tier == 'pool':
+            return await worker_pool.run('process', text, options)
+
+        chunks = tiers.split_chunks(text, tier_policy.chunk_chars)
+        logger.info(f"Processing {len(text)} characters as {len(chunks)} chunks")
+        results = await asyncio.gather(*(
+            worker_pool.run('process_chunk', chunk, options) for chunk in chunks
+        ))
+        summary, polarity, keywords = tiers.merge_chunks(text, results, options)
+        label = sentiment.sentiment_label(polarity) if polarity is not None else None
+        return summary, label, keywords
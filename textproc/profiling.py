@@ -0,0 +1,294 @@
+import contextvars
+import cProfile
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from textproc.state import state_dir, state_path
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ('stack', 'cprofile')
+
+# Session of the request being handled, seen by the worker pool it calls into
+_current = contextvars.ContextVar('profile_session', default=None)
+
+
+def current_session():
+    return _current.get()
+
+
+def _frame_name(code):
+    # Collapsed stacks separate frames with ';' and end with ' <count>'
+    name = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+    return name.replace(';', ':').replace(' ', '_')
+
+
+def collapse(frame):
+    """Stack of a frame, root first, in the collapsed format flamegraph.pl reads"""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """Wall-clock sampler recording the stack of one thread every ``interval`` seconds.
+
+    Samples are taken whether the thread is computing or waiting, so time
+    spent blocked shows up as well as time spent in Python code.
+    """
+
+    def __init__(self, interval, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and return the collapsed stack counts"""
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+
+class _CollectedStats:
+    """pstats input built from a profile taken in another process"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class ProfileSession:
+    """Profile of one request, including the work it hands to pool workers.
+
+    Threads profile straight into the session; worker processes profile
+    locally and send their part back with the result.
+    """
+
+    def __init__(self, name, mode='stack', interval=0.005):
+        self.name = name
+        self.mode = mode
+        self.interval = interval
+        self.stacks = Counter()
+        self.stats = None
+        self._lock = threading.Lock()
+
+    @property
+    def spec(self):
+        """What a worker process needs to profile its share of the request"""
+        return self.mode, self.interval
+
+    @contextmanager
+    def running(self):
+        """Profile the current thread for the enclosed block"""
+        if self.mode == 'cprofile':
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Newer Pythons allow a single active cProfile per interpreter
+                profile = None
+            try:
+                yield
+            finally:
+                if profile is not None:
+                    profile.disable()
+                    profile.create_stats()
+                    self.merge(('cprofile', profile.stats))
+        else:
+            sampler = StackSampler(self.interval)
+            sampler.start()
+            try:
+                yield
+            finally:
+                self.merge(('stack', sampler.stop()))
+
+    def call(self, function, *args):
+        """Run ``function`` profiled on the calling thread"""
+        with self.running():
+            return function(*args)
+
+    def export(self):
+        """The session's profile in a picklable form, for merge in another process"""
+        if self.mode == 'cprofile':
+            return 'cprofile', self.stats.stats if self.stats is not None else {}
+        return 'stack', dict(self.stacks)
+
+    def merge(self, part):
+        kind, data = part
+        with self._lock:
+            if kind == 'stack':
+                self.stacks.update(data)
+            elif data:
+                if self.stats is None:
+                    self.stats = pstats.Stats(_CollectedStats(data))
+                else:
+                    self.stats.add(_CollectedStats(data))
+
+
+def call_sampled(function, *args):
+    """Run ``function`` on this thread, sampled if the current request is profiled in stack mode.
+
+    For work done synchronously on the event loop: nothing else runs on
+    the loop meanwhile, so every sample belongs to this request.
+    """
+    session = _current.get()
+    if session is None or session.mode != 'stack':
+        return function(*args)
+    return session.call(function, *args)
+
+
+def profiled_call(spec, function, *args):
+    """Run ``function`` in a worker process under a profile; returns (result, part)"""
+    mode, interval = spec
+    session = ProfileSession('worker', mode, interval)
+    with session.running():
+        result = function(*args)
+    return result, session.export()
+
+
+class Profiler:
+    """Opt-in production profiler for a sample of requests.
+
+    Nothing is profiled until profiling is enabled (PROFILE_ENABLED or the
+    admin endpoint). Then a ``sample_rate`` fraction of requests, plus any
+    request that asks for it, is profiled either by sampling stacks every
+    ``interval`` (``stack`` mode, cheap) or with cProfile (``cprofile`` mode,
+    exact call counts but slower). Stack mode only samples the request's own
+    work on the worker pool or inline (see ``call_sampled``), never the
+    event loop as a whole, which runs other requests too; cProfile mode
+    covers the whole handler, other requests' coroutines included. Each
+    profile is written to ``directory``, by default ``profiles`` in the
+    ``service``'s state directory, which keeps the newest ``max_files``, and
+    stack samples are also summed into collapsed stacks for a flame graph.
+    """
+
+    def __init__(self, directory=None, enabled=None, sample_rate=None, mode=None, interval=None, max_files=None,
+                 service=None):
+        self.directory = directory or os.getenv('PROFILE_DIR') or (
+            state_path(service, 'profiles', create=False) if service else os.path.join(state_dir(), 'profiles')
+        )
+        self.enabled = enabled if enabled is not None else os.getenv('PROFILE_ENABLED', '0') == '1'
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+        self.mode = mode or os.getenv('PROFILE_MODE', 'stack')
+        self.interval = interval or float(os.getenv('PROFILE_INTERVAL_MS', '5')) / 1000
+        self.max_files = max_files or int(os.getenv('PROFILE_MAX_FILES', '100'))
+        if self.mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{self.mode}', expected one of {PROFILE_MODES}")
+        self.profiled = 0
+        self.aggregate = Counter()
+        self._lock = threading.Lock()
+
+    def configure(self, enabled=None, sample_rate=None, mode=None):
+        """Change settings at runtime, e.g. from an admin endpoint"""
+        if mode is not None and mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}', expected one of {PROFILE_MODES}")
+        if sample_rate is not None and not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+        if enabled is not None:
+            self.enabled = enabled
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if mode is not None:
+            self.mode = mode
+        logger.info(f"Profiling {'enabled' if self.enabled else 'disabled'}: "
+                    f"{self.mode} mode, sample rate {self.sample_rate}")
+
+    def wants(self, requested=False):
+        if not self.enabled:
+            return False
+        return requested or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    @contextmanager
+    def profile(self, name, requested=False):
+        """Profile the enclosed request handling if it is sampled or asked for"""
+        if not self.wants(requested):
+            yield None
+            return
+
+        session = ProfileSession(name, self.mode, self.interval)
+        token = _current.set(session)
+        try:
+            if session.mode == 'stack':
+                # Samples come from the work the request hands out
+                yield session
+            else:
+                with session.running():
+                    yield session
+        finally:
+            _current.reset(token)
+            self._save(session)
+
+    def _save(self, session):
+        with self._lock:
+            self.profiled += 1
+            self.aggregate.update(session.stacks)
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            path = os.path.join(self.directory, f"{time.time_ns()}-{os.getpid()}-{session.name}")
+            if session.mode == 'cprofile':
+                if session.stats is not None:
+                    session.stats.dump_stats(path + '.prof')
+            else:
+                with open(path + '.collapsed', 'w') as f:
+                    f.write(format_collapsed(session.stacks))
+            self._rotate()
+        except OSError as e:
+            logger.error(f"Could not save profile: {str(e)}")
+
+    def _rotate(self):
+        """Delete the oldest profiles beyond max_files"""
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(('.prof', '.collapsed')))
+        for name in names[:-self.max_files]:
+            os.remove(os.path.join(self.directory, name))
+
+    def collapsed(self):
+        """Stack samples of every profiled request since the last reset, for flamegraph.pl"""
+        with self._lock:
+            return format_collapsed(self.aggregate)
+
+    def reset(self):
+        with self._lock:
+            self.aggregate.clear()
+            self.profiled = 0
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "mode": self.mode,
+            "sample_rate": self.sample_rate,
+            "interval_ms": self.interval * 1000,
+            "directory": self.directory,
+            "profiled": self.profiled,
+            "distinct_stacks": len(self.aggregate),
+        }
+
+
+def format_collapsed(stacks):
+    return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def requested(value):
+    """Whether an x-profile header or metadata value asks for a profile"""
+    return value is not None and str(value).strip().lower() in ('1', 'true', 'yes', 'on')
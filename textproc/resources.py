@@ -0,0 +1,195 @@
+import argparse
+import logging
+import os
+import pickle
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+RESOURCES_PATH = os.path.join(os.path.dirname(__file__), 'data', 'resources.pickle')
+STORE_PATH = os.path.join(os.path.dirname(__file__), 'data', 'resources.store')
+FORMAT_VERSION = 1
+
+# Used when neither the bundled resources nor the NLTK stopwords corpus are available
+FALLBACK_STOP_WORDS = frozenset((
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are',
+    'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
+    'should', 'may', 'might', 'must', 'shall', 'can', 'this', 'that', 'these', 'those',
+))
+
+_PUNKT_FIELDS = ('abbrev_types', 'collocations', 'sent_starters', 'ortho_context')
+
+_lock = threading.Lock()
+_resources = None
+_sentence_tokenizer = None
+_store = None
+_store_checked = False
+
+
+def resources_path():
+    return os.getenv('TEXTPROC_RESOURCES', RESOURCES_PATH)
+
+
+def store_path():
+    return os.getenv('TEXTPROC_STORE', STORE_PATH)
+
+
+def build(path=None, language='english', store=None):
+    """Serialize the punkt parameters and stopword list from the NLTK data into one file.
+
+    Run at image build time, after the NLTK data is downloaded, so a service
+    starts from this file without the NLTK data path or network access. The
+    file only holds builtin types, so loading it imports nothing. The
+    stopwords and TextBlob's sentiment lexicon are also compiled into the
+    memory-mapped store at ``store``.
+    """
+    from nltk.corpus import stopwords
+    from textproc import sentiment, store as resource_store_format
+
+    path = path or resources_path()
+    store = store or store_path()
+    try:
+        # PunktTokenizer and the punkt_tab data need nltk 3.8.2 or later
+        from nltk.tokenize.punkt import PunktTokenizer
+        params = PunktTokenizer(language)._params
+        punkt = {field: getattr(params, field) for field in _PUNKT_FIELDS}
+        punkt['ortho_context'] = dict(punkt['ortho_context'])
+    except (ImportError, LookupError):
+        logger.warning(f"NLTK punkt_tab data for {language} not found, bundling without a sentence model")
+        punkt = None
+    resources = {
+        "version": FORMAT_VERSION,
+        "language": language,
+        "stop_words": frozenset(stopwords.words(language)),
+        "punkt": punkt,
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as f:
+        pickle.dump(resources, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+    logger.info(f"Wrote {len(resources['stop_words'])} stopwords and "
+                f"{'a' if punkt else 'no'} sentence model to {path}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(store)), exist_ok=True)
+    resource_store_format.write(store, resources['stop_words'], sentiment.pattern_entries())
+    logger.info(f"Compiled stopwords and the sentiment lexicon into {store}")
+    return resources
+
+
+def _read_bundle(path):
+    try:
+        with open(path, 'rb') as f:
+            resources = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    if resources.get("version") != FORMAT_VERSION:
+        logger.warning(f"Ignoring {path}: format version {resources.get('version')}, expected {FORMAT_VERSION}")
+        return None
+    return resources
+
+
+def _read_nltk_data(language='english'):
+    """The same resources read from the NLTK data path; never downloads"""
+    resources = {"version": FORMAT_VERSION, "language": language, "stop_words": None, "punkt": None}
+    try:
+        from nltk.corpus import stopwords
+        resources["stop_words"] = frozenset(stopwords.words(language))
+    except LookupError:
+        logger.warning("NLTK stopwords not available, using a built-in list")
+    try:
+        from nltk.tokenize.punkt import PunktTokenizer
+        params = PunktTokenizer(language)._params
+        resources["punkt"] = {field: getattr(params, field) for field in _PUNKT_FIELDS}
+    except (ImportError, LookupError):
+        logger.warning("NLTK punkt_tab data not available, splitting sentences on punctuation")
+    return resources
+
+
+def load():
+    """The process-wide resources, read once from the bundle or else from the NLTK data"""
+    global _resources
+    if _resources is None:
+        with _lock:
+            if _resources is None:
+                path = resources_path()
+                resources = _read_bundle(path)
+                if resources is None:
+                    logger.info(f"No bundled resources at {path}, reading the NLTK data")
+                    resources = _read_nltk_data()
+                _resources = resources
+    return _resources
+
+
+def resource_store():
+    """The process-wide memory-mapped store, or None when no store file was built"""
+    global _store, _store_checked
+    if not _store_checked:
+        with _lock:
+            if not _store_checked:
+                from textproc.store import ResourceStore
+
+                path = store_path()
+                try:
+                    _store = ResourceStore(path)
+                except FileNotFoundError:
+                    logger.info(f"No resource store at {path}, loading stopwords and the lexicon into memory")
+                except ValueError as e:
+                    logger.warning(f"Ignoring resource store: {e}")
+                _store_checked = True
+    return _store
+
+
+def stop_words():
+    store = resource_store()
+    if store is not None:
+        return store.stop_words
+    return load()["stop_words"] or FALLBACK_STOP_WORDS
+
+
+def sentence_tokenizer():
+    """Punkt tokenizer built from the loaded parameters, or None without a sentence model"""
+    global _sentence_tokenizer
+    if _sentence_tokenizer is None:
+        punkt = load()["punkt"]
+        if punkt is None:
+            return None
+        # Importing nltk takes most of a second, so it waits for the first text or warm-up
+        from nltk.tokenize.punkt import PunktParameters, PunktSentenceTokenizer
+
+        params = PunktParameters()
+        params.abbrev_types = set(punkt['abbrev_types'])
+        params.collocations = set(punkt['collocations'])
+        params.sent_starters = set(punkt['sent_starters'])
+        params.ortho_context = defaultdict(int, punkt['ortho_context'])
+        _sentence_tokenizer = PunktSentenceTokenizer(params)
+    return _sentence_tokenizer
+
+
+def reset():
+    """Forget the loaded resources, so the next use reads them again"""
+    global _resources, _sentence_tokenizer, _store, _store_checked
+    with _lock:
+        _resources = None
+        _sentence_tokenizer = None
+        _store = None
+        _store_checked = False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m textproc.resources',
+        description="Bundle the NLTK sentence model, stopwords and sentiment lexicon for fast start-up"
+    )
+    parser.add_argument('--output', default=None, help=f"Where to write the file (default: {RESOURCES_PATH})")
+    parser.add_argument('--store', default=None, help=f"Where to write the compiled store (default: {STORE_PATH})")
+    parser.add_argument('--language', default='english')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    build(args.output, args.language, args.store)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+import logging
+from array import array
+from typing import Callable, NamedTuple, Tuple
+
+from textproc import engines, resources
+from textproc.analysis import Document
+
+logger = logging.getLogger(__name__)
+
+NEGATIONS = frozenset(('no', 'not', "n't", 'never'))
+
+# The pattern analyzer is stateless, so one instance serves every request;
+# it is built on first use because importing TextBlob imports all of NLTK
+_pattern_analyzer = None
+
+_lexicon = None
+
+
+class Lexicon:
+    """Polarity lexicon packed into flat arrays indexed by word id.
+
+    ``index`` maps a word to its id; ``polarity`` and ``intensity`` hold the
+    pattern scores averaged over all senses, and ``modifier`` flags adverbs
+    that scale the next word ("very good"). Built from the compiled resource
+    store when there is one, so worker processes share its pages.
+    """
+
+    __slots__ = ('index', 'polarity', 'intensity', 'modifier')
+
+    def __init__(self, index, polarity, intensity, modifier):
+        self.index = index
+        self.polarity = polarity
+        self.intensity = intensity
+        self.modifier = modifier
+
+    @classmethod
+    def from_pattern(cls):
+        """Compile the lexicon TextBlob's pattern analyzer uses"""
+        index = {}
+        polarity = array('d')
+        intensity = array('d')
+        modifier = bytearray()
+        for word, p, i, is_modifier in pattern_entries():
+            index[word] = len(polarity)
+            polarity.append(p)
+            intensity.append(i)
+            modifier.append(is_modifier)
+
+        return cls(index, polarity, intensity, modifier)
+
+    @classmethod
+    def from_store(cls, store):
+        return cls(store.lexicon_index, store.polarity, store.intensity, store.modifier)
+
+
+def pattern_entries():
+    """(word, polarity, intensity, modifier) for every word of TextBlob's pattern lexicon"""
+    from textblob.en import sentiment as pattern_lexicon
+
+    # Loads the XML, including the "-ly" adverbs derived from adjectives
+    if not dict.__len__(pattern_lexicon):
+        pattern_lexicon.load()
+
+    for word, scores in dict.items(pattern_lexicon):
+        p, _, i = scores[None]
+        yield word, p, i or 1.0, 'RB' in scores
+
+
+def get_lexicon():
+    """The process-wide lexicon, mapped from the resource store or compiled on first use"""
+    global _lexicon
+    if _lexicon is None:
+        store = resources.resource_store()
+        if store is not None:
+            _lexicon = Lexicon.from_store(store)
+            logger.info(f"Sentiment lexicon mapped from {store.path} with {len(_lexicon.index)} words")
+        else:
+            _lexicon = Lexicon.from_pattern()
+            logger.info(f"Sentiment lexicon loaded with {len(_lexicon.index)} words")
+    return _lexicon
+
+
+def pattern_analyzer():
+    global _pattern_analyzer
+    if _pattern_analyzer is None:
+        from textblob.en.sentiments import PatternAnalyzer
+        _pattern_analyzer = PatternAnalyzer()
+    return _pattern_analyzer
+
+
+def _clamp(value):
+    return max(-1.0, min(value, 1.0))
+
+
+def lexicon_assessments(doc: Document):
+    """Score the document's tokens against the lexicon in a single pass.
+
+    Follows the pattern analyzer's rules: an intensifier scales the next known
+    word, a negation flips and halves it ("not good" is slightly bad), and an
+    exclamation mark boosts the previous assessment. Returns the polarity of
+    every assessed word or phrase.
+    """
+    lexicon = get_lexicon()
+    index = lexicon.index
+    polarities = lexicon.polarity
+    intensities = lexicon.intensity
+    modifiers = lexicon.modifier
+
+    scores = []
+    scales = []
+    negated = []
+    modifier = None  # preceding intensifier word
+    negation = False  # pending negation
+
+    for word in doc.tokens:
+        word_id = index.get(word)
+        if word_id is not None:
+            if modifier is None:
+                scores.append(polarities[word_id])
+                scales.append(intensities[word_id])
+                negated.append(False)
+            else:
+                # "very good": the intensifier's assessment becomes the phrase's
+                scores[-1] = _clamp(polarities[word_id] * scales[-1])
+                scales[-1] = intensities[word_id]
+            if negation:
+                scales[-1] = 1.0 / scales[-1]
+                negated[-1] = True
+
+            modifier = word if modifiers[word_id] else None
+            negation = word in NEGATIONS
+        else:
+            if word in NEGATIONS:
+                negation = True
+            elif negation and len(word.strip("'")) > 1:
+                # Keep a negation across short words ("not a good")
+                negation = False
+
+            if negation and modifier is not None and modifier.endswith('ly'):
+                # "really not good"
+                negated[-1] = True
+                negation = False
+            elif modifier is not None and len(word) > 2:
+                modifier = None
+
+            if word == '!' and scores:
+                scores[-1] = _clamp(scores[-1] * 1.25)
+
+    return [-0.5 * score if flip else score for score, flip in zip(scores, negated)]
+
+
+def lexicon_polarity(doc: Document) -> float:
+    """Mean polarity of the lexicon assessments, 0 when nothing was assessed"""
+    scores = lexicon_assessments(doc)
+    return sum(scores) / len(scores) if scores else 0.0
+
+
+def textblob_polarity(doc: Document) -> float:
+    """Polarity as scored by TextBlob's pattern analyzer on the raw text"""
+    return pattern_analyzer().analyze(doc.text).polarity
+
+
+def lexicon_polarity_parts(doc: Document):
+    scores = lexicon_assessments(doc)
+    return sum(scores), len(scores)
+
+
+def textblob_polarity_parts(doc: Document):
+    assessments = pattern_analyzer().analyze(doc.text, keep_assessments=True).assessments
+    return sum(score for _, score, _, _ in assessments), len(assessments)
+
+
+class SentimentEngine(NamedTuple):
+    """A registered sentiment engine.
+
+    ``polarity_parts`` returns the sum and count of assessment polarities so
+    chunked documents can be merged; ``needs_tokens`` is False for engines
+    that only read ``Document.text``.
+    """
+
+    polarity: Callable[[Document], float]
+    polarity_parts: Callable[[Document], Tuple[float, int]]
+    needs_tokens: bool = True
+
+
+engines.register('sentiment', 'lexicon', SentimentEngine(lexicon_polarity, lexicon_polarity_parts))
+engines.register('sentiment', 'textblob', SentimentEngine(
+    textblob_polarity, textblob_polarity_parts, needs_tokens=False
+))
+
+
+def polarity_parts(doc: Document, engine='lexicon'):
+    """Sum and count of assessment polarities, so chunked documents can be merged"""
+    return engines.get('sentiment', engine).polarity_parts(doc)
+
+
+def polarity(doc: Document, engine='lexicon') -> float:
+    """Document polarity in [-1, 1] using the chosen engine"""
+    return engines.get('sentiment', engine).polarity(doc)
+
+
+def sentiment_label(polarity: float) -> str:
+    """Map a polarity score to positive/negative/neutral"""
+    if polarity > 0.1:
+        return "positive"
+    elif polarity < -0.1:
+        return "negative"
+    else:
+        return "neutral"
+
+
+def warm_up(engine=None):
+    """Load the lexicon, and TextBlob's analyzer when it is the default engine, before the first request"""
+    get_lexicon()
+    # TextBlob keeps its own copy of the lexicon, so it is only loaded up front when it will be used
+    if engine == 'textblob':
+        pattern_analyzer().analyze("Loaded.")
@@ -0,0 +1,31 @@
+import os
+import sqlite3
+
+
+def state_dir():
+    """Where the services keep their sqlite files: TEXTPROC_STATE_DIR, else the user's XDG state directory"""
+    base = os.getenv('XDG_STATE_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'state')
+    return os.getenv('TEXTPROC_STATE_DIR') or os.path.join(base, 'textproc')
+
+
+def state_path(service, filename, create=True):
+    """Path of a service's ``filename``, in a directory only the current user can write to.
+
+    The directory is made now unless ``create`` is false, for callers that
+    open the file later.
+    """
+    directory = os.path.join(state_dir(), service)
+    if create:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    return os.path.join(directory, filename)
+
+
+def connection(local, path):
+    """This thread's connection to the sqlite file at ``path``, kept on the ``local`` thread-local"""
+    # sqlite connections must not be shared between threads
+    conn = getattr(local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=5.0)
+        conn.execute('PRAGMA journal_mode=WAL')
+        local.conn = conn
+    return conn
@@ -0,0 +1,185 @@
+import functools
+import mmap
+import os
+import struct
+import zlib
+from array import array
+
+MAGIC = b'TPRS'
+VERSION = 1
+
+# magic, version, vocabulary size, lexicon words, hash table slots
+_HEADER = struct.Struct('<4sIIII')
+_ALIGN = 8
+
+STOP_WORD = 1
+
+
+def _slots_for(count):
+    """Power of two at least twice ``count``, so probe sequences stay short"""
+    slots = 1
+    while slots < 2 * count:
+        slots *= 2
+    return slots
+
+
+def _padding(length):
+    return b'\0' * (-length % _ALIGN)
+
+
+def write(path, stop_words, lexicon_entries):
+    """Compile stopwords and lexicon entries into a store file at ``path``.
+
+    ``lexicon_entries`` yields ``(word, polarity, intensity, modifier)``.
+    Lexicon words get the ids ``0..L-1`` so their scores index packed arrays
+    directly; stopwords that are not in the lexicon follow them.
+    """
+    entries = sorted(lexicon_entries)
+    vocabulary = [word for word, _, _, _ in entries]
+    known = set(vocabulary)
+    vocabulary.extend(sorted(set(stop_words) - known))
+    stop_words = set(stop_words)
+
+    encoded = [word.encode('utf-8') for word in vocabulary]
+    slots = _slots_for(len(encoded))
+    table = array('i', [-1]) * slots
+    for word_id, key in enumerate(encoded):
+        slot = zlib.crc32(key) & (slots - 1)
+        while table[slot] != -1:
+            slot = (slot + 1) & (slots - 1)
+        table[slot] = word_id
+
+    offsets = array('I', [0])
+    for key in encoded:
+        offsets.append(offsets[-1] + len(key))
+
+    sections = [
+        table.tobytes(),
+        offsets.tobytes(),
+        array('d', (polarity for _, polarity, _, _ in entries)).tobytes(),
+        array('d', (intensity for _, _, intensity, _ in entries)).tobytes(),
+        bytes(bool(modifier) for _, _, _, modifier in entries),
+        bytes(STOP_WORD if word in stop_words else 0 for word in vocabulary),
+        b''.join(encoded),
+    ]
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(vocabulary), len(entries), slots))
+        f.write(_padding(_HEADER.size))
+        for section in sections:
+            f.write(section)
+            f.write(_padding(len(section)))
+    os.replace(temporary, path)
+
+
+class StopWords:
+    """Set-like view of the store's stopwords for ``token in stop_words`` checks"""
+
+    __slots__ = ('_store', '_contains')
+
+    def __init__(self, store, cache_size):
+        self._store = store
+        self._contains = functools.lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _lookup(self, word):
+        word_id = self._store.id_of(word)
+        return word_id is not None and self._store.flags[word_id] & STOP_WORD != 0
+
+    def __contains__(self, word):
+        return self._contains(word)
+
+    def __iter__(self):
+        store = self._store
+        return (store.word(word_id) for word_id in range(len(store)) if store.flags[word_id] & STOP_WORD)
+
+    def __len__(self):
+        return sum(1 for flag in self._store.flags if flag & STOP_WORD)
+
+
+class LexiconIndex:
+    """Maps a word to its lexicon id like the ``dict`` it replaces, through ``get(word)``"""
+
+    __slots__ = ('_store', 'get')
+
+    def __init__(self, store, cache_size):
+        self._store = store
+        # An instance attribute, so each token costs one C-level cache hit
+        self.get = functools.lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _lookup(self, word):
+        word_id = self._store.id_of(word)
+        return word_id if word_id is not None and word_id < self._store.lexicon_words else None
+
+    def __len__(self):
+        return self._store.lexicon_words
+
+
+class ResourceStore:
+    """Stopwords and the sentiment lexicon compiled into one memory-mapped file.
+
+    The vocabulary is interned as UTF-8 strings addressed by integer id, an
+    open-addressing table keyed on the CRC-32 of a word finds its id, and the
+    lexicon scores are packed arrays indexed by id. Everything is read in
+    place from a shared read-only mapping, so every worker process on a host
+    uses the same physical pages. Recently looked up words are memoized per
+    process in a small bounded cache.
+    """
+
+    def __init__(self, path, cache_size=4096):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        magic, version, words, lexicon_words, slots = _HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} resource store")
+        self.words = words
+        self.lexicon_words = lexicon_words
+        self._mask = slots - 1
+
+        position = _HEADER.size + len(_padding(_HEADER.size))
+
+        def section(length, fmt):
+            nonlocal position
+            start = position
+            position += length + len(_padding(length))
+            return view[start:start + length].cast(fmt)
+
+        self._table = section(4 * slots, 'i')
+        self._offsets = section(4 * (words + 1), 'I')
+        self.polarity = section(8 * lexicon_words, 'd')
+        self.intensity = section(8 * lexicon_words, 'd')
+        self.modifier = section(lexicon_words, 'B')
+        self.flags = section(words, 'B')
+        self._strings = section(self._offsets[words], 'B')
+
+        self.stop_words = StopWords(self, cache_size)
+        self.lexicon_index = LexiconIndex(self, cache_size)
+
+    def id_of(self, word):
+        """Id of ``word`` in the vocabulary, or None"""
+        key = word.encode('utf-8')
+        slot = zlib.crc32(key) & self._mask
+        while True:
+            word_id = self._table[slot]
+            if word_id < 0:
+                return None
+            if self._strings[self._offsets[word_id]:self._offsets[word_id + 1]] == key:
+                return word_id
+            slot = (slot + 1) & self._mask
+
+    def word(self, word_id):
+        return bytes(self._strings[self._offsets[word_id]:self._offsets[word_id + 1]]).decode('utf-8')
+
+    def __len__(self):
+        return self.words
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "words": self.words,
+            "lexicon_words": self.lexicon_words,
+            "bytes": len(self._mmap),
+        }
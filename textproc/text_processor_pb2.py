@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: textproc/text_processor.proto
+# Protobuf Python Version: 4.25.0
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x1dtextproc/text_processor.proto\x12\x0etext_processor\"t\n\x12ProcessTextRequest\x12\x0c\n\x04text\x18\x01 \x01(\t\x12\x18\n\x10sentiment_engine\x18\x02 \x01(\t\x12\x10\n\x08\x66\x65\x61tures\x18\x03 \x03(\t\x12\x15\n\rnum_sentences\x18\x04 \x01(\x05\x12\r\n\x05top_n\x18\x05 \x01(\x05\"~\n\x13ProcessTextResponse\x12\x0f\n\x07summary\x18\x01 \x01(\t\x12\x11\n\tsentiment\x18\x02 \x01(\t\x12\x10\n\x08keywords\x18\x03 \x03(\t\x12\x17\n\x0foriginal_length\x18\x04 \x01(\x05\x12\x18\n\x10processed_length\x18\x05 \x01(\x05\"O\n\x17ProcessTextBatchRequest\x12\x34\n\x08requests\x18\x01 \x03(\x0b\x32\".text_processor.ProcessTextRequest\"n\n\x16ProcessTextBatchResult\x12\x0c\n\x04\x63ode\x18\x01 \x01(\x05\x12\x0f\n\x07\x64\x65tails\x18\x02 \x01(\t\x12\x35\n\x08response\x18\x03 \x01(\x0b\x32#.text_processor.ProcessTextResponse\"S\n\x18ProcessTextBatchResponse\x12\x37\n\x07results\x18\x01 \x03(\x0b\x32&.text_processor.ProcessTextBatchResult\"\x86\x01\n\x18ProcessTextStreamRequest\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0c\n\x04text\x18\x02 \x01(\t\x12\x18\n\x10sentiment_engine\x18\x03 \x01(\t\x12\x10\n\x08\x66\x65\x61tures\x18\x04 \x03(\t\x12\x15\n\rnum_sentences\x18\x05 \x01(\x05\x12\r\n\x05top_n\x18\x06 \x01(\x05\"_\n\x19ProcessTextStreamResponse\x12\n\n\x02id\x18\x01 \x01(\t\x12\x36\n\x06result\x18\x02 \x01(\x0b\x32&.text_processor.ProcessTextBatchResult\"=\n\x14GetAggregatesRequest\x12\r\n\x05top_k\x18\x01 \x01(\x05\x12\x16\n\x0ewindow_seconds\x18\x02 \x01(\x01\".\n\x0cKeywordCount\x12\x0f\n\x07keyword\x18\x01 \x01(\t\x12\r\n\x05\x63ount\x18\x02 \x01(\x03\"\xed\x01\n\x15GetAggregatesResponse\x12\x16\n\x0ewindow_seconds\x18\x01 \x01(\x01\x12\x11\n\tdocuments\x18\x02 \x01(\x03\x12G\n\tsentiment\x18\x03 \x03(\x0b\x32\x34.text_processor.GetAggregatesResponse.SentimentEntry\x12.\n\x08keywords\x18\x04 \x03(\x0b\x32\x1c.text_processor.KeywordCount\x1a\x30\n\x0eSentimentEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x03:\x02\x38\x01\"\x18\n\nJobRequest\x12\n\n\x02id\x18\x01 \x01(\t\"\xa3\x01\n\x03Job\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0e\n\x06status\x18\x02 \x01(\t\x12\x12\n\ncreated_at\x18\x03 \x01(\x01\x12\x12\n\nupdated_at\x18\x04 \x01(\x01\x12\x12\n\nexpires_at\x18\x05 \x01(\x01\x12\x35\n\x08response\x18\x06 \x01(\x0b\x32#.text_processor.ProcessTextResponse\x12\r\n\x05\x65rror\x18\x07 \x01(\t2\xd9\x04\n\rTextProcessor\x12V\n\x0bProcessText\x12\".text_processor.ProcessTextRequest\x1a#.text_processor.ProcessTextResponse\x12\x65\n\x10ProcessTextBatch\x12\'.text_processor.ProcessTextBatchRequest\x1a(.text_processor.ProcessTextBatchResponse\x12l\n\x11ProcessTextStream\x12(.text_processor.ProcessTextStreamRequest\x1a).text_processor.ProcessTextStreamResponse(\x01\x30\x01\x12\\\n\rGetAggregates\x12$.text_processor.GetAggregatesRequest\x1a%.text_processor.GetAggregatesResponse\x12\x44\n\tSubmitJob\x12\".text_processor.ProcessTextRequest\x1a\x13.text_processor.Job\x12\x39\n\x06GetJob\x12\x1a.text_processor.JobRequest\x1a\x13.text_processor.Job\x12<\n\tCancelJob\x12\x1a.text_processor.JobRequest\x1a\x13.text_processor.Jobb\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'textproc.text_processor_pb2', _globals)
+if _descriptor._USE_C_DESCRIPTORS == False:
+  DESCRIPTOR._options = None
+  _globals['_GETAGGREGATESRESPONSE_SENTIMENTENTRY']._options = None
+  _globals['_GETAGGREGATESRESPONSE_SENTIMENTENTRY']._serialized_options = b'8\001'
+  _globals['_PROCESSTEXTREQUEST']._serialized_start=49
+  _globals['_PROCESSTEXTREQUEST']._serialized_end=165
+  _globals['_PROCESSTEXTRESPONSE']._serialized_start=167
+  _globals['_PROCESSTEXTRESPONSE']._serialized_end=293
+  _globals['_PROCESSTEXTBATCHREQUEST']._serialized_start=295
+  _globals['_PROCESSTEXTBATCHREQUEST']._serialized_end=374
+  _globals['_PROCESSTEXTBATCHRESULT']._serialized_start=376
+  _globals['_PROCESSTEXTBATCHRESULT']._serialized_end=486
+  _globals['_PROCESSTEXTBATCHRESPONSE']._serialized_start=488
+  _globals['_PROCESSTEXTBATCHRESPONSE']._serialized_end=571
+  _globals['_PROCESSTEXTSTREAMREQUEST']._serialized_start=574
+  _globals['_PROCESSTEXTSTREAMREQUEST']._serialized_end=708
+  _globals['_PROCESSTEXTSTREAMRESPONSE']._serialized_start=710
+  _globals['_PROCESSTEXTSTREAMRESPONSE']._serialized_end=805
+  _globals['_GETAGGREGATESREQUEST']._serialized_start=807
+  _globals['_GETAGGREGATESREQUEST']._serialized_end=868
+  _globals['_KEYWORDCOUNT']._serialized_start=870
+  _globals['_KEYWORDCOUNT']._serialized_end=916
+  _globals['_GETAGGREGATESRESPONSE']._serialized_start=919
+  _globals['_GETAGGREGATESRESPONSE']._serialized_end=1156
+  _globals['_GETAGGREGATESRESPONSE_SENTIMENTENTRY']._serialized_start=1108
+  _globals['_GETAGGREGATESRESPONSE_SENTIMENTENTRY']._serialized_end=1156
+  _globals['_JOBREQUEST']._serialized_start=1158
+  _globals['_JOBREQUEST']._serialized_end=1182
+  _globals['_JOB']._serialized_start=1185
+  _globals['_JOB']._serialized_end=1348
+  _globals['_TEXTPROCESSOR']._serialized_start=1351
+  _globals['_TEXTPROCESSOR']._serialized_end=1952
+# @@protoc_insertion_point(module_scope)
@@ -0,0 +1,265 @@
+# Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
+"""Client and server classes corresponding to protobuf-defined services."""
+import grpc
+
+from textproc import text_processor_pb2 as textproc_dot_text__processor__pb2
+
+
+class TextProcessorStub(object):
+    """Missing associated documentation comment in .proto file."""
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.ProcessText = channel.unary_unary(
+                '/text_processor.TextProcessor/ProcessText',
+                request_serializer=textproc_dot_text__processor__pb2.ProcessTextRequest.SerializeToString,
+                response_deserializer=textproc_dot_text__processor__pb2.ProcessTextResponse.FromString,
+                )
+        self.ProcessTextBatch = channel.unary_unary(
+                '/text_processor.TextProcessor/ProcessTextBatch',
+                request_serializer=textproc_dot_text__processor__pb2.ProcessTextBatchRequest.SerializeToString,
+                response_deserializer=textproc_dot_text__processor__pb2.ProcessTextBatchResponse.FromString,
+                )
+        self.ProcessTextStream = channel.stream_stream(
+                '/text_processor.TextProcessor/ProcessTextStream',
+                request_serializer=textproc_dot_text__processor__pb2.ProcessTextStreamRequest.SerializeToString,
+                response_deserializer=textproc_dot_text__processor__pb2.ProcessTextStreamResponse.FromString,
+                )
+        self.GetAggregates = channel.unary_unary(
+                '/text_processor.TextProcessor/GetAggregates',
+                request_serializer=textproc_dot_text__processor__pb2.GetAggregatesRequest.SerializeToString,
+                response_deserializer=textproc_dot_text__processor__pb2.GetAggregatesResponse.FromString,
+                )
+        self.SubmitJob = channel.unary_unary(
+                '/text_processor.TextProcessor/SubmitJob',
+                request_serializer=textproc_dot_text__processor__pb2.ProcessTextRequest.SerializeToString,
+                response_deserializer=textproc_dot_text__processor__pb2.Job.FromString,
+                )
+        self.GetJob = channel.unary_unary(
+                '/text_processor.TextProcessor/GetJob',
+                request_serializer=textproc_dot_text__processor__pb2.JobRequest.SerializeToString,
+                response_deserializer=textproc_dot_text__processor__pb2.Job.FromString,
+                )
+        self.CancelJob = channel.unary_unary(
+                '/text_processor.TextProcessor/CancelJob',
+                request_serializer=textproc_dot_text__processor__pb2.JobRequest.SerializeToString,
+                response_deserializer=textproc_dot_text__processor__pb2.Job.FromString,
+                )
+
+
+class TextProcessorServicer(object):
+    """Missing associated documentation comment in .proto file."""
+
+    def ProcessText(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ProcessTextBatch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ProcessTextStream(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetAggregates(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SubmitJob(self, request, context):
+        """Queue a text to be processed in the background and return straight away
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetJob(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CancelJob(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_TextProcessorServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'ProcessText': grpc.unary_unary_rpc_method_handler(
+                    servicer.ProcessText,
+                    request_deserializer=textproc_dot_text__processor__pb2.ProcessTextRequest.FromString,
+                    response_serializer=textproc_dot_text__processor__pb2.ProcessTextResponse.SerializeToString,
+            ),
+            'ProcessTextBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.ProcessTextBatch,
+                    request_deserializer=textproc_dot_text__processor__pb2.ProcessTextBatchRequest.FromString,
+                    response_serializer=textproc_dot_text__processor__pb2.ProcessTextBatchResponse.SerializeToString,
+            ),
+            'ProcessTextStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.ProcessTextStream,
+                    request_deserializer=textproc_dot_text__processor__pb2.ProcessTextStreamRequest.FromString,
+                    response_serializer=textproc_dot_text__processor__pb2.ProcessTextStreamResponse.SerializeToString,
+            ),
+            'GetAggregates': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetAggregates,
+                    request_deserializer=textproc_dot_text__processor__pb2.GetAggregatesRequest.FromString,
+                    response_serializer=textproc_dot_text__processor__pb2.GetAggregatesResponse.SerializeToString,
+            ),
+            'SubmitJob': grpc.unary_unary_rpc_method_handler(
+                    servicer.SubmitJob,
+                    request_deserializer=textproc_dot_text__processor__pb2.ProcessTextRequest.FromString,
+                    response_serializer=textproc_dot_text__processor__pb2.Job.SerializeToString,
+            ),
+            'GetJob': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetJob,
+                    request_deserializer=textproc_dot_text__processor__pb2.JobRequest.FromString,
+                    response_serializer=textproc_dot_text__processor__pb2.Job.SerializeToString,
+            ),
+            'CancelJob': grpc.unary_unary_rpc_method_handler(
+                    servicer.CancelJob,
+                    request_deserializer=textproc_dot_text__processor__pb2.JobRequest.FromString,
+                    response_serializer=textproc_dot_text__processor__pb2.Job.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'text_processor.TextProcessor', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+
+
+ # This class is part of an EXPERIMENTAL API.
+class TextProcessor(object):
+    """Missing associated documentation comment in .proto file."""
+
+    @staticmethod
+    def ProcessText(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/text_processor.TextProcessor/ProcessText',
+            textproc_dot_text__processor__pb2.ProcessTextRequest.SerializeToString,
+            textproc_dot_text__processor__pb2.ProcessTextResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def ProcessTextBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/text_processor.TextProcessor/ProcessTextBatch',
+            textproc_dot_text__processor__pb2.ProcessTextBatchRequest.SerializeToString,
+            textproc_dot_text__processor__pb2.ProcessTextBatchResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def ProcessTextStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(request_iterator, target, '/text_processor.TextProcessor/ProcessTextStream',
+            textproc_dot_text__processor__pb2.ProcessTextStreamRequest.SerializeToString,
+            textproc_dot_text__processor__pb2.ProcessTextStreamResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def GetAggregates(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/text_processor.TextProcessor/GetAggregates',
+            textproc_dot_text__processor__pb2.GetAggregatesRequest.SerializeToString,
+            textproc_dot_text__processor__pb2.GetAggregatesResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def SubmitJob(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/text_processor.TextProcessor/SubmitJob',
+            textproc_dot_text__processor__pb2.ProcessTextRequest.SerializeToString,
+            textproc_dot_text__processor__pb2.Job.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def GetJob(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/text_processor.TextProcessor/GetJob',
+            textproc_dot_text__processor__pb2.JobRequest.SerializeToString,
+            textproc_dot_text__processor__pb2.Job.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def CancelJob(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/text_processor.TextProcessor/CancelJob',
+            textproc_dot_text__processor__pb2.JobRequest.SerializeToString,
+            textproc_dot_text__processor__pb2.Job.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
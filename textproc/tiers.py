@@ -0,0 +1,196 @@
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from textproc import engines, sentiment, summarizer
+from textproc.analysis import AnalysisOptions, Document
+from textproc.metrics import REGISTRY, Histogram, stage_timer
+
+TIERS = ('inline', 'pool', 'chunked')
+
+# Places a chunk may end without cutting a sentence, best first
+_CHUNK_BOUNDARIES = ('\n\n', '\n', '. ', '! ', '? ', ' ')
+
+# Summary candidates kept per chunk, as a multiple of the requested sentences
+_CANDIDATES_PER_SENTENCE = 5
+
+# Engine kinds the chunked tier reimplements: (kind, TextProcessor attribute, setting)
+_CHUNKED_ENGINES = (
+    ('summarizer', 'summarizer_engine', 'SUMMARIZER_ENGINE'),
+    ('keywords', 'keyword_engine', 'KEYWORD_ENGINE'),
+)
+
+
+class TierPolicy:
+    """Routes texts to a processing tier by size and records per-tier latency.
+
+    Texts up to ``inline_max_chars`` are processed on the event loop, where the
+    worker hand-off would cost more than the work; texts from
+    ``chunk_min_chars`` are split into ``chunk_chars`` pieces processed in
+    parallel and merged; everything in between goes to the worker pool.
+    Texts over ``max_chars`` are rejected.
+    """
+
+    def __init__(self, inline_max_chars=None, chunk_min_chars=None, chunk_chars=None, max_chars=None):
+        # 0 is a valid threshold, e.g. TIER_INLINE_MAX_CHARS=0 sends every text to the pool
+        self.inline_max_chars = (inline_max_chars if inline_max_chars is not None
+                                 else int(os.getenv('TIER_INLINE_MAX_CHARS', '2000')))
+        self.chunk_min_chars = (chunk_min_chars if chunk_min_chars is not None
+                                else int(os.getenv('TIER_CHUNK_MIN_CHARS', '200000')))
+        self.chunk_chars = chunk_chars if chunk_chars is not None else int(os.getenv('TIER_CHUNK_CHARS', '50000'))
+        self.max_chars = max_chars if max_chars is not None else int(os.getenv('MAX_TEXT_CHARS', '5000000'))
+        if self.chunk_chars <= 0:
+            raise ValueError("chunk_chars must be positive")
+        self.latency = {tier: Histogram() for tier in TIERS}
+
+    def tier_for(self, text):
+        if len(text) <= self.inline_max_chars:
+            return 'inline'
+        if len(text) < self.chunk_min_chars:
+            return 'pool'
+        return 'chunked'
+
+    def too_large(self, text):
+        return len(text) > self.max_chars
+
+    def check_engines(self, processor):
+        """Refuse engines the chunked tier would silently replace with word frequencies"""
+        if self.chunk_min_chars > self.max_chars:
+            return
+        for kind, attribute, setting in _CHUNKED_ENGINES:
+            name = getattr(processor, attribute)
+            if not engines.chunkable(kind, name):
+                raise ValueError(
+                    f"{setting} '{name}' can't be merged across chunks; "
+                    f"set TIER_CHUNK_MIN_CHARS above MAX_TEXT_CHARS to turn chunking off"
+                )
+
+    @contextmanager
+    def timed(self, tier):
+        """Record the wall time of the enclosed block under the given tier"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.latency[tier].observe(time.perf_counter() - start)
+
+    def register_metrics(self, registry=REGISTRY):
+        """Export the per-tier latency histograms"""
+        registry.histogram(
+            'text_processing_tier_duration_seconds', 'Time to analyse one text, by size tier', ('tier',),
+            children={(tier,): histogram for tier, histogram in self.latency.items()}
+        )
+
+    def stats(self):
+        return {
+            "thresholds": {
+                "inline_max_chars": self.inline_max_chars,
+                "chunk_min_chars": self.chunk_min_chars,
+                "chunk_chars": self.chunk_chars,
+                "max_chars": self.max_chars,
+            },
+            "latency_seconds": {tier: histogram.snapshot() for tier, histogram in self.latency.items()},
+        }
+
+
+def split_chunks(text, chunk_chars):
+    """Split text into pieces of at most chunk_chars, preferring sentence boundaries"""
+    chunks = []
+    start = 0
+    while len(text) - start > chunk_chars:
+        end = start + chunk_chars
+        cut = -1
+        for boundary in _CHUNK_BOUNDARIES:
+            position = text.rfind(boundary, start, end)
+            if position > start:
+                cut = position + len(boundary)
+                break
+        if cut <= start:
+            cut = end
+        chunks.append(text[start:cut])
+        start = cut
+    chunks.append(text[start:])
+    return chunks
+
+
+class ChunkResult:
+    """What one chunk contributes to the merged result; cheap to pickle"""
+
+    __slots__ = ('word_counts', 'candidates', 'sentence_count', 'sentiment_total', 'sentiment_count')
+
+    def __init__(self, word_counts, candidates, sentence_count, sentiment_total, sentiment_count):
+        self.word_counts = word_counts
+        self.candidates = candidates
+        self.sentence_count = sentence_count
+        self.sentiment_total = sentiment_total
+        self.sentiment_count = sentiment_count
+
+
+def analyze_chunk(doc: Document, options: AnalysisOptions) -> ChunkResult:
+    """Content word counts, best local summary candidates and sentiment parts of a chunk.
+
+    Parts the requested analyses do not need are left empty.
+    """
+    word_counts = {}
+    if options.wants('summary') or options.wants('keywords'):
+        with stage_timer('keywords'):
+            word_counts = dict(Counter(doc.content_words()))
+
+    # Keep several local candidates: global frequencies can reorder them
+    candidates = []
+    if options.wants('summary'):
+        with stage_timer('summarize'):
+            scores = summarizer.sentence_scores(doc)
+            for index in summarizer.top_sentences(scores, options.num_sentences * _CANDIDATES_PER_SENTENCE):
+                start, end = doc.sentence_spans[index]
+                words = tuple(
+                    doc.tokens[i] for i in range(start, end)
+                    if doc.word_mask[i] and not doc.stop_mask[i]
+                )
+                candidates.append((int(index), doc.sentences[index], words))
+
+    sentiment_total, sentiment_count = 0.0, 0
+    if options.wants('sentiment'):
+        with stage_timer('sentiment'):
+            sentiment_total, sentiment_count = sentiment.polarity_parts(doc, options.sentiment_engine)
+
+    return ChunkResult(word_counts, candidates, len(doc.sentences), sentiment_total, sentiment_count)
+
+
+def merge_chunks(text, chunks, options: AnalysisOptions):
+    """Combine chunk results into (summary, polarity, keywords) for the whole text.
+
+    Keyword counts are summed, and summary candidates from every chunk are
+    re-scored against the combined word frequencies before picking the best.
+    Analyses that were not requested come back as None.
+    """
+    num_sentences = options.num_sentences
+    word_freq = Counter()
+    for chunk in chunks:
+        word_freq.update(chunk.word_counts)
+
+    summary = None
+    if options.wants('summary'):
+        if sum(chunk.sentence_count for chunk in chunks) <= num_sentences:
+            summary = text
+        else:
+            scored = []
+            for chunk_index, chunk in enumerate(chunks):
+                for sentence_index, sentence, words in chunk.candidates:
+                    score = sum(word_freq[word] for word in words) / len(words)
+                    scored.append((score, chunk_index, sentence_index, sentence))
+            best = sorted(scored, key=lambda c: (-c[0], c[1], c[2]))[:num_sentences]
+            summary = ' '.join(sentence for _, _, _, sentence in sorted(best, key=lambda c: (c[1], c[2])))
+
+    polarity = None
+    if options.wants('sentiment'):
+        sentiment_count = sum(chunk.sentiment_count for chunk in chunks)
+        polarity = sum(chunk.sentiment_total for chunk in chunks) / sentiment_count if sentiment_count else 0.0
+
+    keywords = None
+    if options.wants('keywords'):
+        keyword_freq = Counter({word: count for word, count in word_freq.items() if len(word) >= 3})
+        keywords = [word for word, _ in keyword_freq.most_common(options.top_n)]
+
+    return summary, polarity, keywords
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent import futures
+
+from textproc import analysis, metrics, profiling, sentiment, summarizer
+
+logger = logging.getLogger(__name__)
+
+WORKER_MODES = ('process', 'thread', 'inline')
+
+# Processor instance owned by a worker process, built once by the initializer
+_worker_processor = None
+
+
+def _warm_models(sentiment_engine=None):
+    """Import NLTK and scipy and load punkt, stopwords and the sentiment lexicon"""
+    analysis.warm_up()
+    sentiment.warm_up(sentiment_engine)
+    summarizer.warm_up()
+
+
+def _initialize_worker(processor_class):
+    """Build the worker's processor and load its models once"""
+    global _worker_processor
+    _worker_processor = processor_class()
+    _warm_models(_worker_processor.sentiment_engine)
+
+
+def _call_in_worker(method, profile, *args):
+    # Stage timings and profiles would stay in this process; send them back instead
+    function = getattr(_worker_processor, method)
+    part = None
+    with metrics.capture_stages() as stages:
+        if profile is None:
+            result = function(*args)
+        else:
+            result, part = profiling.profiled_call(profile, function, *args)
+    return result, stages, part
+
+
+def _worker_pid(hold=0.0):
+    # Holding a warm worker briefly leaves the other calls to workers still starting
+    time.sleep(hold)
+    return os.getpid()
+
+
+class WorkerPool:
+    """Runs CPU-bound processor methods off the asyncio event loop.
+
+    ``process`` mode keeps a pool of pre-warmed worker processes, each holding
+    its own instance of the processor's class; ``thread`` mode shares the given
+    processor between threads (NLTK releases little of the GIL, so this mostly
+    helps keep the loop responsive); ``inline`` runs on the event loop itself.
+    """
+
+    def __init__(self, processor, mode='process', max_workers=None):
+        if mode not in WORKER_MODES:
+            raise ValueError(f"Unknown worker mode '{mode}', expected one of {WORKER_MODES}")
+
+        self.processor = processor
+        self.mode = mode
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # Set once warm_up has loaded the models everywhere
+        self.ready = False
+        self.in_flight = 0
+
+        if mode == 'process':
+            # spawn rather than fork: forking a process that already runs gRPC
+            # or uvicorn threads is unsafe
+            self.executor = futures.ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_initialize_worker,
+                initargs=(type(processor),)
+            )
+        elif mode == 'thread':
+            self.executor = futures.ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='nlp-worker'
+            )
+        else:
+            self.executor = None
+
+    async def run(self, method, *args):
+        """Call ``processor.<method>(*args)`` on a worker and await the result"""
+        if self.executor is None:
+            return profiling.call_sampled(getattr(self.processor, method), *args)
+
+        loop = asyncio.get_running_loop()
+        # A profiled request is followed onto the worker that does its work
+        session = profiling.current_session()
+        self.in_flight += 1
+        try:
+            if self.mode == 'process':
+                result, stages, part = await loop.run_in_executor(
+                    self.executor, _call_in_worker, method, session and session.spec, *args
+                )
+                metrics.replay_stages(stages)
+                if part is not None:
+                    session.merge(part)
+                return result
+            function = getattr(self.processor, method)
+            if session is not None:
+                return await loop.run_in_executor(self.executor, session.call, function, *args)
+            return await loop.run_in_executor(self.executor, function, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def warm_up(self):
+        """Start every worker now so the first requests don't pay for start-up"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        # Small texts are processed inline, so this process needs warm models
+        # too; loading them on a thread keeps health probes answered meanwhile
+        warm_local = loop.run_in_executor(None, _warm_models, self.processor.sentiment_engine)
+        if self.mode != 'process':
+            await warm_local
+            logger.info(f"Worker pool ready in {self.mode} mode after {loop.time() - started:.2f}s")
+            self.ready = True
+            return
+
+        # A worker only runs calls once its initializer has loaded the models,
+        # so the pool is warm when every worker has answered one
+        pids = set()
+        while len(pids) < self.max_workers:
+            pids.update(await asyncio.gather(*(
+                loop.run_in_executor(self.executor, _worker_pid, 0.05) for _ in range(self.max_workers)
+            )))
+        await warm_local
+        logger.info(f"Worker pool ready in process mode with {len(pids)} warm workers "
+                    f"after {loop.time() - started:.2f}s")
+        self.ready = True
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "workers": self.max_workers if self.executor is not None else 0,
+            "ready": self.ready,
+            "in_flight": self.in_flight,
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)